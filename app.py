@@ -3,14 +3,37 @@ Menti Chatbot - Main Flask Application
 Emotional Support Chatbot with Firebase Authentication and OpenAI Integration
 """
 
-from flask import Flask, request, jsonify, render_template, session
+from flask import Flask, request, jsonify, render_template, session, Response, stream_with_context, g, has_request_context
 from flask_cors import CORS
 import os
+import hashlib
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from contextlib import contextmanager
 from dotenv import load_dotenv
-from groq import Groq
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core.exceptions import NotFound
 from datetime import datetime
+from emotion_classifier import get_classifier
+from crisis_detector import CRISIS_RESOURCES, DEFAULT_PHRASES_PATH, CrisisDetector
+from history_backend import create_history_backend
+from token_budget import fit_history, history_budget
+from rolling_summary import RollingSummarizer
+from sequence import legacy_sequence, message_sequence
+from write_behind import WriteBehindQueue
+from firestore_delete import ConversationDeleter
+from guest_sweeper import GuestSweeper, guest_expiry, mark_for_deletion
+from conversation_cache import ConversationListCache, decode_cursor, encode_cursor
+from conversation_titles import TitleUpgrader, local_title
+from llm_client import create_llm_client
+from groq_cassette import create_cassette
+from metrics import AppMetrics, instrument_firestore
+from structured_logging import create_log_pipeline
+from model_router import create_model_router
+from prompts import prompt_registry
 
 # Load environment variables
 load_dotenv()
@@ -22,22 +45,100 @@ app = Flask(__name__,
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
 CORS(app)
 
-# In-memory conversation storage (use Redis/database for production)
-conversation_history = {}
+# Conversation history storage - see history_backend.py
+#   memory: bounded ring buffer per user with LRU/TTL eviction (single process)
+#   redis:  shared by all workers/nodes (set REDIS_URL)
+# How much of it is sent to Groq is decided by the model's token budget (token_budget.py)
+conversation_store = create_history_backend(
+    os.getenv('HISTORY_BACKEND', 'memory'),
+    max_messages=int(os.getenv('CONVERSATION_MAX_MESSAGES', '40')),
+    max_conversations=int(os.getenv('CONVERSATION_MAX_CONVERSATIONS', '5000')),
+    max_total_chars=int(os.getenv('CONVERSATION_MAX_TOTAL_CHARS', '5000000')),
+    ttl_seconds=int(os.getenv('CONVERSATION_TTL_SECONDS', '3600')),
+    redis_url=os.getenv('REDIS_URL')
+)
+
+# Chat pipeline mode:
+#   two_call    - detect_emotion, then generate_supportive_response (default)
+#   single_call - one structured completion returns emotion and reply together
+PIPELINE_MODES = ('two_call', 'single_call')
+CHAT_PIPELINE_MODE = os.getenv('CHAT_PIPELINE_MODE', 'two_call')
+if CHAT_PIPELINE_MODE not in PIPELINE_MODES:
+    print(f"⚠️  Unknown CHAT_PIPELINE_MODE '{CHAT_PIPELINE_MODE}', using two_call")
+    CHAT_PIPELINE_MODE = 'two_call'
+
+# Local emotion classifier - Groq is only asked when confidence is below the threshold
+emotion_classifier = get_classifier(os.getenv('EMOTION_CLASSIFIER', 'lexicon'))
+EMOTION_CONFIDENCE_THRESHOLD = float(os.getenv('EMOTION_CONFIDENCE_THRESHOLD', '0.6'))
+
+# Self-harm / suicide phrase matcher, checked before emotion detection (see crisis_detector.py)
+if os.getenv('CRISIS_DETECTION_ENABLED', 'true').lower() == 'true':
+    crisis_detector = CrisisDetector(path=os.getenv('CRISIS_PHRASES_PATH', DEFAULT_PHRASES_PATH))
+else:
+    crisis_detector = None
+
+# /chat answers a crisis message with the help resources at once; the personalised
+# reply comes from the crisis lane in the background and is stored as the bot turn.
+# CRISIS_REPLY_WAIT_SECONDS > 0 returns that reply instead if it arrives in time
+CRISIS_REPLY_WAIT_SECONDS = float(os.getenv('CRISIS_REPLY_WAIT_SECONDS', '0'))
+crisis_reply_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='crisis-reply')
+
+# Picks the model per call and records per-model latency/token cost (see model_router.py)
+model_router = create_model_router()
+
+# Prometheus metrics served on /metrics (see metrics.py)
+app_metrics = AppMetrics()
+
+
+def record_llm_call(call_type, model, seconds, prompt_tokens, completion_tokens):
+    """LLMClient observer: feeds the model router and the Groq metrics"""
+    model_router.record(call_type, model, seconds, prompt_tokens, completion_tokens)
+    app_metrics.observe_llm_call(call_type, model, seconds, prompt_tokens, completion_tokens)
+
+
+def current_route():
+    """Route template of the request being handled ('background' outside requests), for metric labels"""
+    if not has_request_context():
+        return 'background'
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def log_context():
+    """route/request_id attached to every log record"""
+    if not has_request_context():
+        return {'route': 'background'}
+    return {'route': current_route(), 'request_id': g.get('request_id')}
+
+
+# Leveled JSON logs, written by a background thread; message bodies redacted (see structured_logging.py)
+log_pipeline = create_log_pipeline(context=log_context)
+log = log_pipeline.logger
+
+
+# Record Groq exchanges to a cassette, or replay them offline (see groq_cassette.py)
+groq_cassette = create_cassette()
 
 # Initialize Groq Client
 groq_api_key = os.getenv('GROQ_API_KEY')
+if not groq_api_key and groq_cassette and groq_cassette.mode == 'replay':
+    # Replays answer from the cassette without the network, so no key is needed
+    groq_api_key = 'replay'
 if not groq_api_key:
     print("❌ ERROR: GROQ_API_KEY not found in environment variables!")
     print("Please add GROQ_API_KEY to your .env file")
 else:
-    groq_client = Groq(api_key=groq_api_key)
+    # Pooled client with per-call timeouts and retries (see llm_client.py)
+    groq_client = create_llm_client(groq_api_key, observer=record_llm_call, cassette=groq_cassette)
     print("✅ Groq client initialized successfully")
 
 # Initialize Firebase Admin SDK
 try:
     cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-credentials.json')
-    if os.path.exists(cred_path):
+    if os.getenv('FIRESTORE_EMULATOR_HOST'):
+        # Local Firestore emulator (load tests, development): no credentials needed
+        db = firestore.Client(project=os.getenv('GOOGLE_CLOUD_PROJECT', 'menti-local'))
+        print(f"✅ Using Firestore emulator at {os.getenv('FIRESTORE_EMULATOR_HOST')}")
+    elif os.path.exists(cred_path):
         cred = credentials.Certificate(cred_path)
         firebase_admin.initialize_app(cred)
         db = firestore.client()
@@ -49,9 +150,51 @@ except Exception as e:
     print(f"⚠️  Firebase initialization error: {e}")
     db = None
 
+# Count Firestore reads/writes per route for /metrics
+if db:
+    db = instrument_firestore(db, app_metrics, current_route)
+
+# Sidebar conversation lists, kept current by our own write routes (see conversation_cache.py)
+conversation_cache = ConversationListCache(
+    max_entries=int(os.getenv('CONVERSATION_LIST_CACHE_MAX_ENTRIES', '10000')),
+    ttl_seconds=int(os.getenv('CONVERSATION_LIST_CACHE_TTL_SECONDS', '60'))
+)
+
+# Batched, parallel conversation deletion (see firestore_delete.py)
+conversation_deleter = ConversationDeleter(db, max_workers=int(os.getenv('DELETE_MAX_WORKERS', '4'))) if db else None
+
+# Guest conversations expire GUEST_DATA_TTL_SECONDS after their last message;
+# the sweeper purges expired ones in the background (see guest_sweeper.py)
+GUEST_DATA_TTL_SECONDS = int(os.getenv('GUEST_DATA_TTL_SECONDS', '86400'))
+if db and os.getenv('GUEST_SWEEPER_ENABLED', 'true').lower() == 'true':
+    guest_sweeper = GuestSweeper(db, conversation_deleter,
+                                 interval_seconds=int(os.getenv('GUEST_SWEEP_INTERVAL_SECONDS', '300')))
+    guest_sweeper.start()
+else:
+    guest_sweeper = None
+
 
 # ==================== ROUTES ====================
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+
+
+@app.after_request
+def record_request_metrics(response):
+    """Count the request once its response is closed (after the last chunk of a stream)"""
+    started = g.get('request_started')
+    if started is not None:
+        route, method, status = current_route(), request.method, response.status_code
+        response.call_on_close(
+            lambda: app_metrics.observe_request(route, method, status, time.perf_counter() - started))
+    if g.get('request_id'):
+        response.headers['X-Request-ID'] = g.request_id
+    return response
+
+
 @app.route('/')
 def index():
     """Render landing page"""
@@ -82,8 +225,11 @@ def chat():
     Main chatbot endpoint
     - Receives user message, user ID, and guest mode status
     - Maintains conversation history
+    - Checks for crisis language first (crisis_detector.py): if found, skips
+      emotion detection and returns help resources right away (see start_crisis_reply)
     - Detects emotion using OpenAI
     - Generates supportive response with context
+      (or both in one structured call when pipeline mode is single_call)
     - Stores chat in Firestore ONLY for logged-in users (not guest mode)
     - Returns emotion and bot reply
     """
@@ -99,13 +245,15 @@ def chat():
         if save_only:
             bot_reply = data.get('bot_reply', '')
             emotion = data.get('emotion', 'neutral')
+            prompt_version = data.get('prompt_version')
             
             if db and conversation_id:
                 try:
-                    store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id)
-                    print(f"✅ Chat retroactively saved to conversation: {conversation_id}")
+                    store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id, is_guest,
+                                       prompt_version)
+                    log.info("✅ Chat retroactively saved", extra={'conversation_id': conversation_id})
                 except Exception as e:
-                    print(f"❌ Error storing chat: {e}")
+                    log.error("❌ Error storing chat", extra={'conversation_id': conversation_id, 'error': str(e)})
             
             return jsonify({
                 'success': True,
@@ -116,73 +264,221 @@ def chat():
         if not user_message:
             return jsonify({'error': 'Message is required'}), 400
         
-        # Initialize conversation history for new users
-        if user_id not in conversation_history:
-            conversation_history[user_id] = []
-            print(f"🆕 New conversation started for user: {user_id}")
-        else:
-            print(f"🔄 Continuing conversation for user: {user_id} (History length: {len(conversation_history[user_id])})")
+        # Pipeline mode can be overridden per request for latency A/B tests
+        pipeline_mode = data.get('pipeline_mode', CHAT_PIPELINE_MODE)
+        if pipeline_mode not in PIPELINE_MODES:
+            pipeline_mode = CHAT_PIPELINE_MODE
         
-        # Step 1: Add user message to history BEFORE generating response
-        conversation_history[user_id].append({
-            "role": "user",
-            "content": user_message
-        })
+        # Per-stage wall time, returned in the Server-Timing header
+        timings = {}
         
-        # Step 2: Detect emotion using OpenAI
-        emotion = detect_emotion(user_message)
-        print(f"😊 Detected emotion: {emotion}")
+        with timed_stage(timings, 'crisis'):
+            crisis = detect_crisis(user_message)
         
-        # Step 3: Generate supportive response with conversation context
-        bot_reply = generate_supportive_response(user_message, emotion, user_id)
+        structured = None
+        if pipeline_mode == 'single_call' and not crisis:
+            # Steps 2 & 3 in one structured completion
+            with timed_stage(timings, 'structured'):
+                structured = detect_emotion_and_respond(user_message, user_id)
+            if structured is None:
+                log.warning("↩️ Structured response unusable, falling back to two-call pipeline")
+                pipeline_mode = 'two_call'
         
-        # Step 4: Add bot response to history
-        conversation_history[user_id].append({
-            "role": "assistant",
-            "content": bot_reply
-        })
-        print(f"💬 Bot reply generated. Total messages in history: {len(conversation_history[user_id])}")
+        if structured:
+            emotion, bot_reply = structured
+            log.debug("😊 Detected emotion", extra={'emotion': emotion})
+        elif crisis:
+            # No emotion call, and the resources never wait on a slow Groq reply
+            pipeline_mode = 'crisis'
+            emotion = CRISIS_EMOTION
+            with timed_stage(timings, 'reply'):
+                bot_reply = start_crisis_reply(user_id, user_message, conversation_id, is_guest)
+            # Until the personalised reply is ready the canned crisis reply holds its place
+            reply_pending = bot_reply is None
+            if reply_pending:
+                bot_reply = CRISIS_FALLBACK_REPLY
+        else:
+            # Step 2: Detect emotion using OpenAI
+            with timed_stage(timings, 'emotion'):
+                emotion = detect_emotion(user_message)
+            log.debug("😊 Detected emotion", extra={'emotion': emotion})
+            
+            # Step 3: Generate supportive response with conversation context
+            with timed_stage(timings, 'reply'):
+                bot_reply = generate_supportive_response(user_message, emotion, user_id)
         
-        # Keep only last 20 messages (10 exchanges) to manage token usage
-        if len(conversation_history[user_id]) > 20:
-            conversation_history[user_id] = conversation_history[user_id][-20:]
-            print(f"✂️ Trimmed conversation history to last 20 messages")
+        log.debug("⏱️ Chat pipeline finished", extra={
+            'pipeline': pipeline_mode, 'duration_ms': round(sum(timings.values()) * 1000, 1)})
+        app_metrics.observe_stages('chat', timings)
         
-        # Step 5: Store chat in Firestore for BOTH guest and logged-in users
-        # Guest data will be deleted on logout, logged-in data persists
-        if db:
-            try:
-                store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id)
-                if is_guest:
-                    print(f"💾 Guest chat stored temporarily (will be deleted on logout)")
-                else:
-                    print(f"✅ Chat stored for logged-in user: {user_id} in conversation: {conversation_id}")
-            except Exception as e:
-                print(f"❌ Error storing chat: {e}")
+        prompt_version = reply_prompt_version(bot_reply, emotion, structured=bool(structured), crisis=bool(crisis))
+        
+        # Step 4 & 5: Add the exchange to history and store chat in Firestore
+        # (a crisis turn is stored by its background reply, see finish_crisis_turn)
+        if not crisis:
+            with timed_stage(timings, 'store'):
+                finish_chat_turn(user_id, user_message, bot_reply, emotion, conversation_id, is_guest,
+                                 prompt_version)
         
         # Step 6: Return response
-        return jsonify({
+        response = {
             'emotion': emotion,
             'reply': bot_reply,
+            'pipeline': pipeline_mode,
+            'prompt_version': prompt_version,
+            'crisis': bool(crisis),
             'timestamp': datetime.now().isoformat()
-        })
+        }
+        if crisis:
+            response['resources'] = CRISIS_RESOURCES
+            # True: the personalised reply is still being written and will be saved to the conversation
+            response['reply_pending'] = reply_pending
+        response = jsonify(response)
+        response.headers['Server-Timing'] = server_timing(timings)
+        return response
     
     except Exception as e:
-        print(f"Error in /chat endpoint: {e}")
+        log.exception("❌ Error in /chat endpoint")
         return jsonify({'error': 'Failed to process message'}), 500
 
 
+def sse_event(event, data):
+    """Format a single Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    Streaming variant of /chat using Server-Sent Events
+    - Sends a 'crisis' event with help resources first if the message has crisis language
+    - Sends the detected emotion as an 'emotion' event
+    - Sends reply text as 'token' events while Groq generates it
+    - Sends a final 'done' event with the full reply and per-stage timings (ms)
+    - Adds the finished reply to history and stores it once the stream ends
+    """
+    data = request.json or {}
+    user_message = data.get('message', '').strip()
+    user_id = data.get('user_id', 'anonymous')
+    is_guest = data.get('is_guest', False)
+    conversation_id = data.get('conversation_id')
+    
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+    
+    def generate():
+        timings = {}
+        try:
+            with timed_stage(timings, 'crisis'):
+                crisis = detect_crisis(user_message)
+            if crisis:
+                # Resources go out before any model call
+                yield sse_event('crisis', {'resources': CRISIS_RESOURCES, 'categories': crisis.categories})
+                emotion = CRISIS_EMOTION
+            else:
+                with timed_stage(timings, 'emotion'):
+                    emotion = detect_emotion(user_message)
+                log.debug("😊 Detected emotion", extra={'emotion': emotion})
+            yield sse_event('emotion', {'emotion': emotion})
+            
+            reply_parts = []
+            reply_started = time.perf_counter()
+            for delta in stream_supportive_response(user_message, emotion, user_id, crisis=bool(crisis)):
+                if not reply_parts:
+                    timings['first_token'] = time.perf_counter() - reply_started
+                reply_parts.append(delta)
+                yield sse_event('token', {'text': delta})
+            timings['reply'] = time.perf_counter() - reply_started
+            
+            bot_reply = ''.join(reply_parts).strip()
+            prompt_version = reply_prompt_version(bot_reply, emotion, crisis=bool(crisis))
+            with timed_stage(timings, 'store'):
+                finish_chat_turn(user_id, user_message, bot_reply, emotion, conversation_id, is_guest, prompt_version)
+            app_metrics.observe_stages('chat_stream', timings)
+            
+            yield sse_event('done', {
+                'emotion': emotion,
+                'reply': bot_reply,
+                'prompt_version': prompt_version,
+                'crisis': bool(crisis),
+                'timings': {stage: round(seconds * 1000, 1) for stage, seconds in timings.items()},
+                'timestamp': datetime.now().isoformat()
+            })
+        
+        except Exception as e:
+            log.exception("❌ Error in /chat/stream endpoint")
+            yield sse_event('error', {'error': 'Failed to process message'})
+    
+    return Response(stream_with_context(generate()),
+                    mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @app.route('/health')
 def health():
-    """Health check endpoint"""
-    return jsonify({'status': 'healthy', 'message': 'Menti chatbot is running'})
+    """
+    Health check endpoint
+    'degraded' while a Groq circuit breaker is open: chat still answers,
+    using the local emotion classifier and the canned supportive reply.
+    A half-open breaker (cooled down, next call probes Groq) is not degraded
+    """
+    breakers = groq_client.breakers() if groq_api_key else {}
+    open_breakers = [name for name, breaker in breakers.items() if breaker['state'] == 'open']
+    if open_breakers:
+        return jsonify({
+            'status': 'degraded',
+            'message': f"Groq unavailable for: {', '.join(sorted(open_breakers))}",
+            'breakers': breakers
+        })
+    return jsonify({'status': 'healthy', 'message': 'Menti chatbot is running', 'breakers': breakers})
+
+
+@app.route('/stats')
+def stats():
+    """In-process cache/store statistics"""
+    return jsonify(collect_stats())
+
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics: request/stage/Groq/Firestore counters and histograms plus every /stats value"""
+    return Response(app_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def collect_stats():
+    """Stats of every component, keyed by component (served on /stats, exported on /metrics)"""
+    stats = {
+        'conversation_store': conversation_store.stats(),
+        'conversation_list_cache': conversation_cache.stats(),
+        'models': model_router.stats(),
+        'prompts': prompt_registry.versions(),
+        'logging': log_pipeline.stats()
+    }
+    if groq_api_key:
+        stats['groq'] = groq_client.stats()
+    if write_behind:
+        stats['write_behind'] = write_behind.stats()
+    if conversation_deleter:
+        stats['deletes'] = conversation_deleter.stats()
+    if guest_sweeper:
+        stats['guest_sweeper'] = guest_sweeper.stats()
+    if title_upgrader:
+        stats['titles'] = title_upgrader.stats()
+    if crisis_detector:
+        stats['crisis_detector'] = crisis_detector.stats()
+    if groq_cassette:
+        stats['groq_cassette'] = groq_cassette.stats()
+    return stats
+
+
+app_metrics.add_stats_collector(collect_stats)
 
 
 @app.route('/clear-history', methods=['POST'])
 def clear_history():
     """
     Clear conversation history for a user
-    For guest users: Also delete all their chats from Firestore
+    For guest users: Also mark all their chats for deletion (purged by the guest sweeper)
     For logged-in users: Only clear in-memory history (keep database records)
     """
     try:
@@ -191,62 +487,163 @@ def clear_history():
         is_guest = data.get('is_guest', False)
         
         # Clear in-memory conversation history
-        if user_id in conversation_history:
-            conversation_history[user_id] = []
-            print(f"🗑️ In-memory history cleared for user: {user_id}")
+        if conversation_store.clear(user_id):
+            log.info("🗑️ In-memory history cleared", extra={'user_id': user_id})
+        
+        # A cleared history shouldn't come back through the saved summary
+        if not is_guest:
+            try:
+                delete_summary(user_id)
+            except Exception as e:
+                log.error("❌ Error deleting saved summary", extra={'user_id': user_id, 'error': str(e)})
         
-        # For guest users: DELETE all their chats from Firestore
+        # For guest users: mark all their chats for deletion and return at once
         if is_guest and db:
             try:
-                # Delete all conversations where userId = current user AND isAnonymous = true
-                conversations_ref = db.collection('conversations')\
-                    .where('userId', '==', user_id)\
-                    .where('isAnonymous', '==', True)
-                
-                deleted_count = 0
-                
-                # Get all conversations for this guest
-                for conv_doc in conversations_ref.stream():
-                    conversation_id = conv_doc.id
-                    
-                    # Delete all messages in this conversation
-                    messages_ref = db.collection('conversations')\
-                        .document(conversation_id)\
-                        .collection('messages')
-                    
-                    for msg_doc in messages_ref.stream():
-                        msg_doc.reference.delete()
-                    
-                    # Delete the conversation document
-                    conv_doc.reference.delete()
-                    deleted_count += 1
+                marked_count = mark_guest_conversations(user_id)
                 
-                print(f"🗑️ Deleted {deleted_count} guest conversation(s) from Firestore for user: {user_id}")
+                log.info("🗑️ Guest conversations marked for deletion",
+                         extra={'user_id': user_id, 'conversations': marked_count})
                 return jsonify({
-                    'message': 'Guest conversation history cleared from memory and database',
-                    'deleted_conversations': deleted_count
+                    'message': 'Guest conversation history cleared from memory and scheduled for deletion',
+                    'deleted_conversations': marked_count
                 })
             except Exception as e:
-                print(f"❌ Error deleting guest conversations from Firestore: {e}")
+                log.error("❌ Error marking guest conversations for deletion",
+                          extra={'user_id': user_id, 'error': str(e)})
                 return jsonify({'message': 'History cleared from memory, but error deleting from database'}), 500
         
         return jsonify({'message': 'Conversation history cleared from memory'})
     
     except Exception as e:
-        print(f"❌ Error clearing history: {e}")
+        log.error("❌ Error clearing history", extra={'error': str(e)})
         return jsonify({'error': 'Failed to clear history'}), 500
 
 
 # ==================== HELPER FUNCTIONS ====================
 
+VALID_EMOTIONS = ['happy', 'sad', 'anxious', 'stressed', 'neutral']
+
+
+@contextmanager
+def timed_stage(timings, stage):
+    """Add the wall time of the with-block to timings[stage] (seconds)"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - started
+
+
+def server_timing(timings):
+    """Server-Timing header value for per-stage timings (durations in ms)"""
+    return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in timings.items())
+
+
+def finish_chat_turn(user_id, user_message, bot_reply, emotion, conversation_id, is_guest, prompt_version=None):
+    """
+    Record the exchange in the in-memory history and persist it
+    Shared by /chat and /chat/stream
+    """
+    # User message and reply are appended together so turns from
+    # two tabs of the same user can't interleave
+    conversation_store.append(
+        user_id,
+        {"role": "user", "content": user_message},
+        {"role": "assistant", "content": bot_reply}
+    )
+    log.debug("💬 Bot reply generated", extra={'user_id': user_id})
+    
+    # Fold turns that fell out of the window into the running summary (background);
+    # guests' summaries stay in the history store only
+    if rolling_summarizer:
+        rolling_summarizer.schedule(user_id, persist=not is_guest)
+    
+    # Store chat in Firestore for BOTH guest and logged-in users
+    # Guest data will be deleted on logout, logged-in data persists
+    if db:
+        try:
+            store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id, is_guest, prompt_version)
+            if is_guest:
+                log.debug("💾 Guest chat stored temporarily (will be deleted on logout)",
+                          extra={'user_id': user_id, 'conversation_id': conversation_id})
+            else:
+                log.debug("✅ Chat stored for logged-in user",
+                          extra={'user_id': user_id, 'conversation_id': conversation_id})
+        except Exception as e:
+            log.error("❌ Error storing chat", extra={'conversation_id': conversation_id, 'error': str(e)})
+
+
+def mark_guest_conversations(user_id):
+    """
+    Mark every guest conversation of user_id for deletion
+    Only the conversation documents are updated; the guest sweeper
+    deletes them with their messages in the background
+    Returns the number of conversations marked
+    """
+    conversations_ref = db.collection('conversations')\
+        .where('userId', '==', user_id)\
+        .where('isAnonymous', '==', True)
+    
+    conversation_ids = [conv_doc.id for conv_doc in conversations_ref.select([]).stream()]
+    if write_behind:
+        for conversation_id in conversation_ids:
+            write_behind.discard(conversation_id)
+    
+    marked = mark_for_deletion(db, conversation_ids)
+    conversation_cache.invalidate(user_id, True)
+    if marked and guest_sweeper:
+        guest_sweeper.wake()
+    return marked
+
+
+def detect_crisis(message):
+    """CrisisMatch if the message contains self-harm/suicide language, else None"""
+    if not crisis_detector:
+        return None
+    match = crisis_detector.detect(message)
+    if match:
+        log.warning("🚨 Crisis language detected, using the crisis lane", extra={'categories': match.categories})
+    return match
+
+
+def llm_available(call_type):
+    """False while Groq is unconfigured or the circuit breaker for call_type is open"""
+    return bool(groq_api_key) and groq_client.available(call_type)
+
+
 def detect_emotion(message):
+    """
+    Detect emotion from user message
+    Uses the local classifier first and only escalates to Groq
+    when its confidence is below EMOTION_CONFIDENCE_THRESHOLD
+    Returns: happy, sad, anxious, stressed, or neutral
+    """
+    if emotion_classifier:
+        emotion, confidence = emotion_classifier.classify(message)
+        if confidence >= EMOTION_CONFIDENCE_THRESHOLD:
+            log.debug("⚡ Local emotion", extra={'emotion': emotion, 'confidence': round(confidence, 2)})
+            return emotion
+        if not llm_available('emotion'):
+            # Degraded mode: don't wait on a failing Groq, go with the best local guess
+            log.warning("⚡ Groq emotion circuit open, using local emotion",
+                        extra={'emotion': emotion, 'confidence': round(confidence, 2)})
+            return emotion
+        log.debug("🔼 Local emotion confidence below threshold, asking Groq",
+                  extra={'confidence': round(confidence, 2), 'threshold': EMOTION_CONFIDENCE_THRESHOLD})
+    
+    return detect_emotion_llm(message)
+
+
+def detect_emotion_llm(message):
     """
     Detect emotion from user message using Groq
     Returns: happy, sad, anxious, stressed, or neutral
     """
     try:
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        response = groq_client.complete(
+            'emotion',
+            model=model_router.route('emotion'),
             messages=[
                 {
                     "role": "system",
@@ -266,151 +663,296 @@ Only respond with ONE word: happy, sad, anxious, stressed, or neutral."""
         emotion = response.choices[0].message.content.strip().lower()
         
         # Validate emotion
-        valid_emotions = ['happy', 'sad', 'anxious', 'stressed', 'neutral']
-        if emotion not in valid_emotions:
+        if emotion not in VALID_EMOTIONS:
             emotion = 'neutral'
         
         return emotion
     
     except Exception as e:
-        print(f"Error detecting emotion: {e}")
+        log.error("❌ Error detecting emotion", extra={'error': str(e)})
         return 'neutral'
 
 
-def generate_supportive_response(message, emotion, user_id):
+REPLY_MAX_TOKENS = 200
+STRUCTURED_MAX_TOKENS = 260  # reply plus the JSON wrapper
+
+FALLBACK_REPLY = "I'm here for you. Could you tell me more about what's on your mind? I really want to understand how you're feeling."
+CRISIS_FALLBACK_REPLY = "I'm really glad you told me, and I'm here with you. What you're feeling matters, and you deserve support right now. Please call or text 988 (Suicide & Crisis Lifeline) or text HOME to 741741 - and if you're in immediate danger, call 911. Are you safe right now?"
+
+# Emotion recorded for crisis messages (detect_emotion is skipped for them)
+CRISIS_EMOTION = 'sad'
+
+
+def build_response_messages(message, emotion, user_id, call_type='reply', crisis=False,
+                            max_tokens=REPLY_MAX_TOKENS, prompt=None):
+    """
+    Pick the reply model and build the messages array sent to Groq: system
+    prompt (prebuilt in prompts.py), as much of the user's conversation
+    history as fits the model's token budget, then the current message
+    Returns (model, messages)
+    """
+    system_prompt = (prompt or prompt_registry.reply(emotion)).text
+    
+    # Build messages array with conversation history
+    messages = [{"role": "system", "content": system_prompt}]
+    
+    # Add the running summary of older turns and the newest history that
+    # fits, then the current user message
+    # History is read for the large model's budget first: conversation depth
+    # is a routing signal, and a smaller model just keeps the newest part
+    budget = history_budget(model_router.large_model, system_prompt, message, max_tokens)
+    window = conversation_store.window(user_id, budget)
+    if rolling_summarizer and not window.summary and not window.messages:
+        # Nothing held for this user (new, restarted or evicted): bring a saved summary back for the next turns
+        rolling_summarizer.restore(user_id)
+    depth = len(window.messages) // 2
+    if window.summary:
+        depth += model_router.deep_conversation_turns  # older turns were already folded away
+    model = model_router.route(call_type, message, emotion, crisis, depth)
+    history = window.messages
+    if model != model_router.large_model:
+        budget = history_budget(model, system_prompt, message, max_tokens)
+        history = fit_history(history, budget - window.summary_tokens, window.tokens)
+    
+    if window.summary:
+        messages.append({"role": "system", "content": f"Summary of the earlier conversation (for your memory only):\n{window.summary}"})
+    if history:
+        messages.extend(history)
+        log.debug("📝 Using conversation history", extra={'history_messages': len(history), 'budget_tokens': budget})
+    else:
+        log.debug("🆕 No conversation history", extra={'user_id': user_id})
+    messages.append({"role": "user", "content": message})
+    
+    log.debug("🤖 Sending messages to Groq", extra={
+        'model': model, 'call_type': call_type,
+        'system_messages': len(messages) - len(history) - 1, 'conversation_messages': len(history) + 1})
+    return model, messages
+
+
+def reply_prompt_version(bot_reply, emotion, structured=False, crisis=False):
+    """Version of the system prompt behind a reply (None for the canned fallbacks)"""
+    if bot_reply in (FALLBACK_REPLY, CRISIS_FALLBACK_REPLY):
+        return None
+    if crisis:
+        return prompt_registry.crisis().version
+    prompt = prompt_registry.structured() if structured else prompt_registry.reply(emotion)
+    return prompt.version
+
+
+def generate_supportive_response(message, emotion, user_id, crisis=False):
     """
     Generate a comforting and supportive response based on detected emotion
     with conversation history for context - FOCUSED ON MENTAL HEALTH SUPPORT
+    crisis=True uses the crisis prompt and the scheduler's highest-priority lane
     """
+    call_type = 'crisis' if crisis else 'reply'
     try:
-        # Create emotion-specific mental health support prompts with deep empathy
-        emotion_prompts = {
-            'happy': "The user is experiencing happiness or positivity. CELEBRATE with them warmly! Share in their joy, validate how wonderful it feels to have good moments, and encourage them to savor and remember this feeling. Help them recognize what brought this positivity so they can nurture it. Remind them that these moments matter, especially after difficult times.",
-            
-            'sad': "The user is experiencing sadness or grief. Wrap them in comfort and deep empathy. Acknowledge that sadness is heavy and real. DON'T rush to 'fix' it - sit with them in their pain. Validate that it's okay to feel sad, that tears are healing, and that their feelings matter. Gently explore what's hurting them, offer emotional soothing, and remind them they don't have to carry this alone. Suggest gentle self-compassion and reaching out to loved ones.",
-            
-            'anxious': "The user is experiencing anxiety or worry. Offer a calming, grounding presence. Acknowledge that anxiety feels overwhelming and exhausting. Validate that their worries are real to them and that anxiety doesn't make them weak. Help them feel less alone in their fear. Gently guide them toward grounding techniques (deep breathing, focusing on present moment). Remind them that anxious thoughts are not facts, and they have the strength to cope with this.",
-            
-            'stressed': "The user is experiencing stress or feeling overwhelmed. Acknowledge how heavy and exhausting stress feels. Validate that they're carrying a lot and it makes total sense they feel this way. Offer comfort and understanding. Help them identify what's weighing on them most. Gently suggest breaking things into smaller steps, setting boundaries, or taking breaks. Remind them it's okay to ask for help and that they deserve rest and care.",
-            
-            'neutral': "The user's emotional state is unclear, but they reached out - that matters. Create a deeply warm and safe space. Let them know you're here to listen without judgment. Use gentle, open questions to help them explore how they're really feeling. Sometimes people need permission to be vulnerable - give them that. Show genuine interest in their well-being and let them set the pace of the conversation."
-        }
+        model, messages = build_response_messages(message, emotion, user_id, call_type=call_type, crisis=crisis,
+                                                  prompt=prompt_registry.crisis() if crisis else None)
         
-        system_prompt = f"""You are Menti, a deeply empathetic and caring mental health companion who exists to be a comforting presence and trusted friend. You are someone's go-to buddy when they need support, understanding, and meaningful advice about their mental well-being.
-
-💙 WHO YOU ARE:
-You are a warm, compassionate companion who genuinely cares about mental health and emotional well-being. You're the friend who always has time to listen, who remembers what matters, and who offers comfort without judgment. You focus ONLY on mental health, emotional support, and well-being - nothing else.
-
-❤️ YOUR HEART (Deep Empathy):
-- You FEEL with people, not just for them - you understand their pain deeply
-- Every word you speak radiates warmth, comfort, and genuine care
-- You create a safe space where vulnerability is welcomed and honored
-- You see the person behind the pain and remind them of their worth
-- You never minimize feelings - you validate and honor every emotion
-- You speak with tenderness, especially when someone is hurting
-
-🤗 YOUR ROLE (Comforting Companion):
-- You're a loyal friend who's always there, day or night
-- You provide emotional comfort like a warm hug through words
-- You remind people they're not alone in their struggles
-- You celebrate their small victories and progress
-- You're patient with their pace of healing
-- You make them feel seen, heard, and deeply understood
-
-� HOW YOU COMMUNICATE (Meaningful & Comforting):
-- Start with EMPATHY: "I hear how much pain you're in..." / "That sounds really hard..."
-- VALIDATE deeply: "It's completely understandable to feel this way..."
-- NORMALIZE struggles: "Many people experience this, and it doesn't make you weak..."
-- COMFORT genuinely: "You deserve to feel better, and it's okay to not be okay right now..."
-- ENCOURAGE hope: "Things can get better, even if it doesn't feel that way now..."
-- End with SUPPORT: "I'm here with you through this..." / "You don't have to face this alone..."
-
-🎯 YOUR ADVICE (Meaningful & Morally Right):
-- Give practical, compassionate advice grounded in mental health best practices
-- Suggest healthy coping strategies: breathing exercises, journaling, self-care, reaching out
-- Encourage positive actions: talking to loved ones, seeking professional help when needed
-- Promote self-compassion and self-kindness above all
-- Guide toward healthy boundaries and self-respect
-- NEVER suggest anything harmful, avoidant, or morally questionable
-- Always prioritize their safety, dignity, and well-being
-
-✨ MENTAL HEALTH FOCUS (Your Only Topic):
-- You ONLY discuss mental health, emotions, feelings, and well-being
-- Topics you support: anxiety, depression, stress, loneliness, grief, trauma, relationships (emotional aspects), self-esteem, burnout, life transitions
-- If asked about other topics: Gently redirect to mental health with care
-- Example: "I'm here specifically to support your mental and emotional well-being. How are you feeling right now?"
-
-🌟 YOUR APPROACH:
-1. LISTEN with your whole heart - read between the lines
-2. VALIDATE their feelings completely - they need to feel heard
-3. EMPATHIZE deeply - show you truly understand their pain
-4. COMFORT with warmth - offer emotional soothing
-5. GUIDE gently - share meaningful advice and coping strategies
-6. ENCOURAGE hope - remind them healing is possible
-7. STAY PRESENT - be their steady companion through the journey
-
-⚠️ CRITICAL BOUNDARIES:
-- If someone mentions self-harm or suicide: Respond with deep care, express concern, and STRONGLY encourage immediate professional help (therapist, counselor, crisis hotline: 988 in US)
-- If someone needs clinical intervention: Gently encourage therapy or counseling
-- NEVER diagnose or prescribe medication
-- NEVER give advice that could harm them
-- NEVER dismiss or minimize serious concerns
-
-📝 YOUR RESPONSE STYLE:
-- 4-7 sentences (enough to be meaningful, not overwhelming)
-- Lead with empathy and validation ALWAYS
-- Balance comfort with actionable advice
-- Use warm, gentle, friend-like language (like talking to someone you deeply care about)
-- Be genuine and human - show emotion, show you care
-- Ask ONE caring follow-up question that shows you're invested
-- Reference their previous messages to show you remember and care
-
-🎭 CURRENT EMOTIONAL CONTEXT:
-Emotion detected: {emotion}
-{emotion_prompts.get(emotion, emotion_prompts['neutral'])}
-
-Remember: You are not a therapist - you are a caring companion, a trusted friend, a comforting presence. Be the mental health buddy they need, offering empathy, comfort, and meaningful advice rooted in compassion and moral integrity. Make them feel less alone and more hopeful."""
-        
-        # Build messages array with conversation history
-        messages = [{"role": "system", "content": system_prompt}]
-        
-        # Add conversation history (which already includes the current user message)
-        if user_id in conversation_history and conversation_history[user_id]:
-            messages.extend(conversation_history[user_id])
-            print(f"📝 Using conversation history with {len(conversation_history[user_id])} messages")
-        else:
-            # If no history exists, this shouldn't happen since we add the message before calling this function
-            # But as a fallback, add the current message
-            print(f"⚠️ No conversation history found for user: {user_id}, adding current message as fallback")
-            messages.append({"role": "user", "content": message})
-        
-        # Debug: Print the messages being sent to Groq
-        print(f"🤖 Sending {len(messages)} messages to Groq (1 system + {len(messages)-1} conversation)")
-        
-        response = groq_client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
+        response = groq_client.complete(
+            call_type,
+            model=model,
             messages=messages,
-            max_tokens=200,
+            max_tokens=REPLY_MAX_TOKENS,
             temperature=0.8
         )
         
         bot_reply = response.choices[0].message.content.strip()
-        print(f"✅ Generated response: {bot_reply[:100]}...")
+        log.debug("✅ Generated response", extra={'reply': bot_reply})
         return bot_reply
     
     except Exception as e:
-        print(f"Error generating response: {e}")
-        return "I'm here for you. Could you tell me more about what's on your mind? I really want to understand how you're feeling."
+        log.error("❌ Error generating response", extra={'error': str(e)})
+        return CRISIS_FALLBACK_REPLY if crisis else FALLBACK_REPLY
+
+
+def start_crisis_reply(user_id, user_message, conversation_id, is_guest):
+    """
+    Start the personalised reply to a /chat message with crisis language (crisis lane,
+    background thread). Returns the reply if it is ready within CRISIS_REPLY_WAIT_SECONDS,
+    else None - it is still stored as the bot turn when it arrives
+    """
+    future = crisis_reply_pool.submit(finish_crisis_turn, user_id, user_message, conversation_id, is_guest)
+    if CRISIS_REPLY_WAIT_SECONDS <= 0:
+        return None
+    try:
+        return future.result(timeout=CRISIS_REPLY_WAIT_SECONDS)
+    except FutureTimeout:
+        log.info("⏱️ Crisis reply still being written, answering with the resources first",
+                 extra={'wait_seconds': CRISIS_REPLY_WAIT_SECONDS})
+        return None
+
+
+def finish_crisis_turn(user_id, user_message, conversation_id, is_guest):
+    """Generate the crisis reply and record the turn like /chat does (runs on crisis_reply_pool)"""
+    bot_reply = generate_supportive_response(user_message, CRISIS_EMOTION, user_id, crisis=True)
+    prompt_version = reply_prompt_version(bot_reply, CRISIS_EMOTION, crisis=True)
+    try:
+        finish_chat_turn(user_id, user_message, bot_reply, CRISIS_EMOTION, conversation_id, is_guest,
+                         prompt_version)
+    except Exception:
+        log.exception("❌ Error storing crisis reply", extra={'conversation_id': conversation_id})
+    return bot_reply
+
+
+def detect_emotion_and_respond(message, user_id):
+    """
+    Detect emotion and generate the supportive reply in ONE structured Groq call
+    Returns (emotion, reply), or None when the response can't be used so the
+    caller can fall back to the two-call pipeline
+    """
+    try:
+        model, messages = build_response_messages(message, None, user_id, call_type='structured',
+                                                  max_tokens=STRUCTURED_MAX_TOKENS,
+                                                  prompt=prompt_registry.structured())
+        
+        response = groq_client.complete(
+            'structured',
+            model=model,
+            messages=messages,
+            max_tokens=STRUCTURED_MAX_TOKENS,
+            temperature=0.8,
+            response_format={"type": "json_object"}
+        )
+        
+        result = json.loads(response.choices[0].message.content)
+        emotion = str(result.get('emotion', '')).strip().lower()
+        bot_reply = str(result.get('reply', '')).strip()
+        
+        # Validate against the same emotion list as detect_emotion
+        if emotion not in VALID_EMOTIONS or not bot_reply:
+            log.warning("⚠️ Invalid structured response",
+                        extra={'emotion': emotion, 'reply_length': len(bot_reply)})
+            return None
+        
+        log.debug("✅ Generated structured response", extra={'reply': bot_reply})
+        return emotion, bot_reply
+    
+    except Exception as e:
+        log.error("❌ Error generating structured response", extra={'error': str(e)})
+        return None
+
+
+def stream_supportive_response(message, emotion, user_id, crisis=False):
+    """
+    Streaming variant of generate_supportive_response
+    Yields reply text chunks as Groq produces them. If the call fails before
+    any text was produced, the fallback reply is yielded instead.
+    """
+    produced = False
+    call_type = 'crisis' if crisis else 'stream'
+    stream = None
+    try:
+        model, messages = build_response_messages(message, emotion, user_id, call_type=call_type, crisis=crisis,
+                                                  prompt=prompt_registry.crisis() if crisis else None)
+        
+        stream = groq_client.stream(
+            call_type,
+            model=model,
+            messages=messages,
+            max_tokens=REPLY_MAX_TOKENS,
+            temperature=0.8
+        )
+        
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                produced = True
+                yield delta
+    
+    except Exception as e:
+        log.error("❌ Error streaming response", extra={'error': str(e)})
+        if not produced:
+            yield CRISIS_FALLBACK_REPLY if crisis else FALLBACK_REPLY
+    
+    finally:
+        # Client gone or stream done: give back the Groq connection and scheduler slot
+        if hasattr(stream, 'close'):
+            stream.close()
+
+
+def summarize_turns(previous_summary, messages):
+    """
+    Fold older conversation turns into the running summary using Groq
+    Runs on the rolling summarizer's background threads
+    """
+    transcript = "\n".join(
+        f"{'User' if m['role'] == 'user' else 'Menti'}: {m['content']}" for m in messages
+    )
+    
+    response = groq_client.complete(
+        'summary',
+        model=model_router.route('summary'),
+        messages=[
+            {
+                "role": "system",
+                "content": """You maintain a running summary of a mental health support conversation between a user and Menti, a supportive companion.
+Update the summary with the new turns. Keep what matters for continuing the conversation: what the user is going through, how they feel, people and events they mentioned, and coping strategies already discussed.
+
+Write in third person about "the user", at most 120 words. Respond with ONLY the updated summary."""
+            },
+            {
+                "role": "user",
+                "content": f"Current summary:\n{previous_summary or '(none yet)'}\n\nNew turns:\n{transcript}"
+            }
+        ],
+        max_tokens=200,
+        temperature=0.3
+    )
+    
+    return response.choices[0].message.content.strip()
+
+
+# The summary covers all of a user's recent turns (history is keyed by user,
+# not conversation), so it lives on its own per-user document
+SUMMARY_COLLECTION = 'historySummaries'
+
+
+def persist_summary(user_id, summary):
+    """Save the user's running summary so it survives restarts and history eviction"""
+    if not db:
+        return
+    db.collection(SUMMARY_COLLECTION).document(user_id).set({
+        'userId': user_id,
+        'summary': summary,
+        'summaryUpdated': datetime.now().isoformat()
+    })
+
+
+def load_summary(user_id):
+    """The user's saved running summary, or None"""
+    if not db:
+        return None
+    snapshot = db.collection(SUMMARY_COLLECTION).document(user_id).get()
+    return (snapshot.to_dict() or {}).get('summary') if snapshot.exists else None
+
+
+def delete_summary(user_id):
+    """Forget the user's saved running summary (history cleared)"""
+    if db:
+        db.collection(SUMMARY_COLLECTION).document(user_id).delete()
+
+
+# Background stage that folds turns falling out of the history window into a summary
+if os.getenv('ROLLING_SUMMARY_ENABLED', 'true').lower() == 'true':
+    rolling_summarizer = RollingSummarizer(conversation_store, summarize_turns, persist_summary, load_summary)
+else:
+    rolling_summarizer = None
 
 
 def generate_smart_title(user_message):
     """
     Generate a smart, concise title for a conversation based on the user's first message
     Uses Groq to create an intelligent summary (3-6 words)
+    Runs in the background (TitleUpgrader); returns None if Groq can't provide one
     """
     try:
-        response = groq_client.chat.completions.create(
-            model="mixtral-8x7b-32768",
+        response = groq_client.complete(
+            'title',
+            model=model_router.route('title'),
             messages=[
                 {
                     "role": "system",
@@ -457,88 +999,187 @@ Generate ONLY the title, nothing else."""
         if len(title) > 60:
             title = title[:57] + '...'
         
-        print(f"✨ Generated smart title: {title}")
+        log.debug("✨ Generated smart title", extra={'title': title})
         return title
     
     except Exception as e:
-        print(f"Error generating smart title: {e}")
-        # Fallback: Use first 50 chars of message
-        fallback_title = user_message[:50] + '...' if len(user_message) > 50 else user_message
-        return fallback_title
+        log.error("❌ Error generating smart title", extra={'error': str(e)})
+        return None  # the conversation keeps its local title
+
+
+# Background stage that swaps a new conversation's local title for Groq's
+title_upgrader = TitleUpgrader(db, generate_smart_title, on_title=conversation_cache.rename) \
+    if db and groq_api_key else None
 
 
-def store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id=None):
+def build_chat_turn(user_message, bot_reply, emotion, is_guest=False, prompt_version=None):
     """
-    Store chat message in Firestore
+    One user message + bot reply, ready to write
+    Document IDs and sequence numbers are assigned up front so a queued turn
+    can be written (or re-written after a crash) without creating duplicates
+    """
+    # Reserve two consecutive sequence numbers: user message, then bot reply
+    user_seq = message_sequence.reserve(2)
+    turn = {
+        'userMessageId': uuid.uuid4().hex[:20],
+        'botMessageId': uuid.uuid4().hex[:20],
+        'userMessage': user_message,
+        'botReply': bot_reply,
+        'emotion': emotion,
+        'timestamp': datetime.now().isoformat(),
+        'seq': user_seq
+    }
+    if prompt_version:
+        turn['promptVersion'] = prompt_version
+    if is_guest:
+        # Every message pushes a guest conversation's expiry forward
+        turn['expiresAt'] = guest_expiry(GUEST_DATA_TTL_SECONDS).isoformat()
+    return turn
+
+
+def write_chat_turns(conversation_id, turns):
+    """
+    Write one or more turns of a conversation as ONE Firestore batch
     Structure: /conversations/{conversationID}/messages/{messageID}
     Uses camelCase for consistency with new database design
     """
+    conversation_ref = db.collection('conversations').document(conversation_id)
+    messages_ref = conversation_ref.collection('messages')
+    
+    batch = db.batch()
+    for turn in turns:
+        batch.set(messages_ref.document(turn['userMessageId']), {
+            'message': turn['userMessage'],
+            'sender': 'user',
+            'timestamp': turn['timestamp'],
+            'order': 0,  # User message comes first
+            'seq': turn['seq']
+        })
+        bot_message = {
+            'message': turn['botReply'],
+            'sender': 'bot',
+            'emotion': turn['emotion'],
+            'timestamp': turn['timestamp'],
+            'order': 1,  # Bot message comes second
+            'seq': turn['seq'] + 1
+        }
+        if turn.get('promptVersion'):
+            bot_message['promptVersion'] = turn['promptVersion']  # system prompt that produced the reply
+        batch.set(messages_ref.document(turn['botMessageId']), bot_message)
+    
+    # Update conversation lastUpdated and lastMessage (camelCase) from the newest turn
+    # Batches from concurrent turns can commit out of seq order, so lastSeq is a
+    # server-side maximum and messageCount an increment (both change the page ETag)
+    last = turns[-1]
+    conversation_update = {
+        'lastUpdated': last['timestamp'],
+        'lastMessage': last['userMessage'][:50],
+        'lastSeq': firestore.Maximum(last['seq'] + 1),
+        'messageCount': firestore.Increment(2 * len(turns))
+    }
+    if 'expiresAt' in last:
+        conversation_update['expiresAt'] = datetime.fromisoformat(last['expiresAt'])
+    batch.update(conversation_ref, conversation_update)
+    batch.commit()
+
+
+def store_chat_message(user_id, user_message, bot_reply, emotion, conversation_id=None, is_guest=False,
+                       prompt_version=None):
+    """
+    Store chat message in Firestore
+    Both messages and the conversation update are committed as ONE batch;
+    the 'seq' field orders messages (user message first, then bot reply)
+    With FIRESTORE_WRITE_BEHIND=true the turn is queued and written in the background
+    """
     if not db:
         return
     
     try:
-        # Use separate timestamps to ensure proper ordering
-        user_timestamp = datetime.now().isoformat()
-        
         if conversation_id:
-            # Store user message first
-            user_message_ref = db.collection('conversations').document(conversation_id).collection('messages').document()
-            user_message_ref.set({
-                'message': user_message,
-                'sender': 'user',
-                'timestamp': user_timestamp,
-                'order': 0  # User message comes first
-            })
-            
-            # Add a small delay to ensure bot message has a later timestamp
-            import time
-            time.sleep(0.01)
-            
-            bot_timestamp = datetime.now().isoformat()
-            
-            # Store bot reply second
-            bot_message_ref = db.collection('conversations').document(conversation_id).collection('messages').document()
-            bot_message_ref.set({
-                'message': bot_reply,
-                'sender': 'bot',
-                'emotion': emotion,
-                'timestamp': bot_timestamp,
-                'order': 1  # Bot message comes second
-            })
-            
-            # Update conversation lastUpdated and lastMessage (camelCase)
-            conversation_ref = db.collection('conversations').document(conversation_id)
-            conversation_ref.update({
-                'lastUpdated': bot_timestamp,
-                'lastMessage': user_message[:50]
-            })
+            turn = build_chat_turn(user_message, bot_reply, emotion, is_guest, prompt_version)
+            # Keep the cached sidebar order right without re-querying
+            if not conversation_cache.touch(conversation_id, turn['timestamp']):
+                conversation_cache.invalidate(user_id, is_guest)
+            if write_behind and write_behind.enqueue(conversation_id, turn):
+                log.debug("📨 Chat queued", extra={'user_id': user_id, 'conversation_id': conversation_id})
+                return
+            write_chat_turns(conversation_id, [turn])
         else:
             # No conversation_id provided - this shouldn't happen
-            print(f"⚠️ Warning: No conversation_id provided for user {user_id}. Message NOT saved.")
-            print(f"   This indicates the conversation wasn't created properly.")
+            log.warning("⚠️ No conversation_id provided, message NOT saved "
+                        "(the conversation wasn't created properly)", extra={'user_id': user_id})
+            return
         
-        print(f"✅ Chat stored for user: {user_id}")
+        log.debug("✅ Chat stored", extra={'user_id': user_id, 'conversation_id': conversation_id})
     
     except Exception as e:
-        print(f"Error storing chat in Firestore: {e}")
+        log.error("❌ Error storing chat in Firestore", extra={'conversation_id': conversation_id, 'error': str(e)})
         raise
 
 
+def is_missing_document_error(error):
+    """The conversation was deleted before its queued turns were written"""
+    return isinstance(error, NotFound)
+
+
+# Write-behind persistence: /chat returns before Firestore is written (see write_behind.py)
+if db and os.getenv('FIRESTORE_WRITE_BEHIND', 'false').lower() == 'true':
+    write_behind = WriteBehindQueue(
+        write_chat_turns,
+        journal_dir=os.getenv('WRITE_BEHIND_JOURNAL_DIR', 'write_behind_journal'),
+        max_pending=int(os.getenv('WRITE_BEHIND_MAX_PENDING', '1000')),
+        workers=int(os.getenv('WRITE_BEHIND_WORKERS', '2')),
+        requeue_delay=float(os.getenv('WRITE_BEHIND_REQUEUE_SECONDS', '60')),
+        is_permanent=is_missing_document_error
+    )
+else:
+    write_behind = None
+
+
+def message_sort_key(msg_data):
+    """
+    Ordering key for stored messages
+    New messages carry 'seq'; older ones are ordered by timestamp, then 'order'
+    """
+    if 'seq' in msg_data:
+        return msg_data['seq']
+    return legacy_sequence(msg_data.get('timestamp'), msg_data.get('order', 0))
+
+
 # ==================== CONVERSATION MANAGEMENT ROUTES ====================
 
+CONVERSATIONS_PAGE_SIZE = 30
+CONVERSATIONS_MAX_PAGE_SIZE = 100
+# Fields the sidebar renders (plus pendingDeletion, used to hide logged-out guest data)
+CONVERSATION_LIST_FIELDS = ['title', 'lastUpdated', 'pendingDeletion']
+# Log every listed conversation and count a user's conversations when the list is empty
+CONVERSATIONS_DEBUG = os.getenv('CONVERSATIONS_DEBUG', 'false').lower() == 'true'
+
+
 @app.route('/conversations', methods=['GET', 'POST'])
 def manage_conversations():
-    """Get all conversations or create new conversation"""
+    """Get a page of conversations (newest first) or create new conversation"""
     if request.method == 'GET':
         user_id = request.args.get('user_id')
         is_archived = request.args.get('is_archived', 'false').lower() == 'true'
         is_guest = request.args.get('is_guest', 'false').lower() == 'true'
+        limit = max(1, min(request.args.get('limit', CONVERSATIONS_PAGE_SIZE, type=int), CONVERSATIONS_MAX_PAGE_SIZE))
+        cursor = request.args.get('cursor')  # from the previous page's next_cursor
         
+        empty_page = {'conversations': [], 'has_more': False, 'next_cursor': None}
         if not user_id or not db:
-            return jsonify([])
+            return jsonify(empty_page)
+        
+        if not cursor:
+            cached_page = conversation_cache.get(user_id, is_guest, is_archived, limit)
+            if cached_page is not None:
+                log.debug("⚡ Served conversations from cache",
+                          extra={'user_id': user_id, 'conversations': len(cached_page['conversations'])})
+                return jsonify(cached_page)
         
         try:
-            print(f"🔍 Querying conversations: userId={user_id}, isGuest={is_guest}, isArchived={is_archived}")
+            log.debug("🔍 Querying conversations",
+                      extra={'user_id': user_id, 'is_guest': is_guest, 'is_archived': is_archived})
             
             # Query conversations with proper filters
             # NOTE: Firestore requires composite index for multiple where clauses
@@ -546,30 +1187,51 @@ def manage_conversations():
                 .where('userId', '==', user_id)\
                 .where('isAnonymous', '==', is_guest)\
                 .where('isArchived', '==', is_archived)\
-                .order_by('lastUpdated', direction=firestore.Query.DESCENDING)
+                .order_by('lastUpdated', direction=firestore.Query.DESCENDING)\
+                .order_by('__name__', direction=firestore.Query.DESCENDING)
+            if cursor:
+                last_updated, cursor_id = decode_cursor(cursor)
+                position = {'lastUpdated': last_updated}
+                if cursor_id:
+                    position['__name__'] = cursor_id
+                conversations_ref = conversations_ref.start_after(position)
+            
+            # Only the fields the sidebar needs; one extra document tells us if there are more
+            docs = list(conversations_ref.select(CONVERSATION_LIST_FIELDS).limit(limit + 1).stream())
+            has_more = len(docs) > limit
+            docs = docs[:limit]
             
             conversations = []
-            for doc in conversations_ref.stream():
+            for doc in docs:
                 conv_data = doc.to_dict()
+                if conv_data.pop('pendingDeletion', False):
+                    continue  # guest logged out; waiting for the sweeper
                 conv_data['id'] = doc.id
                 conversations.append(conv_data)
-                print(f"   📄 Found conversation: {doc.id} - {conv_data.get('title', 'No title')}")
+                if CONVERSATIONS_DEBUG:
+                    log.debug("📄 Found conversation", extra={'conversation_id': doc.id, 'title': conv_data.get('title')})
             
-            print(f"✅ Loaded {len(conversations)} {'archived' if is_archived else 'active'} conversations for {'guest' if is_guest else 'user'}: {user_id}")
+            log.debug("✅ Loaded conversations", extra={
+                'user_id': user_id, 'is_guest': is_guest, 'is_archived': is_archived, 'conversations': len(conversations)})
             
             # Debug: If no conversations found, check if any exist for this user at all
-            if len(conversations) == 0:
-                print(f"⚠️ No conversations found with filters. Checking all conversations for user...")
-                all_convs_ref = db.collection('conversations').where('userId', '==', user_id)
-                all_count = len(list(all_convs_ref.stream()))
-                print(f"   Total conversations for this user (no filters): {all_count}")
+            if CONVERSATIONS_DEBUG and not docs and not cursor:
+                all_count = db.collection('conversations').where('userId', '==', user_id)\
+                    .count().get()[0][0].value
+                log.debug("⚠️ No conversations found with filters",
+                          extra={'user_id': user_id, 'unfiltered_conversations': all_count})
+            
+            if not cursor:
+                conversation_cache.put(user_id, is_guest, is_archived, conversations, complete=not has_more)
             
-            return jsonify(conversations)
+            return jsonify({
+                'conversations': conversations,
+                'has_more': has_more,
+                'next_cursor': encode_cursor({'id': docs[-1].id, **docs[-1].to_dict()}) if has_more else None
+            })
         except Exception as e:
-            print(f"❌ Error fetching conversations: {e}")
-            import traceback
-            traceback.print_exc()
-            return jsonify([])
+            log.exception("❌ Error fetching conversations", extra={'user_id': user_id})
+            return jsonify(empty_page)
     
     elif request.method == 'POST':
         data = request.json
@@ -583,10 +1245,11 @@ def manage_conversations():
             return jsonify({'error': 'Invalid request'}), 400
         
         try:
-            # Generate smart title if requested
-            if generate_smart_title_flag and first_message:
-                title = generate_smart_title(first_message)
-                print(f"✨ Using AI-generated title: {title}")
+            # Local title now; Groq's title replaces it in the background
+            smart_title = generate_smart_title_flag and first_message
+            if smart_title:
+                title = local_title(first_message)
+                log.debug("⚡ Using local title", extra={'title': title})
             
             conversation_ref = db.collection('conversations').document()
             conversation_data = {
@@ -596,15 +1259,25 @@ def manage_conversations():
                 'createdAt': datetime.now().isoformat(),
                 'lastUpdated': datetime.now().isoformat(),
                 'isArchived': False,
-                'lastMessage': ''
+                'lastMessage': '',
+                'seqOrdered': True  # every message carries 'seq', so pages can be queried by it
             }
+            if smart_title:
+                conversation_data['titleSource'] = 'local'
+            if is_guest:
+                # Purged by the guest sweeper unless the guest keeps chatting
+                conversation_data['expiresAt'] = guest_expiry(GUEST_DATA_TTL_SECONDS)
             conversation_ref.set(conversation_data)
             
             conversation_data['id'] = conversation_ref.id
-            print(f"✅ Created new conversation '{title}' for {'guest' if is_guest else 'user'}: {user_id}")
+            conversation_cache.add(user_id, is_guest, False, conversation_data)
+            if smart_title and title_upgrader:
+                title_upgrader.schedule(conversation_ref.id, first_message)
+            log.info("✅ Created new conversation", extra={
+                'user_id': user_id, 'is_guest': is_guest, 'conversation_id': conversation_ref.id, 'title': title})
             return jsonify(conversation_data), 201
         except Exception as e:
-            print(f"Error creating conversation: {e}")
+            log.error("❌ Error creating conversation", extra={'user_id': user_id, 'error': str(e)})
             return jsonify({'error': 'Failed to create conversation'}), 500
 
 
@@ -623,24 +1296,28 @@ def update_conversation(conversation_id):
         
         try:
             conversation_ref = db.collection('conversations').document(conversation_id)
-            conversation_ref.update({'title': title})
+            # titleSource 'user' stops a pending background title from overwriting it
+            conversation_ref.update({'title': title, 'titleSource': 'user'})
+            conversation_cache.rename(conversation_id, title)
             return jsonify({'success': True})
         except Exception as e:
-            print(f"Error updating conversation: {e}")
+            log.error("❌ Error updating conversation", extra={'conversation_id': conversation_id, 'error': str(e)})
             return jsonify({'error': 'Failed to update'}), 500
     
     elif request.method == 'DELETE':
         try:
-            # Delete all messages in conversation
-            messages_ref = db.collection('conversations').document(conversation_id).collection('messages')
-            for msg in messages_ref.stream():
-                msg.reference.delete()
+            # Don't let queued turns land after the conversation is gone
+            if write_behind:
+                write_behind.discard(conversation_id)
             
-            # Delete conversation
-            db.collection('conversations').document(conversation_id).delete()
+            # Delete all messages in conversation, then the conversation itself
+            deleted_messages = conversation_deleter.delete_conversation(conversation_id)
+            conversation_cache.remove(conversation_id)
+            log.info("🗑️ Deleted conversation",
+                     extra={'conversation_id': conversation_id, 'deleted_messages': deleted_messages})
             return jsonify({'success': True})
         except Exception as e:
-            print(f"Error deleting conversation: {e}")
+            log.error("❌ Error deleting conversation", extra={'conversation_id': conversation_id, 'error': str(e)})
             return jsonify({'error': 'Failed to delete'}), 500
 
 
@@ -654,45 +1331,133 @@ def archive_conversation(conversation_id):
     is_archived = data.get('is_archived', False)
     
     try:
+        last_updated = datetime.now().isoformat()
         conversation_ref = db.collection('conversations').document(conversation_id)
         conversation_ref.update({
             'isArchived': is_archived,
-            'lastUpdated': datetime.now().isoformat()
+            'lastUpdated': last_updated
         })
-        print(f"✅ Conversation {conversation_id} {'archived' if is_archived else 'unarchived'}")
+        if not conversation_cache.move(conversation_id, is_archived, last_updated) and data.get('user_id'):
+            conversation_cache.invalidate(data['user_id'])
+        log.info("✅ Conversation archived" if is_archived else "✅ Conversation unarchived",
+                 extra={'conversation_id': conversation_id})
         return jsonify({'success': True})
     except Exception as e:
-        print(f"Error archiving conversation: {e}")
+        log.error("❌ Error archiving conversation", extra={'conversation_id': conversation_id, 'error': str(e)})
         return jsonify({'error': 'Failed to archive'}), 500
 
 
+MESSAGES_PAGE_SIZE = 50
+MESSAGES_MAX_PAGE_SIZE = 200
+
+
 @app.route('/conversations/<conversation_id>/messages', methods=['GET'])
 def get_conversation_messages(conversation_id):
-    """Get all messages in a conversation"""
+    """
+    Get one page of messages in a conversation, oldest first
+    Query params:
+      limit  - page size (default 50)
+      before - seq cursor: the page of messages just older than this
+      after  - seq cursor: the messages newer than this
+    Without a cursor the newest page is returned. The response carries an ETag
+    built from the conversation's lastSeq/messageCount/lastUpdated, so a client sending
+    If-None-Match gets a 304 without any message reads
+    """
+    empty_page = {'messages': [], 'has_more': False, 'before': None, 'after': None}
     if not db:
-        return jsonify([])
+        return jsonify(empty_page)
     
     try:
-        messages_ref = db.collection('conversations').document(conversation_id)\
-            .collection('messages')\
-            .order_by('timestamp')
+        limit = max(1, min(int(request.args.get('limit', MESSAGES_PAGE_SIZE)), MESSAGES_MAX_PAGE_SIZE))
+        before = request.args.get('before', type=int)
+        after = request.args.get('after', type=int)
+        
+        conversation_ref = db.collection('conversations').document(conversation_id)
+        conversation_doc = conversation_ref.get()
+        if not conversation_doc.exists:
+            return jsonify(empty_page)
+        conv_data = conversation_doc.to_dict()
         
-        messages = []
-        for msg_doc in messages_ref.stream():
-            msg_data = msg_doc.to_dict()
-            messages.append(msg_data)
+        etag = message_page_etag(conversation_id, conv_data, limit, before, after)
+        if request.if_none_match.contains_weak(etag):
+            response = Response(status=304)
+        else:
+            if conv_data.get('seqOrdered'):
+                page = query_message_page(conversation_ref, limit, before, after)
+            else:
+                page = legacy_message_page(conversation_ref, limit, before, after)
+            response = jsonify(page)
         
-        return jsonify(messages)
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
     except Exception as e:
-        print(f"Error fetching messages: {e}")
-        return jsonify([])
+        log.error("❌ Error fetching messages", extra={'conversation_id': conversation_id, 'error': str(e)})
+        return jsonify(empty_page)
+
+
+def message_page_etag(conversation_id, conv_data, limit, before, after):
+    """Changes whenever a message is written to the conversation (or the page asked for changes)"""
+    key = (f"{conversation_id}:{conv_data.get('lastSeq')}:{conv_data.get('messageCount')}:"
+           f"{conv_data.get('lastUpdated')}:{limit}:{before}:{after}")
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def message_page(messages, limit, newest_first):
+    """Trim a page fetched with limit + 1 and describe its cursors"""
+    more = len(messages) > limit
+    messages = messages[:limit]
+    if newest_first:
+        messages.reverse()
+    return {
+        'messages': messages,
+        'has_more': more,
+        # Pass as ?before= to load older messages / ?after= to load newer ones
+        'before': message_sort_key(messages[0]) if messages else None,
+        'after': message_sort_key(messages[-1]) if messages else None
+    }
+
+
+def query_message_page(conversation_ref, limit, before, after):
+    """One page straight from Firestore: limit + 1 reads ordered by 'seq'"""
+    messages_ref = conversation_ref.collection('messages')
+    if after is not None:
+        query = messages_ref.where('seq', '>', after)\
+            .order_by('seq').limit(limit + 1)
+        newest_first = False
+    else:
+        query = messages_ref
+        if before is not None:
+            query = query.where('seq', '<', before)
+        query = query.order_by('seq', direction=firestore.Query.DESCENDING).limit(limit + 1)
+        newest_first = True
+    
+    messages = [msg_doc.to_dict() for msg_doc in query.stream()]
+    return message_page(messages, limit, newest_first)
+
+
+def legacy_message_page(conversation_ref, limit, before, after):
+    """
+    Conversations from before 'seq' existed (cleanup_database.py backfills it):
+    read all messages and page in memory
+    """
+    messages = [msg_doc.to_dict() for msg_doc in conversation_ref.collection('messages').stream()]
+    messages.sort(key=message_sort_key)
+    
+    if after is not None:
+        newer = [m for m in messages if message_sort_key(m) > after]
+        return message_page(newer, limit, False)
+    if before is not None:
+        messages = [m for m in messages if message_sort_key(m) < before]
+    messages.reverse()
+    return message_page(messages, limit, True)
 
 
 @app.route('/logout', methods=['POST'])
 def logout():
     """
     Handle user logout
-    For guest users: Delete all their conversations
+    For guest users: Mark all their conversations for deletion
     For logged-in users: Just clear in-memory data (conversations persist)
     """
     try:
@@ -701,54 +1466,35 @@ def logout():
         is_guest = data.get('is_guest', False)
         
         # Clear in-memory conversation history
-        if user_id in conversation_history:
-            conversation_history[user_id] = []
-            print(f"🗑️ In-memory history cleared for user: {user_id}")
+        if conversation_store.clear(user_id):
+            log.info("🗑️ In-memory history cleared", extra={'user_id': user_id})
         
-        # For guest users: DELETE all conversations from Firestore
+        # For guest users: mark all conversations for deletion (purged in the background)
         if is_guest and db and user_id:
             try:
-                # Query all guest conversations
-                conversations_ref = db.collection('conversations')\
-                    .where('userId', '==', user_id)\
-                    .where('isAnonymous', '==', True)
-                
-                deleted_count = 0
-                
-                for conv_doc in conversations_ref.stream():
-                    conversation_id = conv_doc.id
-                    
-                    # Delete all messages in this conversation
-                    messages_ref = db.collection('conversations')\
-                        .document(conversation_id)\
-                        .collection('messages')
-                    
-                    for msg_doc in messages_ref.stream():
-                        msg_doc.reference.delete()
-                    
-                    # Delete the conversation document
-                    conv_doc.reference.delete()
-                    deleted_count += 1
+                marked_count = mark_guest_conversations(user_id)
                 
-                print(f"🗑️ Guest logout: Deleted {deleted_count} conversation(s) for user: {user_id}")
+                log.info("🗑️ Guest logout: conversations marked for deletion",
+                         extra={'user_id': user_id, 'conversations': marked_count})
                 return jsonify({
                     'success': True,
-                    'message': 'Guest data deleted',
-                    'deleted_conversations': deleted_count
+                    'message': 'Guest data scheduled for deletion',
+                    'deleted_conversations': marked_count
                 })
             except Exception as e:
-                print(f"❌ Error deleting guest data on logout: {e}")
+                log.error("❌ Error marking guest data for deletion on logout",
+                          extra={'user_id': user_id, 'error': str(e)})
                 return jsonify({'success': False, 'error': 'Failed to delete guest data'}), 500
         
         # For logged-in users: Just confirm logout
-        print(f"✅ Logged-in user logout: Data persisted for user: {user_id}")
+        log.info("✅ Logged-in user logout: data persisted", extra={'user_id': user_id})
         return jsonify({
             'success': True,
             'message': 'Logged out successfully'
         })
     
     except Exception as e:
-        print(f"❌ Error in logout: {e}")
+        log.error("❌ Error in logout", extra={'error': str(e)})
         return jsonify({'success': False, 'error': 'Logout failed'}), 500
 
 
@@ -0,0 +1,111 @@
+"""
+Crisis Detector Benchmark
+Per-message matching cost of the crisis detector's Aho-Corasick automaton,
+next to a naive substring loop and one big regex alternation over the same
+normalised phrases
+
+Usage:
+    python benchmarks/benchmark_crisis_detector.py
+    python benchmarks/benchmark_crisis_detector.py --repeat 200 --phrases crisis_phrases.txt
+    python benchmarks/benchmark_crisis_detector.py --extra-phrases 2000   # how each scales with the list
+"""
+
+import argparse
+import os
+import re
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from crisis_detector import DEFAULT_PHRASES_PATH, CrisisDetector, load_phrases, normalize
+
+DEFAULT_EVAL_SET = os.path.join(ROOT, 'benchmarks', 'emotion_eval_set.jsonl')
+
+# Long messages are where a per-phrase scan hurts most
+LONG_MESSAGE = ("Today was long. I had three meetings, missed lunch and my manager kept asking for updates "
+                "while I was still catching up on email from last week. ") * 12
+
+
+def load_messages(path):
+    """Evaluation-set texts plus a few long and crisis messages"""
+    import json
+    with open(path, encoding='utf-8') as f:
+        messages = [json.loads(line)['text'] for line in f if line.strip()]
+    return messages + [LONG_MESSAGE, LONG_MESSAGE + " honestly I just want to end it all",
+                       "i dont want to b alive anymore", "I keep cuttting myself when it gets bad"]
+
+
+def time_per_message(messages, check, repeat):
+    """Mean microseconds per message for each message, over repeat runs"""
+    timings = []
+    for message in messages:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            check(message)
+        timings.append((time.perf_counter() - started) / repeat * 1_000_000)
+    return timings
+
+
+def report(name, timings, flagged, total):
+    ordered = sorted(timings)
+    p95 = ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)]
+    print(f"   {name:<22} mean {statistics.mean(timings):7.2f} µs   p50 {statistics.median(timings):7.2f} µs   "
+          f"p95 {p95:7.2f} µs   max {ordered[-1]:7.2f} µs   flagged {flagged}/{total}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark crisis phrase matching')
+    parser.add_argument('--eval-set', default=DEFAULT_EVAL_SET, help='JSONL file with {"text": ...} messages')
+    parser.add_argument('--phrases', default=DEFAULT_PHRASES_PATH, help='Crisis phrase file')
+    parser.add_argument('--repeat', type=int, default=100, help='Runs per message')
+    parser.add_argument('--extra-phrases', type=int, default=0,
+                        help='Add this many synthetic (never matching) phrases to the list')
+    args = parser.parse_args()
+
+    messages = load_messages(args.eval_set)
+    phrases = load_phrases(args.phrases)
+    for i in range(args.extra_phrases):
+        # Letters only, no doubled letters, so normalisation keeps every phrase distinct
+        word = 'x'.join(chr(ord('a') + int(digit)) for digit in str(i))
+        phrases[f"zq {word} never said"] = 'synthetic'
+
+    started = time.perf_counter()
+    detector = CrisisDetector(phrases)
+    build_ms = (time.perf_counter() - started) * 1000
+
+    # Same normalisation for the baselines, padded so matches stay on word boundaries
+    keys = [f" {normalize(phrase)} " for phrase in phrases]
+    pattern = re.compile('|'.join(re.escape(key) for key in sorted(keys, key=len, reverse=True)))
+
+    def naive(message):
+        text = f" {normalize(message)} "
+        return [key for key in keys if key in text]
+
+    def regex(message):
+        return pattern.search(f" {normalize(message)} ")
+
+    def normalize_only(message):
+        return normalize(message)
+
+    print(f"🧪 {len(messages)} messages, {len(phrases)} phrases, {args.repeat} runs each")
+    print(f"   Automaton built in {build_ms:.2f} ms ({detector.stats()['automaton_states']} states)\n")
+
+    total = len(messages)
+    report('normalize only', time_per_message(messages, normalize_only, args.repeat), 0, total)
+    report('aho-corasick (detector)', time_per_message(messages, detector.detect, args.repeat),
+           sum(1 for m in messages if detector.detect(m)), total)
+    report('naive substring loop', time_per_message(messages, naive, args.repeat),
+           sum(1 for m in messages if naive(m)), total)
+    report('regex alternation', time_per_message(messages, regex, args.repeat),
+           sum(1 for m in messages if regex(m)), total)
+
+    long_us = time_per_message([LONG_MESSAGE], detector.detect, args.repeat)[0]
+    print(f"\n   Detector on a {len(LONG_MESSAGE)}-char message: {long_us:.1f} µs "
+          f"({long_us / len(LONG_MESSAGE) * 1000:.0f} ns/char)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""
+Emotion Classifier Evaluation
+Reports accuracy and latency of the local classifier against the labelled
+evaluation set, and optionally against the current Groq (LLM) path
+
+Usage:
+    python benchmarks/evaluate_emotion_classifier.py
+    python benchmarks/evaluate_emotion_classifier.py --llm --threshold 0.6
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from emotion_classifier import EMOTIONS, get_classifier
+
+DEFAULT_EVAL_SET = os.path.join(ROOT, 'benchmarks', 'emotion_eval_set.jsonl')
+
+
+def load_eval_set(path):
+    """Load labelled examples: one {"text": ..., "label": ...} per line"""
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(examples, predict):
+    """Run predict(text) -> (label, confidence) over examples, timing each call"""
+    results = []
+    for example in examples:
+        started = time.perf_counter()
+        label, confidence = predict(example['text'])
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        results.append({
+            'text': example['text'],
+            'expected': example['label'],
+            'predicted': label,
+            'confidence': confidence,
+            'latency_ms': elapsed_ms,
+        })
+    return results
+
+
+def report(name, results):
+    """Print accuracy, per-emotion recall and latency for one run"""
+    correct = sum(1 for r in results if r['predicted'] == r['expected'])
+    latencies = [r['latency_ms'] for r in results]
+
+    print(f"\n📊 {name}")
+    print(f"   Accuracy: {correct}/{len(results)} ({correct / len(results):.1%})")
+    for emotion in EMOTIONS:
+        subset = [r for r in results if r['expected'] == emotion]
+        if subset:
+            hits = sum(1 for r in subset if r['predicted'] == emotion)
+            print(f"   - {emotion:<9} recall {hits}/{len(subset)}")
+    print(f"   Latency: mean {statistics.mean(latencies):.3f} ms, "
+          f"p50 {percentile(latencies, 50):.3f} ms, p95 {percentile(latencies, 95):.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Evaluate the local emotion classifier')
+    parser.add_argument('--eval-set', default=DEFAULT_EVAL_SET, help='Path to the labelled JSONL evaluation set')
+    parser.add_argument('--classifier', default='lexicon', help='Local classifier name')
+    parser.add_argument('--threshold', type=float, default=float(os.getenv('EMOTION_CONFIDENCE_THRESHOLD', '0.6')),
+                        help='Confidence below which detect_emotion escalates to Groq')
+    parser.add_argument('--llm', action='store_true', help='Also evaluate the Groq path (uses API credits)')
+    parser.add_argument('--show-errors', action='store_true', help='List misclassified examples')
+    args = parser.parse_args()
+
+    examples = load_eval_set(args.eval_set)
+    classifier = get_classifier(args.classifier)
+    print(f"🧪 Evaluating on {len(examples)} labelled messages")
+
+    local = run(examples, classifier.classify)
+    report(f"Local classifier ({args.classifier})", local)
+
+    confident = [r for r in local if r['confidence'] >= args.threshold]
+    if confident:
+        hits = sum(1 for r in confident if r['predicted'] == r['expected'])
+        print(f"   Above threshold {args.threshold}: {len(confident)}/{len(local)} handled locally, "
+              f"accuracy {hits}/{len(confident)} ({hits / len(confident):.1%})")
+    else:
+        print(f"   Above threshold {args.threshold}: 0/{len(local)} handled locally")
+
+    if args.show_errors:
+        print("\n❌ Misclassified:")
+        for r in local:
+            if r['predicted'] != r['expected']:
+                print(f"   [{r['expected']} → {r['predicted']} @ {r['confidence']:.2f}] {r['text']}")
+
+    if args.llm:
+        import app
+
+        llm = run(examples, lambda text: (app.detect_emotion_llm(text), 1.0))
+        report("Groq LLM path (detect_emotion_llm)", llm)
+
+        # Hybrid: what detect_emotion does - local when confident, otherwise the LLM answer
+        hybrid = []
+        for local_result, llm_result in zip(local, llm):
+            escalated = local_result['confidence'] < args.threshold
+            chosen = dict(llm_result if escalated else local_result)
+            chosen['latency_ms'] = local_result['latency_ms'] + (llm_result['latency_ms'] if escalated else 0)
+            hybrid.append(chosen)
+        report(f"Hybrid (local, escalate below {args.threshold})", hybrid)
+
+
+if __name__ == '__main__':
+    main()
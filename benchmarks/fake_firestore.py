@@ -0,0 +1,317 @@
+"""
+Fake Firestore
+In-memory stand-in for the part of the Firestore client app.py uses, for
+load tests without a Firebase project or the emulator
+
+Covers collection/document references, where/order_by/start_after/limit/
+select queries, count() aggregations, batches, update preconditions
+(write_option) and the Increment/Maximum field transforms. Every read and write is counted, and an optional fixed
+latency per round trip makes timings closer to a real backend
+"""
+
+import copy
+import itertools
+import threading
+import time
+import uuid
+
+from google.api_core.exceptions import FailedPrecondition, NotFound
+from google.cloud.firestore_v1.transforms import Increment, Maximum
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b,
+    'in': lambda a, b: a in b,
+}
+
+
+class DocumentSnapshot:
+    def __init__(self, reference, data, update_time=None):
+        self.reference = reference
+        self.id = reference.id
+        self.update_time = update_time
+        self._data = data
+
+    @property
+    def exists(self):
+        return self._data is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._data)
+
+    def get(self, field):
+        return self._data.get(field)
+
+
+class AggregationResult:
+    def __init__(self, alias, value):
+        self.alias = alias
+        self.value = value
+
+
+class CountQuery:
+    def __init__(self, query, alias):
+        self._query = query
+        self._alias = alias or 'count'
+
+    def get(self):
+        return [[AggregationResult(self._alias, len(self._query._run(count_reads=False)))]]
+
+
+class Query:
+    def __init__(self, client, path, filters=(), orders=(), limit=None, start_after=None, fields=None):
+        self._client = client
+        self._path = path
+        self._filters = tuple(filters)
+        self._orders = tuple(orders)
+        self._limit = limit
+        self._start_after = start_after
+        self._fields = fields
+
+    def _copy(self, **changes):
+        settings = {'filters': self._filters, 'orders': self._orders, 'limit': self._limit,
+                    'start_after': self._start_after, 'fields': self._fields}
+        settings.update(changes)
+        return Query(self._client, self._path, **settings)
+
+    def where(self, field_path=None, op_string=None, value=None, filter=None):
+        if filter is not None:
+            field_path, op_string, value = filter.field_path, filter.op_string, filter.value
+        return self._copy(filters=self._filters + ((field_path, op_string, value),))
+
+    def order_by(self, field_path, direction='ASCENDING'):
+        return self._copy(orders=self._orders + ((field_path, direction),))
+
+    def limit(self, count):
+        return self._copy(limit=count)
+
+    def start_after(self, values):
+        return self._copy(start_after=values)
+
+    def select(self, field_paths):
+        return self._copy(fields=list(field_paths))
+
+    def count(self, alias=None):
+        return CountQuery(self._copy(fields=None, limit=None), alias)
+
+    def stream(self):
+        return iter(self._run())
+
+    def get(self):
+        return self._run()
+
+    def _matches(self, data):
+        for field, op, value in self._filters:
+            if field not in data or not _OPERATORS[op](data[field], value):
+                return False
+        return True
+
+    @staticmethod
+    def _value(path, data, field):
+        """Field value for ordering; '__name__' is the document ID"""
+        return path[-1] if field == '__name__' else data[field]
+
+    def _sort_key(self, path, data):
+        return [self._value(path, data, field) for field, _ in self._orders]
+
+    def _after_cursor(self, path, data):
+        cursor = self._start_after
+        if isinstance(cursor, DocumentSnapshot):
+            cursor = {**cursor.to_dict(), '__name__': cursor.id}
+        if isinstance(cursor, dict):
+            # Like Firestore, a cursor may give values for a prefix of the orderings only
+            cursor = [cursor[field] for field, _ in self._orders if field in cursor]
+        cursor = [bound.id if isinstance(bound, DocumentReference) else bound for bound in cursor]
+        for (_, direction), value, bound in zip(self._orders, self._sort_key(path, data), cursor):
+            if value != bound:
+                return (value > bound) == (direction == 'ASCENDING')
+        return False
+
+    def _run(self, count_reads=True):
+        self._client.round_trip()
+        with self._client.lock:
+            rows = [(path, copy.deepcopy(data)) for path, data in self._client.docs.items()
+                    if len(path) == len(self._path) + 1 and path[:-1] == self._path and self._matches(data)]
+        # Like Firestore, ordering on a field leaves out documents without it
+        rows = [(path, data) for path, data in rows
+                if all(field in data or field == '__name__' for field, _ in self._orders)]
+        for field, direction in reversed(self._orders):
+            rows.sort(key=lambda row: self._value(*row, field), reverse=direction == 'DESCENDING')
+        if self._start_after is not None:
+            rows = [(path, data) for path, data in rows if self._after_cursor(path, data)]
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        if self._fields is not None:
+            rows = [(path, {k: v for k, v in data.items() if k in self._fields}) for path, data in rows]
+        if count_reads:
+            self._client.count_reads(max(1, len(rows)))
+        return [DocumentSnapshot(DocumentReference(self._client, path), data) for path, data in rows]
+
+
+class CollectionReference(Query):
+    def __init__(self, client, path):
+        super().__init__(client, path)
+        self.id = path[-1]
+
+    def document(self, document_id=None):
+        return DocumentReference(self._client, self._path + (document_id or uuid.uuid4().hex[:20],))
+
+
+class DocumentReference:
+    def __init__(self, client, path):
+        self._client = client
+        self._path = path
+        self.id = path[-1]
+
+    @property
+    def path(self):
+        return '/'.join(self._path)
+
+    def collection(self, name):
+        return CollectionReference(self._client, self._path + (name,))
+
+    def get(self, field_paths=None):
+        self._client.round_trip()
+        self._client.count_reads(1)
+        with self._client.lock:
+            data = copy.deepcopy(self._client.docs.get(self._path))
+            return DocumentSnapshot(self, data, self._client.update_times.get(self._path))
+
+    def set(self, document_data, merge=False):
+        self._client.round_trip()
+        with self._client.lock:
+            self._client.apply_set(self._path, document_data, merge)
+
+    def update(self, field_updates, option=None):
+        self._client.round_trip()
+        with self._client.lock:
+            self._client.check_update(self._path, option)
+            self._client.apply_update(self._path, field_updates)
+
+    def delete(self):
+        self._client.round_trip()
+        with self._client.lock:
+            self._client.apply_delete(self._path)
+
+
+class WriteBatch:
+    MAX_WRITES = 500
+
+    def __init__(self, client):
+        self._client = client
+        self._writes = []
+
+    def set(self, reference, document_data, merge=False):
+        self._writes.append(('set', reference._path, document_data, merge))
+
+    def update(self, reference, field_updates):
+        self._writes.append(('update', reference._path, field_updates, None))
+
+    def delete(self, reference):
+        self._writes.append(('delete', reference._path, None, None))
+
+    def __len__(self):
+        return len(self._writes)
+
+    def commit(self):
+        if len(self._writes) > self.MAX_WRITES:
+            raise ValueError(f"A batch can hold at most {self.MAX_WRITES} writes")
+        self._client.round_trip()
+        with self._client.lock:
+            # All or nothing, like a real batch
+            for kind, path, _, _ in self._writes:
+                if kind == 'update':
+                    self._client.check_update(path, None)
+            for kind, path, data, merge in self._writes:
+                if kind == 'set':
+                    self._client.apply_set(path, data, merge)
+                elif kind == 'update':
+                    self._client.apply_update(path, data)
+                else:
+                    self._client.apply_delete(path)
+            self._client.commits += 1
+        return []
+
+
+class FakeFirestore:
+    """
+    Thread-safe in-memory database; pass latency_ms to add a fixed delay to
+    every round trip (query, get, write, batch commit)
+    """
+
+    def __init__(self, latency_ms=0.0):
+        self.latency = latency_ms / 1000
+        self.lock = threading.RLock()
+        self.docs = {}          # path tuple -> data
+        self.update_times = {}  # path tuple -> write counter, stands in for update_time
+        self.reads = 0
+        self.writes = 0
+        self.commits = 0
+        self._clock = itertools.count(1)
+
+    def collection(self, name):
+        return CollectionReference(self, (name,))
+
+    def document(self, path):
+        return DocumentReference(self, tuple(path.split('/')))
+
+    def batch(self):
+        return WriteBatch(self)
+
+    def write_option(self, last_update_time=None):
+        return last_update_time
+
+    def round_trip(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def count_reads(self, count):
+        with self.lock:
+            self.reads += count
+
+    def check_update(self, path, last_update_time):
+        if path not in self.docs:
+            raise NotFound(f"No document to update: {'/'.join(path)}")
+        if last_update_time is not None and self.update_times.get(path) != last_update_time:
+            raise FailedPrecondition(f"Document changed since it was read: {'/'.join(path)}")
+
+    def apply_set(self, path, data, merge):
+        if merge and path in self.docs:
+            self.docs[path].update(self._transformed(path, data))
+        else:
+            self.docs[path] = self._transformed(path, data)
+        self._written(path)
+
+    def apply_update(self, path, data):
+        self.docs[path].update(self._transformed(path, data))
+        self._written(path)
+
+    def _transformed(self, path, data):
+        """Copy of data with Increment/Maximum applied to the stored values"""
+        current = self.docs.get(path) or {}
+        values = {}
+        for field, value in data.items():
+            if isinstance(value, Increment):
+                value = current.get(field, 0) + value.value
+            elif isinstance(value, Maximum):
+                value = max(current.get(field, value.value), value.value)
+            values[field] = copy.deepcopy(value)
+        return values
+
+    def apply_delete(self, path):
+        self.docs.pop(path, None)
+        self.update_times.pop(path, None)
+        self.writes += 1
+
+    def _written(self, path):
+        self.update_times[path] = next(self._clock)
+        self.writes += 1
+
+    def stats(self):
+        with self.lock:
+            return {'documents': len(self.docs), 'reads': self.reads, 'writes': self.writes,
+                    'batch_commits': self.commits}
@@ -0,0 +1,225 @@
+"""
+Fake Groq Server
+Local stand-in for Groq's OpenAI-compatible chat completions API, for load
+tests: no API key, no rate limits, no cost, and latency you choose
+
+Point the app at it with GROQ_BASE_URL=http://127.0.0.1:<port> (the Groq SDK
+appends /openai/v1/chat/completions). Answers are picked from the system
+prompt, so every call type gets a reply the app can use: one emotion word,
+a title, a summary, the structured JSON object or a supportive reply.
+Streaming requests get SSE chunks paced at --tokens-per-second
+
+Usage:
+    python benchmarks/fake_groq_server.py --port 8088
+    python benchmarks/fake_groq_server.py --latency-ms 300 --tokens-per-second 250 --error-rate 0.01
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+COMPLETIONS_PATH = '/openai/v1/chat/completions'
+
+EMOTIONS = ['happy', 'sad', 'anxious', 'stressed', 'neutral']
+
+REPLY = ("That sounds like a lot to carry, and it makes sense that you feel this way. "
+         "You're not alone in this. What part of it is weighing on you the most right now? "
+         "Sometimes naming the hardest piece makes the rest feel a little lighter.")
+
+SUMMARY = ("The user has been talking about pressure at work and trouble sleeping. "
+           "They feel tired and a bit overwhelmed and have tried short walks to unwind.")
+
+TITLE = 'Coping With Everyday Stress'
+
+
+def estimate_tokens(text):
+    return max(1, len(text) // 4)
+
+
+def pick_answer(messages):
+    """(call type, reply text) for a request, judged from its system prompt"""
+    system = messages[0]['content'] if messages and messages[0]['role'] == 'system' else ''
+    user = messages[-1]['content'] if messages else ''
+    if 'emotion detection AI' in system:
+        # Deterministic per message, so repeated runs give the same routing
+        return 'emotion', EMOTIONS[sum(map(ord, user)) % len(EMOTIONS)]
+    if 'title generator' in system:
+        return 'title', TITLE
+    if 'running summary' in system:
+        return 'summary', SUMMARY
+    if 'Respond ONLY with a JSON object' in system:
+        emotion = EMOTIONS[sum(map(ord, user)) % len(EMOTIONS)]
+        return 'structured', json.dumps({'emotion': emotion, 'reply': REPLY})
+    return 'reply', REPLY
+
+
+class FakeGroqState:
+    """Server settings plus request counters (shared by all handler threads)"""
+
+    def __init__(self, latency_ms=200, jitter_ms=50, tokens_per_second=400, error_rate=0.0,
+                 rate_limit_requests=14400, rate_limit_tokens=1_000_000):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.rate_limit_requests = rate_limit_requests
+        self.rate_limit_tokens = rate_limit_tokens
+        self._lock = threading.Lock()
+        self._requests = {}
+        self._errors = 0
+
+    def count(self, call_type):
+        with self._lock:
+            self._requests[call_type] = self._requests.get(call_type, 0) + 1
+
+    def count_error(self):
+        with self._lock:
+            self._errors += 1
+
+    def delay(self):
+        """Time to first byte: base latency plus uniform jitter (seconds)"""
+        return max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+
+    def stats(self):
+        with self._lock:
+            return {'requests': dict(self._requests), 'errors': self._errors}
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == '/stats':
+            self._send_json(200, self.state.stats())
+        else:
+            self._send_json(404, {'error': {'message': 'not found'}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        if self.path != COMPLETIONS_PATH:
+            self._send_json(404, {'error': {'message': 'not found'}})
+            return
+
+        call_type, text = pick_answer(body.get('messages', []))
+        self.state.count(call_type)
+        time.sleep(self.state.delay())
+
+        if random.random() < self.state.error_rate:
+            self.state.count_error()
+            self._send_json(503, {'error': {'message': 'fake upstream error', 'type': 'internal_server_error'}})
+            return
+
+        prompt_tokens = sum(estimate_tokens(m.get('content', '')) for m in body.get('messages', []))
+        if body.get('stream'):
+            self._stream(body['model'], text)
+        else:
+            self._send_json(200, {
+                'id': f"chatcmpl-{uuid.uuid4().hex}",
+                'object': 'chat.completion',
+                'created': int(time.time()),
+                'model': body['model'],
+                'choices': [{'index': 0, 'finish_reason': 'stop',
+                             'message': {'role': 'assistant', 'content': text}}],
+                'usage': {'prompt_tokens': prompt_tokens, 'completion_tokens': estimate_tokens(text),
+                          'total_tokens': prompt_tokens + estimate_tokens(text)},
+            }, delay_for=text)
+
+    def _stream(self, model, text):
+        """Send text as SSE chunks of a few words, paced at tokens_per_second"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self._rate_limit_headers()
+        self.end_headers()
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        words = text.split(' ')
+        for i in range(0, len(words), 3):
+            piece = ' '.join(words[i:i + 3]) + (' ' if i + 3 < len(words) else '')
+            self._chunk(completion_id, model, {'content': piece}, None)
+            time.sleep(estimate_tokens(piece) / self.state.tokens_per_second)
+        self._chunk(completion_id, model, {}, 'stop')
+        self._write_chunk(b'data: [DONE]\n\n')
+        self._write_chunk(b'')
+
+    def _chunk(self, completion_id, model, delta, finish_reason):
+        chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': int(time.time()),
+                 'model': model, 'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+        self._write_chunk(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+
+    def _write_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def _send_json(self, status, payload, delay_for=None):
+        if delay_for:
+            # Non-streamed answers arrive once the whole completion is generated
+            time.sleep(estimate_tokens(delay_for) / self.state.tokens_per_second)
+        data = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self._rate_limit_headers()
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _rate_limit_headers(self):
+        # Plenty of headroom, so the app's scheduler never throttles a load test
+        self.send_header('x-ratelimit-limit-requests', str(self.state.rate_limit_requests))
+        self.send_header('x-ratelimit-remaining-requests', str(self.state.rate_limit_requests))
+        self.send_header('x-ratelimit-reset-requests', '0.1s')
+        self.send_header('x-ratelimit-limit-tokens', str(self.state.rate_limit_tokens))
+        self.send_header('x-ratelimit-remaining-tokens', str(self.state.rate_limit_tokens))
+        self.send_header('x-ratelimit-reset-tokens', '0.1s')
+
+
+def make_server(host='127.0.0.1', port=0, **settings):
+    """HTTP server with its own FakeGroqState (port 0 picks a free port)"""
+    handler = type('Handler', (FakeGroqHandler,), {'state': FakeGroqState(**settings)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_server(host='127.0.0.1', port=0, **settings):
+    """Serve in a background thread; server.server_address has the port"""
+    server = make_server(host, port, **settings)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_arguments(parser):
+    """Latency/token-rate options shared with load_test.py"""
+    parser.add_argument('--latency-ms', type=float, default=200, help='Time to first token')
+    parser.add_argument('--jitter-ms', type=float, default=50, help='Uniform +/- jitter on the latency')
+    parser.add_argument('--tokens-per-second', type=float, default=400, help='Generation speed')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of calls answered with a 503')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Groq chat completions server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8088)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                         tokens_per_second=args.tokens_per_second, error_rate=args.error_rate)
+    print(f"🤖 Fake Groq listening on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms:.0f}±{args.jitter_ms:.0f} ms, {args.tokens_per_second:.0f} tokens/s)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
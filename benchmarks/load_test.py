@@ -0,0 +1,427 @@
+"""
+End-to-End Load Test
+Drives the whole app (HTTP routes, history, Groq client, Firestore writes,
+deletes) with scripted multi-user conversations and reports latency
+percentiles, throughput and per-stage timings as JSON
+
+By default everything runs locally: fake_groq_server.py stands in for Groq
+(latency and token rate set below) and serve_app.py runs app.py against the
+in-memory Firestore fake or the emulator. Each virtual user repeats one
+session script until the level's time is up:
+
+    create a conversation -> chat turns (/chat or /chat/stream, some crisis
+    messages) -> list conversations -> page messages -> maybe rename or
+    archive -> delete the conversation (signed-in) or log out (guest)
+
+Per-stage timings come from the app itself: the Server-Timing header of
+/chat and the 'timings' of /chat/stream's done event
+
+Usage:
+    python benchmarks/load_test.py
+    python benchmarks/load_test.py --concurrency 1,8,32 --duration 30 --output results/baseline.json
+    python benchmarks/load_test.py --latency-ms 400 --tokens-per-second 150 --app-env FIRESTORE_WRITE_BEHIND=true
+    python benchmarks/load_test.py --firestore emulator   # needs FIRESTORE_EMULATOR_HOST
+    python benchmarks/load_test.py --base-url http://127.0.0.1:5000   # an app you started yourself
+"""
+
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime
+
+import httpx
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from fake_groq_server import add_arguments as add_groq_arguments
+from serve_app import FIRESTORE_MODES
+
+DEFAULT_MESSAGES = os.path.join(BENCH_DIR, 'emotion_eval_set.jsonl')
+
+CRISIS_MESSAGES = [
+    "I don't want to be alive anymore",
+    "honestly i just want to end it all",
+    "I keep hurting myself when it gets bad",
+]
+
+LONG_MESSAGE = ("Work has been piling up for weeks, I barely sleep, and every time I try to talk to my "
+                "partner about it we end up arguing about something else entirely. I don't know where to start.")
+
+
+def percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+def summarize(values_ms):
+    ordered = sorted(values_ms)
+    return {
+        'count': len(ordered),
+        'p50_ms': round(percentile(ordered, 0.50), 1),
+        'p95_ms': round(percentile(ordered, 0.95), 1),
+        'p99_ms': round(percentile(ordered, 0.99), 1),
+        'mean_ms': round(statistics.mean(ordered), 1) if ordered else 0.0,
+        'max_ms': round(ordered[-1], 1) if ordered else 0.0,
+    }
+
+
+def parse_server_timing(header):
+    """{stage: ms} from a Server-Timing header ('crisis;dur=0.1, reply;dur=210.4')"""
+    timings = {}
+    for item in filter(None, (part.strip() for part in (header or '').split(','))):
+        name, _, params = item.partition(';')
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'dur':
+                timings[name.strip()] = float(value)
+    return timings
+
+
+class Recorder:
+    """Latencies, errors and stage timings of one concurrency level"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}  # endpoint -> [ms]
+        self.errors = {}     # endpoint -> count
+        self.stages = {}     # endpoint -> {stage: [ms]}
+        self.sessions = 0
+        self.chat_turns = 0
+
+    def request(self, endpoint, ms, ok):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(ms)
+            if not ok:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def stage_timings(self, endpoint, timings):
+        with self._lock:
+            stages = self.stages.setdefault(endpoint, {})
+            for stage, ms in timings.items():
+                stages.setdefault(stage, []).append(ms)
+
+    def count(self, sessions=0, chat_turns=0):
+        with self._lock:
+            self.sessions += sessions
+            self.chat_turns += chat_turns
+
+    def report(self, concurrency, seconds):
+        requests = sum(len(values) for values in self.latencies.values())
+        errors = sum(self.errors.values())
+        return {
+            'concurrency': concurrency,
+            'duration_s': round(seconds, 2),
+            'requests': requests,
+            'errors': errors,
+            'error_rate': round(errors / requests, 4) if requests else 0.0,
+            'rps': round(requests / seconds, 2) if seconds else 0.0,
+            'sessions': self.sessions,
+            'chat_turns_per_s': round(self.chat_turns / seconds, 2) if seconds else 0.0,
+            'endpoints': {endpoint: {**summarize(values), 'errors': self.errors.get(endpoint, 0)}
+                          for endpoint, values in sorted(self.latencies.items())},
+            'stages': {endpoint: {stage: summarize(values) for stage, values in stages.items()}
+                       for endpoint, stages in sorted(self.stages.items())},
+        }
+
+
+class VirtualUser:
+    """One simulated user running session scripts back to back"""
+
+    def __init__(self, base_url, recorder, options, messages, seed):
+        self.client = httpx.Client(base_url=base_url, timeout=httpx.Timeout(60.0))
+        self.recorder = recorder
+        self.options = options
+        self.messages = messages
+        self.random = random.Random(seed)
+        self.name = f"load-{seed}"
+        self.sessions = 0
+
+    def run(self, deadline):
+        try:
+            while time.monotonic() < deadline:
+                self.session()
+        finally:
+            self.client.close()
+
+    def call(self, endpoint, method, url, **kwargs):
+        """Timed request; returns the response or None on a transport error"""
+        started = time.perf_counter()
+        try:
+            response = self.client.request(method, url, **kwargs)
+        except httpx.HTTPError:
+            self.recorder.request(endpoint, (time.perf_counter() - started) * 1000, False)
+            return None
+        self.recorder.request(endpoint, (time.perf_counter() - started) * 1000, response.status_code < 400)
+        return response
+
+    def pick_message(self):
+        roll = self.random.random()
+        if roll < self.options.crisis_ratio:
+            return self.random.choice(CRISIS_MESSAGES)
+        if roll < self.options.crisis_ratio + self.options.long_ratio:
+            return LONG_MESSAGE
+        return self.random.choice(self.messages)
+
+    def session(self):
+        self.sessions += 1
+        user_id = f"{self.name}-{self.sessions}"
+        is_guest = self.random.random() < self.options.guest_ratio
+        first_message = self.pick_message()
+
+        response = self.call('POST /conversations', 'POST', '/conversations', json={
+            'user_id': user_id, 'is_guest': is_guest,
+            'generate_smart_title': True, 'first_message': first_message})
+        conversation_id = response.json().get('id') if response is not None and response.status_code == 201 else None
+
+        for turn in range(self.options.turns):
+            message = first_message if turn == 0 else self.pick_message()
+            payload = {'message': message, 'user_id': user_id, 'is_guest': is_guest,
+                       'conversation_id': conversation_id}
+            if self.options.pipeline:
+                payload['pipeline_mode'] = self.options.pipeline
+            if self.random.random() < self.options.stream_ratio:
+                self.chat_stream(payload)
+            else:
+                self.chat(payload)
+            self.recorder.count(chat_turns=1)
+            if self.options.think_ms:
+                time.sleep(self.random.uniform(0.5, 1.5) * self.options.think_ms / 1000)
+
+        guest = 'true' if is_guest else 'false'
+        self.call('GET /conversations', 'GET', f"/conversations?user_id={user_id}&is_guest={guest}")
+        if conversation_id:
+            self.call('GET /conversations/<id>/messages', 'GET',
+                      f"/conversations/{conversation_id}/messages?limit=20")
+            if self.random.random() < self.options.rename_ratio:
+                self.call('PUT /conversations/<id>', 'PUT', f"/conversations/{conversation_id}",
+                          json={'title': f"Renamed {self.sessions}"})
+            if self.random.random() < self.options.archive_ratio:
+                self.call('PUT /conversations/<id>/archive', 'PUT', f"/conversations/{conversation_id}/archive",
+                          json={'is_archived': True, 'user_id': user_id})
+
+        if is_guest:
+            self.call('POST /logout', 'POST', '/logout', json={'user_id': user_id, 'is_guest': True})
+        elif conversation_id:
+            self.call('DELETE /conversations/<id>', 'DELETE', f"/conversations/{conversation_id}")
+        self.recorder.count(sessions=1)
+
+    def chat(self, payload):
+        response = self.call('POST /chat', 'POST', '/chat', json=payload)
+        if response is not None and response.status_code == 200:
+            self.recorder.stage_timings('POST /chat', parse_server_timing(response.headers.get('Server-Timing')))
+
+    def chat_stream(self, payload):
+        """Times the whole stream, plus first token as seen by the client"""
+        endpoint = 'POST /chat/stream'
+        started = time.perf_counter()
+        first_token = None
+        done = None
+        event = None
+        try:
+            with self.client.stream('POST', '/chat/stream', json=payload) as response:
+                ok = response.status_code == 200
+                for line in response.iter_lines():
+                    if line.startswith('event: '):
+                        event = line[7:]
+                    elif line.startswith('data: '):
+                        if event == 'token' and first_token is None:
+                            first_token = (time.perf_counter() - started) * 1000
+                        elif event == 'done':
+                            done = json.loads(line[6:])
+                        elif event == 'error':
+                            ok = False
+        except httpx.HTTPError:
+            ok = False
+        self.recorder.request(endpoint, (time.perf_counter() - started) * 1000, ok and done is not None)
+        timings = dict(done.get('timings', {})) if done else {}
+        if first_token is not None:
+            timings['client_first_token'] = first_token
+        self.recorder.stage_timings(endpoint, timings)
+
+
+def run_level(base_url, concurrency, options, messages):
+    recorder = Recorder()
+    deadline = time.monotonic() + options.duration
+    users = [VirtualUser(base_url, recorder, options, messages, seed=options.seed * 10000 + concurrency * 100 + i)
+             for i in range(concurrency)]
+    threads = [threading.Thread(target=user.run, args=(deadline,), daemon=True) for user in users]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Sessions in flight at the deadline finish, so measure the real elapsed time
+    return recorder.report(concurrency, time.perf_counter() - started)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def wait_until_up(url, seconds=30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(url, timeout=1.0)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not come up within {seconds}s")
+
+
+def start_local_stack(options):
+    """Fake Groq + app server subprocesses; returns (app URL, groq URL, processes)"""
+    groq_port, app_port = free_port(), free_port()
+    groq_url = f"http://127.0.0.1:{groq_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    groq = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, 'fake_groq_server.py'), '--port', str(groq_port),
+        '--latency-ms', str(options.latency_ms), '--jitter-ms', str(options.jitter_ms),
+        '--tokens-per-second', str(options.tokens_per_second), '--error-rate', str(options.error_rate)],
+        stdout=subprocess.DEVNULL)
+
+    env = dict(os.environ, GROQ_API_KEY='load-test', GROQ_BASE_URL=groq_url)
+    for setting in options.app_env:
+        key, _, value = setting.partition('=')
+        env[key] = value
+    app = subprocess.Popen([
+        sys.executable, os.path.join(BENCH_DIR, 'serve_app.py'), '--port', str(app_port),
+        '--firestore', options.firestore, '--firestore-latency-ms', str(options.firestore_latency_ms),
+        '--log-file', options.app_log], env=env, cwd=ROOT)
+
+    processes = [groq, app]
+    try:
+        wait_until_up(f"{groq_url}/stats")
+        wait_until_up(f"{app_url}/health")
+    except Exception:
+        stop(processes)
+        raise
+    return app_url, groq_url, processes
+
+
+def stop(processes):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+def fetch_json(url):
+    try:
+        response = httpx.get(url, timeout=10.0)
+        return response.json() if response.status_code == 200 else None
+    except (httpx.HTTPError, ValueError):
+        return None
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_messages(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['text'] for line in f if line.strip()]
+
+
+def print_level(level):
+    print(f"\n👥 concurrency {level['concurrency']}: {level['requests']} requests in {level['duration_s']} s "
+          f"({level['rps']} req/s, {level['chat_turns_per_s']} chat turns/s, {level['errors']} errors)")
+    for endpoint, s in level['endpoints'].items():
+        print(f"   {endpoint:<34} n={s['count']:<6} p50 {s['p50_ms']:8.1f}  p95 {s['p95_ms']:8.1f}  "
+              f"p99 {s['p99_ms']:8.1f} ms  errors {s['errors']}")
+    for endpoint, stages in level['stages'].items():
+        line = ', '.join(f"{stage} {s['p50_ms']:.1f}/{s['p95_ms']:.1f}" for stage, s in stages.items())
+        print(f"   ⏱️ {endpoint} stages p50/p95 ms: {line}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='End-to-end load test of the Menti app')
+    parser.add_argument('--concurrency', default='1,8,32', help='Comma-separated virtual user counts, one level each')
+    parser.add_argument('--duration', type=float, default=20, help='Seconds per concurrency level')
+    parser.add_argument('--turns', type=int, default=4, help='Chat turns per session')
+    parser.add_argument('--think-ms', type=float, default=0, help='Average pause between chat turns')
+    parser.add_argument('--stream-ratio', type=float, default=0.5, help='Share of turns sent to /chat/stream')
+    parser.add_argument('--guest-ratio', type=float, default=0.5, help='Share of sessions run as guests')
+    parser.add_argument('--crisis-ratio', type=float, default=0.02, help='Share of messages with crisis language')
+    parser.add_argument('--long-ratio', type=float, default=0.15, help='Share of long messages')
+    parser.add_argument('--rename-ratio', type=float, default=0.2)
+    parser.add_argument('--archive-ratio', type=float, default=0.1)
+    parser.add_argument('--pipeline', choices=['two_call', 'single_call'], help="Send pipeline_mode with each /chat")
+    parser.add_argument('--messages', default=DEFAULT_MESSAGES, help='JSONL file of {"text": ...} user messages')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--base-url', help='Load an already running app instead of starting the local stack')
+    parser.add_argument('--firestore', choices=FIRESTORE_MODES, default='fake',
+                        help="In-memory fake, the emulator, or none (conversation routes then answer 400)")
+    parser.add_argument('--firestore-latency-ms', type=float, default=0.0,
+                        help='Delay per fake Firestore round trip')
+    parser.add_argument('--app-env', action='append', default=[], metavar='KEY=VALUE',
+                        help='Extra environment for the app (repeatable)')
+    parser.add_argument('--app-log', default=os.devnull, help="File for the app's console output")
+    parser.add_argument('--output', help='Write the JSON report here (default: stdout only)')
+    add_groq_arguments(parser)
+    options = parser.parse_args()
+
+    levels = [int(level) for level in options.concurrency.split(',') if level.strip()]
+    messages = load_messages(options.messages)
+
+    processes = []
+    groq_url = None
+    if options.base_url:
+        app_url = options.base_url.rstrip('/')
+    else:
+        app_url, groq_url, processes = start_local_stack(options)
+        print(f"🚀 App on {app_url} (Firestore: {options.firestore}), fake Groq on {groq_url} "
+              f"({options.latency_ms:.0f} ms to first token, {options.tokens_per_second:.0f} tokens/s)")
+
+    report = {
+        'started_at': datetime.now().isoformat(),
+        'git_commit': git_commit(),
+        'target': app_url,
+        'config': {key: value for key, value in vars(options).items() if key not in ('output', 'app_log')},
+        'levels': [],
+    }
+    try:
+        for concurrency in levels:
+            level = run_level(app_url, concurrency, options, messages)
+            report['levels'].append(level)
+            print_level(level)
+        report['app_stats'] = fetch_json(f"{app_url}/stats")
+        if groq_url:
+            report['fake_groq'] = fetch_json(f"{groq_url}/stats")
+            report['firestore'] = fetch_json(f"{app_url}/_bench/firestore") if options.firestore == 'fake' else None
+    finally:
+        stop(processes)
+
+    output = json.dumps(report, indent=2, default=str)
+    if options.output:
+        os.makedirs(os.path.dirname(os.path.abspath(options.output)), exist_ok=True)
+        with open(options.output, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f"\n💾 Report written to {options.output}")
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark App Server
+Runs app.py on a threaded WSGI server for load tests, against the in-memory
+Firestore fake, the Firestore emulator or no Firestore at all
+
+Groq is whatever GROQ_BASE_URL points at (load_test.py starts
+fake_groq_server.py and sets it). With --firestore fake, app.py's Firebase
+setup is handed the in-memory fake, so the deleter, guest sweeper,
+write-behind queue and title upgrader all run on it unchanged, and
+/_bench/firestore reports its document and read/write counts
+
+Usage:
+    GROQ_API_KEY=x GROQ_BASE_URL=http://127.0.0.1:8088 python benchmarks/serve_app.py --port 5050
+    FIRESTORE_EMULATOR_HOST=127.0.0.1:8080 ... python benchmarks/serve_app.py --firestore emulator
+"""
+
+import argparse
+import logging
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRESTORE_MODES = ('fake', 'emulator', 'none')
+
+
+def use_fake_firestore(fake):
+    """Make app.py's Firebase initialisation return the in-memory fake"""
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    os.environ.pop('FIRESTORE_EMULATOR_HOST', None)
+    os.environ['FIREBASE_CREDENTIALS_PATH'] = os.path.abspath(__file__)  # exists; never parsed
+    credentials.Certificate = lambda path: None
+    firebase_admin.initialize_app = lambda *args, **kwargs: None
+    firestore.client = lambda *args, **kwargs: fake
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run app.py for load tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5050)
+    parser.add_argument('--firestore', choices=FIRESTORE_MODES, default='fake')
+    parser.add_argument('--firestore-latency-ms', type=float, default=0.0,
+                        help='Delay added to every fake Firestore round trip')
+    parser.add_argument('--log-file', default=os.devnull, help="Where the app's console output goes")
+    args = parser.parse_args()
+
+    fake = None
+    if args.firestore == 'fake':
+        from fake_firestore import FakeFirestore
+        fake = FakeFirestore(latency_ms=args.firestore_latency_ms)
+        use_fake_firestore(fake)
+    elif args.firestore == 'emulator':
+        if not os.getenv('FIRESTORE_EMULATOR_HOST'):
+            parser.error('--firestore emulator needs FIRESTORE_EMULATOR_HOST (e.g. 127.0.0.1:8080)')
+    else:
+        os.environ.pop('FIRESTORE_EMULATOR_HOST', None)
+        os.environ['FIREBASE_CREDENTIALS_PATH'] = os.path.join(tempfile.gettempdir(), 'no-firebase-credentials.json')
+    # Keep the write-behind journal out of the working tree
+    os.environ.setdefault('WRITE_BEHIND_JOURNAL_DIR', os.path.join(tempfile.gettempdir(), 'menti_bench_journal'))
+
+    log = open(args.log_file, 'a', buffering=1, encoding='utf-8')
+    sys.stdout = log
+
+    import app as menti
+    from flask import jsonify
+    from werkzeug.serving import make_server
+
+    if fake is not None:
+        menti.app.add_url_rule('/_bench/firestore', 'bench_firestore', lambda: jsonify(fake.stats()))
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)  # no access log line per request
+    server = make_server(args.host, args.port, menti.app, threaded=True)
+    print(f"🚀 Benchmark server on http://{args.host}:{args.port} (Firestore: {args.firestore})", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        log.close()
+
+
+if __name__ == '__main__':
+    main()
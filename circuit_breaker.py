@@ -0,0 +1,112 @@
+"""
+Circuit Breaker
+Fails model calls fast while Groq is down, and probes for recovery
+
+closed    - calls go through; consecutive failures are counted
+open      - calls fail immediately with CircuitOpenError for reset_seconds
+half_open - a limited number of probe calls go through; a success closes
+            the breaker, a failure opens it again
+"""
+
+import logging
+import threading
+import time
+
+log = logging.getLogger('menti.breaker')
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """The breaker for this call type is open - use the fallback right away"""
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one call type"""
+
+    def __init__(self, name, failure_threshold=5, reset_seconds=30.0, half_open_max_calls=1):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.half_open_max_calls = half_open_max_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self._rejected = 0
+        self._times_opened = 0
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self._state == OPEN:
+                if time.monotonic() - self._opened_at < self.reset_seconds:
+                    self._rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} calls is open")
+                self._state = HALF_OPEN
+                self._probes = 0
+                log.info("🟡 Circuit half-open, probing Groq", extra={'call_type': self.name})
+
+            if self._state == HALF_OPEN:
+                if self._probes >= self.half_open_max_calls:
+                    self._rejected += 1
+                    raise CircuitOpenError(f"Circuit for {self.name} calls is half-open, probe in progress")
+                self._probes += 1
+
+    def record_success(self):
+        with self._lock:
+            if self._state != CLOSED:
+                log.info("🟢 Circuit closed, Groq is back", extra={'call_type': self.name})
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    log.warning("🔴 Circuit opened", extra={'call_type': self.name, 'failures': self._failures})
+                    self._times_opened += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def record_ignored(self):
+        """The call failed for a reason that says nothing about Groq's health (e.g. a bad request)"""
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def available(self):
+        """True unless the breaker is open and still cooling down"""
+        with self._lock:
+            return not (self._state == OPEN and time.monotonic() - self._opened_at < self.reset_seconds)
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._effective_state()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'state': self._effective_state(),
+                'consecutive_failures': self._failures,
+                'times_opened': self._times_opened,
+                'rejected': self._rejected,
+                'open_for_seconds': round(max(self.reset_seconds - (time.monotonic() - self._opened_at), 0), 1)
+                if self._state == OPEN else 0.0,
+            }
+
+    def _effective_state(self):
+        # Open and cooled down is half-open: the next call goes out as a probe
+        # (_state itself only moves on that call)
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_seconds:
+            return HALF_OPEN
+        return self._state
@@ -7,6 +7,7 @@ and keeps only the NEW structure (conversations collection)
 import firebase_admin
 from firebase_admin import credentials, firestore
 import os
+from sequence import legacy_sequence
 
 # Initialize Firebase
 cred_path = 'firebase-credentials.json'
@@ -108,6 +109,30 @@ for conv_doc in conversations:
         updates['lastMessage'] = conv_data['last_message']
         issues_found += 1
     
+    # Backfill message sequence numbers so messages can be paged by 'seq'
+    if not conv_data.get('seqOrdered'):
+        seqs = []
+        missing = []
+        for msg_doc in conv_doc.reference.collection('messages').stream():
+            msg_data = msg_doc.to_dict()
+            if 'seq' not in msg_data:
+                msg_data['seq'] = legacy_sequence(msg_data.get('timestamp'), msg_data.get('order', 0))
+                missing.append((msg_doc.reference, msg_data['seq']))
+            seqs.append(msg_data['seq'])
+        
+        if missing:
+            print(f"   ⚠️ Conversation {conv_id}: {len(missing)} message(s) without 'seq' - FIXING...")
+            issues_found += 1
+        for start in range(0, len(missing), 500):
+            batch = db.batch()
+            for msg_ref, seq in missing[start:start + 500]:
+                batch.update(msg_ref, {'seq': seq})
+            batch.commit()
+        
+        updates['seqOrdered'] = True
+        if seqs:
+            updates['lastSeq'] = max(seqs)
+    
     # Apply fixes
     if updates:
         conv_doc.reference.update(updates)
@@ -138,6 +163,7 @@ print("🚀 Your database is now clean and organized!")
 print("   - Only conversations collection is used")
 print("   - All fields use camelCase naming")
 print("   - All conversations have required fields")
+print("   - All messages have sequence numbers")
 print()
 print("Next steps:")
 print("1. Restart your Flask server")
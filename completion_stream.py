@@ -0,0 +1,66 @@
+"""
+Completion Stream
+Base for wrappers around a streaming chat completion (the SDK's Stream, a
+replayed or recorded stream, or another wrapper)
+
+A wrapper passes the chunks through and runs its end hook exactly once:
+when the stream is read to the end, fails, or is closed. close() also closes
+the wrapped stream, which for the SDK's Stream returns the HTTP connection.
+Unlike a generator, the hook runs on close() even if no chunk was ever read,
+so callers can always hand back resources with close() or a with block
+"""
+
+import threading
+
+
+class WrappedStream:
+    """Iterator over a completion stream with on_chunk / on_end hooks"""
+
+    def __init__(self, stream):
+        self._ended = False
+        self._end_lock = threading.Lock()
+        self._stream = stream
+        self._iterator = iter(stream)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            chunk = next(self._iterator)
+        except StopIteration:
+            self._end(completed=True)
+            raise
+        except BaseException:
+            self._end(completed=False)
+            raise
+        self.on_chunk(chunk)
+        return chunk
+
+    def close(self):
+        """Stop reading: close the wrapped stream and run the end hook"""
+        try:
+            close = getattr(self._stream, 'close', None)
+            if close:
+                close()
+        finally:
+            self._end(completed=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def on_chunk(self, chunk):
+        """Called with every chunk handed out"""
+
+    def on_end(self, completed):
+        """Called once; completed is True when the stream was read to the end"""
+
+    def _end(self, completed):
+        with self._end_lock:
+            if self._ended:
+                return
+            self._ended = True
+        self.on_end(completed)
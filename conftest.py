@@ -0,0 +1,34 @@
+"""
+Shared pytest setup
+The stand-ins in benchmarks/ (fake_firestore.py) double as test fakes
+"""
+
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks'))
+
+
+@pytest.fixture(scope='session')
+def menti():
+    """
+    app.py imported against the in-memory Firestore fake: (app module, fake)
+    No Groq calls are made unless a test makes them; background sweeps are off
+    """
+    os.environ.update({
+        'GROQ_API_KEY': 'test',
+        'GUEST_SWEEPER_ENABLED': 'false',
+        'FIRESTORE_WRITE_BEHIND': 'false',
+        'WRITE_BEHIND_JOURNAL_DIR': tempfile.mkdtemp(),
+        'LOG_LEVEL': 'WARNING',
+    })
+    from fake_firestore import FakeFirestore
+    from serve_app import use_fake_firestore
+
+    fake = FakeFirestore()
+    use_fake_firestore(fake)
+    import app
+    return app, fake
@@ -0,0 +1,215 @@
+"""
+Conversation List Cache
+Read-through cache for the sidebar's first page of conversations, keyed by
+(user, isAnonymous, isArchived). Our own writes update cached lists in place,
+so reloading the list after create/rename/archive/delete/chat never needs a
+Firestore query. The cache is per process: writes made by other workers show
+up once the entry's TTL expires
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+# Page cursors are "<lastUpdated>|<conversation id>": the ID breaks ties between
+# conversations updated at the same instant, so none is skipped across a page boundary
+CURSOR_SEPARATOR = '|'
+
+
+def encode_cursor(conversation):
+    """Cursor for the page after this conversation"""
+    return f"{conversation['lastUpdated']}{CURSOR_SEPARATOR}{conversation['id']}"
+
+
+def decode_cursor(cursor):
+    """(lastUpdated, conversation id); the ID is None for old lastUpdated-only cursors"""
+    last_updated, separator, conversation_id = cursor.rpartition(CURSOR_SEPARATOR)
+    if not separator:
+        return cursor, None
+    return last_updated, conversation_id
+
+
+class _Entry:
+    __slots__ = ('items', 'complete', 'expires_at')
+
+    def __init__(self, items, complete, expires_at):
+        self.items = items        # [{'id', 'title', 'lastUpdated'}, ...] newest first
+        self.complete = complete  # True if items holds every conversation for the key
+        self.expires_at = expires_at
+
+
+class ConversationListCache:
+    """
+    Bounded LRU of conversation lists with a TTL
+
+    Lists are the newest-first prefix of the (lastUpdated, ID) ordering. A conversation
+    is in at most one list (the filters don't overlap), so an index from
+    conversation ID to its list lets write routes patch it without knowing the user
+    """
+
+    def __init__(self, max_entries=10000, ttl_seconds=60):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # (user_id, is_guest, is_archived) -> _Entry
+        self._index = {}               # conversation_id -> key of the list holding it
+
+        self._hits = 0
+        self._misses = 0
+        self._updates = 0
+        self._invalidations = 0
+
+    # ---------- reads ----------
+
+    def get(self, user_id, is_guest, is_archived, limit):
+        """
+        First page of up to limit conversations as {conversations, has_more, next_cursor},
+        or None if the list isn't cached (or too short to answer)
+        """
+        key = (user_id, is_guest, is_archived)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None or (len(entry.items) < limit and not entry.complete):
+                self._misses += 1
+                return None
+            self._hits += 1
+            self._entries.move_to_end(key)
+
+            conversations = [dict(item) for item in entry.items[:limit]]
+            has_more = len(entry.items) > limit or not entry.complete
+            return {
+                'conversations': conversations,
+                'has_more': has_more,
+                'next_cursor': encode_cursor(conversations[-1]) if has_more and conversations else None
+            }
+
+    def put(self, user_id, is_guest, is_archived, conversations, complete):
+        """Cache the first page just read from Firestore"""
+        key = (user_id, is_guest, is_archived)
+        items = [{'id': c['id'], 'title': c.get('title'), 'lastUpdated': c.get('lastUpdated')}
+                 for c in conversations]
+        with self._lock:
+            self._drop(key)
+            self._entries[key] = _Entry(items, complete, time.monotonic() + self.ttl_seconds)
+            for item in items:
+                self._index[item['id']] = key
+            while len(self._entries) > self.max_entries:
+                self._drop(next(iter(self._entries)))
+
+    # ---------- write-through updates ----------
+
+    def add(self, user_id, is_guest, is_archived, conversation):
+        """A conversation was created (it is the newest, so it goes first)"""
+        key = (user_id, is_guest, is_archived)
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                return
+            item = {'id': conversation['id'], 'title': conversation.get('title'),
+                    'lastUpdated': conversation.get('lastUpdated')}
+            entry.items.insert(0, item)
+            self._index[item['id']] = key
+            self._updates += 1
+
+    def touch(self, conversation_id, last_updated):
+        """A message was stored: bump lastUpdated and move the conversation to the top"""
+        with self._lock:
+            item = self._pop_item(conversation_id)
+            if item is None:
+                return False
+            key, item = item
+            item['lastUpdated'] = last_updated
+            self._entries[key].items.insert(0, item)
+            self._index[conversation_id] = key
+            self._updates += 1
+            return True
+
+    def rename(self, conversation_id, title):
+        with self._lock:
+            key = self._index.get(conversation_id)
+            if key is None:
+                return False
+            for item in self._entries[key].items:
+                if item['id'] == conversation_id:
+                    item['title'] = title
+            self._updates += 1
+            return True
+
+    def move(self, conversation_id, is_archived, last_updated):
+        """
+        Archive/unarchive: the conversation leaves its list and goes to the top
+        of the other one. Returns False if it wasn't cached (caller should invalidate)
+        """
+        with self._lock:
+            found = self._pop_item(conversation_id)
+            if found is None:
+                return False
+            (user_id, is_guest, _), item = found
+            item['lastUpdated'] = last_updated
+            target = (user_id, is_guest, is_archived)
+            entry = self._live_entry(target)
+            if entry is not None:
+                entry.items.insert(0, item)
+                self._index[conversation_id] = target
+            self._updates += 1
+            return True
+
+    def remove(self, conversation_id):
+        with self._lock:
+            if self._pop_item(conversation_id) is not None:
+                self._updates += 1
+
+    def invalidate(self, user_id, is_guest=None, is_archived=None):
+        """Drop a user's cached lists (all of them, or one filter combination)"""
+        with self._lock:
+            for key in list(self._entries):
+                if key[0] == user_id and is_guest in (None, key[1]) and is_archived in (None, key[2]):
+                    self._drop(key)
+                    self._invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'entries': len(self._entries),
+                'conversations': len(self._index),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'updates': self._updates,
+                'invalidations': self._invalidations,
+            }
+
+    # ---------- internals (call with self._lock held) ----------
+
+    def _live_entry(self, key):
+        entry = self._entries.get(key)
+        if entry is not None and entry.expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        return entry
+
+    def _pop_item(self, conversation_id):
+        """Remove a conversation from its cached list; returns (key, item) or None"""
+        key = self._index.pop(conversation_id, None)
+        if key is None:
+            return None
+        entry = self._live_entry(key)
+        if entry is None:
+            return None
+        for i, item in enumerate(entry.items):
+            if item['id'] == conversation_id:
+                del entry.items[i]
+                return key, item
+        return None
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        for item in entry.items:
+            if self._index.get(item['id']) == key:
+                del self._index[item['id']]
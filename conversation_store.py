@@ -0,0 +1,317 @@
+"""
+Conversation Store
+Bounded, thread-safe in-memory conversation history with LRU/TTL eviction
+Replaces the plain module-level conversation_history dict in app.py
+"""
+
+import threading
+import time
+from collections import OrderedDict, deque
+
+from history_backend import FoldBatch, HistoryBackend, HistoryWindow, select_window, window_start_seq
+from token_budget import estimate_message_tokens, estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+
+# Run the TTL sweep at most this often (seconds); it piggybacks on normal calls
+SWEEP_INTERVAL = 30
+
+
+class _Conversation:
+    """
+    History for one conversation: a ring buffer plus its own lock
+    messages/pending/summary fields are guarded by self.lock;
+    chars and last_access by the store lock
+    """
+
+    __slots__ = ('lock', 'messages', 'chars', 'last_access', 'next_seq',
+                 'summary', 'summary_tokens', 'summary_seq', 'pending',
+                 'folding', 'window_budget')
+
+    def __init__(self, max_messages):
+        self.lock = threading.Lock()
+        self.messages = deque(maxlen=max_messages)
+        self.chars = 0
+        self.last_access = time.monotonic()
+        self.next_seq = 0
+        self.summary = ''
+        self.summary_tokens = 0
+        self.summary_seq = 0  # messages with seq below this are in the summary
+        self.pending = []  # messages pushed out of the ring buffer, not yet summarized
+        self.folding = False
+        self.window_budget = None
+
+
+class ConversationStore(HistoryBackend):
+    """
+    In-process conversation history keyed by user/conversation ID
+
+    - Each conversation is a deque(maxlen=max_messages), so trimming never copies
+    - Appends take a per-conversation lock, so turns from two tabs can't interleave
+    - Idle conversations expire after ttl_seconds
+    - Least recently used conversations are evicted past max_conversations
+      or when the total stored text exceeds max_total_chars
+    - Turns that fall out of the window can be folded into a running summary
+      (see claim_fold/complete_fold and rolling_summary.py)
+    """
+
+    name = 'memory'
+
+    def __init__(self, max_messages=20, max_conversations=5000,
+                 max_total_chars=5_000_000, ttl_seconds=3600):
+        self.max_messages = max_messages
+        self.max_conversations = max_conversations
+        self.max_total_chars = max_total_chars
+        self.ttl_seconds = ttl_seconds
+
+        self._lock = threading.Lock()  # guards _conversations order and totals
+        self._conversations = OrderedDict()
+        self._total_chars = 0
+        self._last_sweep = time.monotonic()
+
+        self._hits = 0
+        self._misses = 0
+        self._evictions = {'ttl': 0, 'lru': 0, 'memory': 0}
+        self._folds = 0
+
+    # ---------- public API ----------
+
+    def get(self, key):
+        """Return a snapshot list of the conversation's messages ([] if unknown)"""
+        with self._lock:
+            conversation = self._lookup(key)
+        if conversation is None:
+            return []
+
+        with conversation.lock:
+            return list(conversation.messages)
+
+    def window(self, key, token_budget):
+        """
+        Return a HistoryWindow: the running summary plus the newest messages
+        that fit in token_budget (oldest first, as {"role", "content"} dicts)
+        The summary is counted against the budget first. Uses the token counts
+        cached at append time - nothing is re-tokenized
+        """
+        with self._lock:
+            conversation = self._lookup(key)
+        if conversation is None:
+            return HistoryWindow('', [])
+
+        with conversation.lock:
+            conversation.window_budget = token_budget
+            messages, tokens = select_window(conversation.messages, token_budget,
+                                             conversation.summary_tokens, conversation.summary_seq)
+            return HistoryWindow(conversation.summary, messages, tokens, conversation.summary_tokens)
+
+    def append(self, key, *messages):
+        """
+        Atomically append one or more {"role", "content"} messages
+        Each message's token estimate is cached alongside it
+        Oldest messages fall off the ring buffer once it is full and wait
+        in a pending list until they are folded into the summary
+        """
+        records = [{'role': message['role'],
+                    'content': message['content'],
+                    'tokens': estimate_message_tokens(message)} for message in messages]
+
+        with self._lock:
+            self._maybe_sweep()
+            conversation = self._conversations.get(key)
+            if conversation is not None and self._is_expired(conversation):
+                self._evict(key, 'ttl')
+                conversation = None
+            if conversation is None:
+                conversation = self._conversations[key] = _Conversation(self.max_messages)
+            self._conversations.move_to_end(key)
+            conversation.last_access = time.monotonic()
+
+        delta = 0
+        with conversation.lock:
+            for message in records:
+                if len(conversation.messages) == conversation.messages.maxlen:
+                    oldest = conversation.messages[0]
+                    if oldest['seq'] >= conversation.summary_seq:
+                        conversation.pending.append(oldest)
+                    else:
+                        delta -= len(oldest['content'])
+                message['seq'] = conversation.next_seq
+                conversation.next_seq += 1
+                conversation.messages.append(message)
+                delta += len(message['content'])
+
+            # If summarization keeps failing, don't let pending grow without bound
+            overflow = len(conversation.pending) - self.max_messages
+            if overflow > 0:
+                delta -= sum(len(m['content']) for m in conversation.pending[:overflow])
+                del conversation.pending[:overflow]
+
+        self._account(key, conversation, delta)
+
+    def claim_fold(self, key):
+        """
+        Claim the turns that fell out of the last window for summarization
+        Returns a FoldBatch, or None if there is nothing to fold or a fold
+        for this conversation is already running
+        """
+        with self._lock:
+            conversation = self._conversations.get(key)
+        if conversation is None:
+            return None
+
+        with conversation.lock:
+            if conversation.folding:
+                return None
+
+            # Keep what fits the last window budget; everything older and unsummarized is folded
+            window_start = window_start_seq(conversation.messages, conversation.window_budget,
+                                            conversation.summary_tokens, conversation.summary_seq,
+                                            conversation.next_seq)
+
+            to_fold = [m for m in conversation.pending if m['seq'] < window_start]
+            to_fold += [m for m in conversation.messages
+                        if conversation.summary_seq <= m['seq'] < window_start]
+            if not to_fold:
+                return None
+
+            conversation.folding = True
+            return FoldBatch(conversation.summary,
+                             [{'role': m['role'], 'content': m['content']} for m in to_fold],
+                             window_start)
+
+    def complete_fold(self, key, summary, upto_seq):
+        """Install a new running summary covering all messages before upto_seq"""
+        with self._lock:
+            conversation = self._conversations.get(key)
+        if conversation is None:
+            return
+
+        with conversation.lock:
+            dropped = [m for m in conversation.pending if m['seq'] < upto_seq]
+            conversation.pending = [m for m in conversation.pending if m['seq'] >= upto_seq]
+            delta = len(summary) - len(conversation.summary) - sum(len(m['content']) for m in dropped)
+            conversation.summary = summary
+            conversation.summary_tokens = estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0
+            conversation.summary_seq = max(conversation.summary_seq, upto_seq)
+            conversation.folding = False
+
+        self._account(key, conversation, delta)
+        with self._lock:
+            self._folds += 1
+
+    def abort_fold(self, key):
+        """Release a claimed fold that failed so it can be retried next turn"""
+        with self._lock:
+            conversation = self._conversations.get(key)
+        if conversation is not None:
+            with conversation.lock:
+                conversation.folding = False
+
+    def restore_summary(self, key, summary):
+        """Seed the running summary of a conversation that isn't held or has none"""
+        with self._lock:
+            conversation = self._conversations.get(key)
+            if conversation is None:
+                conversation = self._conversations[key] = _Conversation(self.max_messages)
+
+        with conversation.lock:
+            if conversation.summary or conversation.folding:
+                return
+            # Messages already held arrived after the summary was written, so summary_seq stays
+            conversation.summary = summary
+            conversation.summary_tokens = estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS
+
+        self._account(key, conversation, len(summary))
+
+    def clear(self, key):
+        """Drop a conversation's history. Returns True if it existed"""
+        with self._lock:
+            conversation = self._conversations.pop(key, None)
+            if conversation is not None:
+                self._total_chars -= conversation.chars
+        return conversation is not None
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._conversations
+
+    def __len__(self):
+        with self._lock:
+            return len(self._conversations)
+
+    def stats(self):
+        """Size, eviction and hit-rate counters"""
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': self.name,
+                'conversations': len(self._conversations),
+                'total_chars': self._total_chars,
+                'max_conversations': self.max_conversations,
+                'max_total_chars': self.max_total_chars,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'evictions': dict(self._evictions),
+                'summary_folds': self._folds,
+            }
+
+    # ---------- internals (call with self._lock held unless noted) ----------
+
+    def _account(self, key, conversation, delta):
+        """Apply a size change and enforce limits (takes self._lock)"""
+        with self._lock:
+            conversation.chars += delta
+            # The conversation may have been evicted/cleared in the meantime
+            if self._conversations.get(key) is conversation:
+                self._total_chars += delta
+            self._enforce_limits(keep=key)
+
+    def _lookup(self, key):
+        """Find a live conversation, counting the hit/miss and refreshing its LRU position"""
+        self._maybe_sweep()
+        conversation = self._conversations.get(key)
+        if conversation is not None and self._is_expired(conversation):
+            self._evict(key, 'ttl')
+            conversation = None
+        if conversation is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        self._conversations.move_to_end(key)
+        conversation.last_access = time.monotonic()
+        return conversation
+
+    def _is_expired(self, conversation):
+        return time.monotonic() - conversation.last_access > self.ttl_seconds
+
+    def _maybe_sweep(self):
+        now = time.monotonic()
+        if now - self._last_sweep < SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+
+        # OrderedDict is in LRU order, so expired conversations are at the front
+        while self._conversations:
+            key, conversation = next(iter(self._conversations.items()))
+            if not self._is_expired(conversation):
+                break
+            self._evict(key, 'ttl')
+
+    def _enforce_limits(self, keep=None):
+        while len(self._conversations) > self.max_conversations:
+            if not self._evict_oldest('lru', keep):
+                break
+        while self._total_chars > self.max_total_chars:
+            if not self._evict_oldest('memory', keep):
+                break
+
+    def _evict_oldest(self, reason, keep):
+        for key in self._conversations:
+            if key != keep:
+                self._evict(key, reason)
+                return True
+        return False
+
+    def _evict(self, key, reason):
+        conversation = self._conversations.pop(key)
+        self._total_chars -= conversation.chars
+        self._evictions[reason] += 1
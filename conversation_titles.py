@@ -0,0 +1,159 @@
+"""
+Conversation Titles
+Instant local titles for new conversations, upgraded by Groq in the background
+
+POST /conversations names a conversation with local_title() and returns at
+once (titleSource 'local'). TitleUpgrader then asks Groq for a better title
+and writes it back with titleSource 'llm' - unless the user renamed the
+conversation in the meantime. The sidebar shows it on its next list fetch
+"""
+
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from google.api_core.exceptions import FailedPrecondition
+
+from emotion_classifier import LexiconEmotionClassifier, tokenize
+
+log = logging.getLogger('menti.titles')
+
+# Topic keywords (single words or two-word phrases) -> title wording
+TOPICS = {
+    'work': 'Work', 'job': 'Work', 'boss': 'Work', 'coworker': 'Work', 'coworkers': 'Work',
+    'office': 'Work', 'career': 'Work', 'interview': 'Work',
+    'school': 'School', 'class': 'School', 'classes': 'School', 'college': 'School',
+    'university': 'School', 'homework': 'School', 'exam': 'Exams', 'exams': 'Exams',
+    'finals': 'Exams', 'grades': 'School',
+    'sleep': 'Sleep', 'insomnia': 'Sleep', 'cant sleep': 'Sleep', 'nightmares': 'Sleep',
+    'relationship': 'Relationships', 'boyfriend': 'Relationships', 'girlfriend': 'Relationships',
+    'partner': 'Relationships', 'husband': 'Relationships', 'wife': 'Relationships',
+    'breakup': 'a Breakup', 'broke up': 'a Breakup', 'divorce': 'a Breakup',
+    'family': 'Family', 'parents': 'Family', 'mom': 'Family', 'dad': 'Family',
+    'mother': 'Family', 'father': 'Family', 'sister': 'Family', 'brother': 'Family',
+    'friend': 'Friendships', 'friends': 'Friendships',
+    'money': 'Money', 'bills': 'Money', 'rent': 'Money', 'debt': 'Money',
+    'health': 'Health', 'sick': 'Health', 'illness': 'Health', 'pain': 'Health',
+    'died': 'Loss', 'passed away': 'Loss', 'grief': 'Loss', 'funeral': 'Loss',
+    'future': 'the Future', 'lonely': 'Loneliness', 'alone': 'Loneliness',
+    'confidence': 'Self-Esteem', 'myself': 'Self-Esteem',
+}
+
+# Emotion -> (title prefix when there is a topic, title without one)
+EMOTION_TITLES = {
+    'anxious': ('Anxiety About', 'Feeling Anxious'),
+    'stressed': ('Stress About', 'Feeling Stressed'),
+    'sad': ('Feeling Down About', 'Feeling Down'),
+    'happy': ('Good News About', 'Sharing Good News'),
+}
+
+STOPWORDS = {
+    'i', 'im', 'ive', 'me', 'my', 'a', 'an', 'the', 'and', 'or', 'but', 'to', 'of', 'in',
+    'on', 'at', 'for', 'with', 'about', 'is', 'am', 'are', 'was', 'were', 'be', 'been',
+    'it', 'its', 'this', 'that', 'so', 'really', 'very', 'just', 'feel', 'feeling', 'have',
+    'has', 'had', 'do', 'dont', 'how', 'what', 'why', 'when', 'can', 'cant', 'lately',
+    'like', 'know', 'want', 'get', 'you', 'your', 'hi', 'hey', 'hello', 'today',
+}
+
+MAX_TITLE_LENGTH = 60
+DEFAULT_TITLE = 'New Conversation'
+
+_classifier = LexiconEmotionClassifier()
+
+
+def local_title(message):
+    """
+    Keyword-based title from the first message, e.g. 'Anxiety About Work and Sleep'
+    Runs in microseconds; never calls the network
+    """
+    tokens = tokenize(message)
+    topics = []
+    for i, token in enumerate(tokens):
+        topic = TOPICS.get(' '.join(tokens[i:i + 2])) or TOPICS.get(token)
+        if topic and topic not in topics:
+            topics.append(topic)
+    topics = topics[:2]
+
+    emotion, confidence = _classifier.classify(message)
+    prefix, alone = EMOTION_TITLES.get(emotion, (None, None)) if confidence > 0 else (None, None)
+
+    if topics and prefix:
+        title = f"{prefix} {' and '.join(topics)}"
+    elif topics:
+        title = f"Talking About {' and '.join(topics)}"
+    elif alone:
+        title = alone
+    else:
+        words = [token for token in tokens if token not in STOPWORDS][:4]
+        title = ' '.join(word.capitalize() for word in words) or DEFAULT_TITLE
+    return title if len(title) <= MAX_TITLE_LENGTH else title[:MAX_TITLE_LENGTH - 3] + '...'
+
+
+class TitleUpgrader:
+    """
+    Background stage that replaces local titles with Groq-generated ones
+
+    generate_fn(first_message) -> title, or None to keep the local title
+    on_title(conversation_id, title) is called after a title was written
+    (app.py uses it to patch the conversation list cache)
+    """
+
+    def __init__(self, db, generate_fn, on_title=None, max_workers=2, max_attempts=3):
+        self.db = db
+        self.generate_fn = generate_fn
+        self.on_title = on_title
+        self.max_attempts = max_attempts
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='title-upgrade')
+
+        self._lock = threading.Lock()
+        self._counts = {'scheduled': 0, 'upgraded': 0, 'kept_local': 0, 'skipped': 0, 'errors': 0}
+
+    def schedule(self, conversation_id, first_message):
+        """Queue a title upgrade and return immediately"""
+        self._count('scheduled')
+        self._executor.submit(self._upgrade, conversation_id, first_message)
+
+    def _upgrade(self, conversation_id, first_message):
+        try:
+            title = self.generate_fn(first_message)
+        except Exception as e:
+            print(f"⚠️ Title generation failed for conversation {conversation_id}: {e}")
+            title = None
+        if not title:
+            self._count('kept_local')
+            return
+
+        conversation_ref = self.db.collection('conversations').document(conversation_id)
+        try:
+            for _ in range(self.max_attempts):
+                snapshot = conversation_ref.get()
+                if not snapshot.exists or (snapshot.to_dict() or {}).get('titleSource') != 'local':
+                    self._count('skipped')  # deleted, or renamed by the user meanwhile
+                    return
+                try:
+                    # Only if nothing changed since the read, so a rename can't be overwritten
+                    conversation_ref.update({'title': title, 'titleSource': 'llm'},
+                                            option=self.db.write_option(last_update_time=snapshot.update_time))
+                except FailedPrecondition:
+                    continue  # e.g. a message was stored in between; check again
+                if self.on_title:
+                    self.on_title(conversation_id, title)
+                self._count('upgraded')
+                log.debug("✨ Upgraded conversation title", extra={'conversation_id': conversation_id, 'title': title})
+                return
+            self._count('skipped')
+        except Exception as e:
+            print(f"⚠️ Could not write title for conversation {conversation_id}: {e}")
+            self._count('errors')
+
+    def _count(self, counter):
+        with self._lock:
+            self._counts[counter] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self._counts)
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
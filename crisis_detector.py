@@ -0,0 +1,200 @@
+"""
+Crisis Detector
+In-process check for self-harm and suicide language, run on every message
+before emotion detection
+
+Phrases come from crisis_phrases.txt and are compiled once into an
+Aho-Corasick automaton over words, so a message is scanned in a single pass
+no matter how many phrases there are, and matches always fall on word
+boundaries. Messages and phrases go through the same normalisation:
+lowercase, apostrophes dropped, digits/symbols mapped to letters
+(k1ll -> kill), other punctuation split on, repeated letters collapsed
+(diiie -> die) and text-speak expanded (wanna -> want to)
+"""
+
+import os
+import re
+import string
+import threading
+import time
+from collections import deque, namedtuple
+from functools import lru_cache
+
+DEFAULT_PHRASES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'crisis_phrases.txt')
+
+# Shown with every crisis reply (the system prompt already points to 988)
+CRISIS_RESOURCES = [
+    {'name': '988 Suicide & Crisis Lifeline', 'contact': 'Call or text 988', 'region': 'US'},
+    {'name': 'Crisis Text Line', 'contact': 'Text HOME to 741741', 'region': 'US'},
+    {'name': 'Emergency services', 'contact': 'Call 911 if you are in immediate danger', 'region': 'US'},
+    {'name': 'Find a helpline', 'contact': 'https://findahelpline.com', 'region': 'International'},
+]
+
+CrisisMatch = namedtuple('CrisisMatch', ['categories', 'phrases'])
+
+# Text-speak expanded before matching (after repeated letters are collapsed)
+SHORTHAND = {
+    'b': 'be', 'u': 'you', 'ur': 'your', 'r': 'are', 'wana': 'want to', 'gona': 'going to',
+    'tryna': 'trying to', 'cuz': 'because', 'bc': 'because', 'idk': 'i dont know',
+}
+
+# One str.translate pass: leetspeak digits/symbols to letters, apostrophes
+# dropped (can't -> cant), every other punctuation mark or digit to a space
+_LEET = {'0': 'o', '1': 'i', '3': 'e', '4': 'a', '5': 's', '7': 't', '@': 'a', '$': 's'}
+_TABLE = str.maketrans({
+    **{char: ' ' for char in string.punctuation + string.digits},
+    **_LEET,
+    "'": None, '’': None,
+})
+_REPEATS = re.compile(r"(.)\1+")
+
+
+@lru_cache(maxsize=50000)
+def _canonical_word(word):
+    # Natural text repeats the same words, so the regex runs once per distinct word
+    word = _REPEATS.sub(r"\1", word)
+    return tuple(SHORTHAND.get(word, word).split())
+
+
+def normalize_words(text):
+    """Canonical word list used for matching"""
+    words = []
+    for word in text.lower().translate(_TABLE).split():
+        words.extend(_canonical_word(word))
+    return words
+
+
+def normalize(text):
+    """Canonical form of text as one string (phrase keys, diagnostics)"""
+    return ' '.join(normalize_words(text))
+
+
+def load_phrases(path=DEFAULT_PHRASES_PATH):
+    """Read {phrase: category} from a phrase file ([category] headers, '#' comments)"""
+    phrases = {}
+    category = 'crisis'
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('[') and line.endswith(']'):
+                category = line[1:-1].strip()
+            else:
+                phrases[line] = category
+    return phrases
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher: finds every pattern occurring in a sequence in one pass
+    Patterns and the searched sequence are tuples of symbols (here: words)
+    """
+
+    def __init__(self, patterns):
+        self._goto = [{}]     # state -> {symbol: next state}
+        self._fail = [0]
+        self._output = [[]]   # state -> patterns ending here
+        for pattern in patterns:
+            self._add(pattern)
+        self._link()
+
+    def _add(self, pattern):
+        state = 0
+        for symbol in pattern:
+            next_state = self._goto[state].get(symbol)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][symbol] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(pattern)
+
+    def _link(self):
+        # Breadth-first: a state's failure link points to its longest proper suffix in the trie
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for symbol, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and symbol not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(symbol, 0)
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, sequence):
+        """Patterns found in sequence (each once, in order of first occurrence)"""
+        found = []
+        goto, fail, output = self._goto, self._fail, self._output
+        state = 0
+        for symbol in sequence:
+            while state and symbol not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(symbol, 0)
+            if output[state]:
+                for pattern in output[state]:
+                    if pattern not in found:
+                        found.append(pattern)
+        return found
+
+    def __len__(self):
+        return len(self._goto)
+
+
+class CrisisDetector:
+    """
+    detect(message) -> CrisisMatch or None
+
+    Leans towards flagging: a negated phrase ("I'm not suicidal") still
+    matches, since showing resources to someone who doesn't need them costs
+    far less than missing someone who does
+    """
+
+    def __init__(self, phrases=None, path=DEFAULT_PHRASES_PATH):
+        phrases = load_phrases(path) if phrases is None else phrases
+        # Normalised phrase (tuple of words) -> (original phrase, category)
+        self._phrases = {}
+        for phrase, category in phrases.items():
+            key = tuple(normalize_words(phrase))
+            if key:
+                self._phrases[key] = (phrase, category)
+        self._matcher = AhoCorasick(self._phrases)
+
+        self._lock = threading.Lock()
+        self._checks = 0
+        self._seconds = 0.0
+        self._matches = {}
+
+    def detect(self, message):
+        started = time.perf_counter()
+        found = self._matcher.search(normalize_words(message)) if message else []
+        elapsed = time.perf_counter() - started
+
+        match = None
+        if found:
+            categories = []
+            for key in found:
+                category = self._phrases[key][1]
+                if category not in categories:
+                    categories.append(category)
+            match = CrisisMatch(categories, [self._phrases[key][0] for key in found])
+
+        with self._lock:
+            self._checks += 1
+            self._seconds += elapsed
+            for category in (match.categories if match else ()):
+                self._matches[category] = self._matches.get(category, 0) + 1
+        return match
+
+    def stats(self):
+        with self._lock:
+            return {
+                'phrases': len(self._phrases),
+                'automaton_states': len(self._matcher),
+                'checks': self._checks,
+                'matches': dict(self._matches),
+                'avg_check_us': round(self._seconds / self._checks * 1_000_000, 2) if self._checks else 0.0,
+            }
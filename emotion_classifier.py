@@ -0,0 +1,156 @@
+"""
+Local Emotion Classifier
+In-process lexicon/n-gram scorer used by detect_emotion before falling back to Groq
+Returns one of: happy, sad, anxious, stressed, or neutral, plus a confidence score
+"""
+
+import math
+import re
+
+EMOTIONS = ('happy', 'sad', 'anxious', 'stressed', 'neutral')
+
+# Weighted cue phrases per emotion (unigrams, bigrams and trigrams)
+# Weights: 2.0 = strong/unambiguous cue, 1.0 = typical cue, 0.5 = weak hint
+EMOTION_LEXICON = {
+    'happy': {
+        'happy': 2.0, 'glad': 1.5, 'joy': 2.0, 'joyful': 2.0, 'excited': 2.0,
+        'grateful': 1.5, 'thankful': 1.5, 'proud': 1.5, 'great': 1.0, 'amazing': 1.5,
+        'awesome': 1.5, 'wonderful': 1.5, 'fantastic': 1.5, 'good news': 2.0,
+        'feel good': 1.5, 'feeling good': 1.5, 'feeling great': 2.0, 'so good': 1.0,
+        'love': 1.0, 'loved': 1.0, 'relieved': 1.0, 'yay': 2.0, 'finally': 0.5,
+        'celebrate': 1.5, 'celebrating': 1.5, 'passed': 1.0, 'promoted': 1.5,
+        'got the job': 2.0, 'best day': 2.0, 'smiling': 1.5, 'content': 1.0,
+        'peaceful': 1.0, 'hopeful': 1.0, 'better today': 1.5, 'feeling better': 1.5,
+    },
+    'sad': {
+        'sad': 2.0, 'unhappy': 2.0, 'depressed': 2.0, 'down': 1.0, 'feeling down': 2.0,
+        'cry': 2.0, 'crying': 2.0, 'cried': 2.0, 'tears': 1.5, 'lonely': 2.0,
+        'alone': 1.5, 'heartbroken': 2.0, 'broken': 1.0, 'grief': 2.0, 'grieving': 2.0,
+        'miss': 1.0, 'miss her': 1.5, 'miss him': 1.5, 'lost': 1.0, 'passed away': 2.0,
+        'died': 2.0, 'breakup': 1.5, 'broke up': 1.5, 'hopeless': 2.0, 'empty': 1.5,
+        'worthless': 2.0, 'hurt': 1.0, 'hurts': 1.0, 'miserable': 2.0, 'upset': 1.0,
+        'disappointed': 1.5, 'nobody cares': 2.0, 'no one cares': 2.0, 'numb': 1.5,
+        'rejected': 1.5, 'isolated': 1.5,
+    },
+    'anxious': {
+        'anxious': 2.0, 'anxiety': 2.0, 'worried': 2.0, 'worry': 1.5, 'worrying': 2.0,
+        'nervous': 2.0, 'scared': 1.5, 'afraid': 1.5, 'fear': 1.5, 'panic': 2.0,
+        'panicking': 2.0, 'panic attack': 2.0, 'terrified': 2.0, 'uneasy': 1.5,
+        'on edge': 2.0, 'what if': 1.5, 'overthinking': 2.0, 'cant stop thinking': 1.5,
+        'racing thoughts': 2.0, 'heart racing': 2.0, 'cant breathe': 1.5, 'dread': 2.0,
+        'restless': 1.0, 'tense': 1.0, 'paranoid': 1.5, 'shaking': 1.0,
+        'cant sleep': 1.0, 'interview': 0.5, 'nervous about': 1.0,
+    },
+    'stressed': {
+        'stressed': 2.0, 'stress': 2.0, 'stressful': 2.0, 'overwhelmed': 2.0,
+        'overwhelming': 2.0, 'pressure': 1.5, 'deadline': 1.5, 'deadlines': 1.5,
+        'too much': 1.5, 'so much to do': 2.0, 'burnout': 2.0, 'burned out': 2.0,
+        'burnt out': 2.0, 'exhausted': 1.5, 'tired': 1.0, 'drained': 1.5,
+        'workload': 1.5, 'swamped': 2.0, 'no time': 1.5, 'cant keep up': 2.0,
+        'frustrated': 1.0, 'exams': 1.0, 'exam': 1.0, 'finals': 1.0, 'overworked': 2.0,
+        'juggling': 1.5, 'busy': 0.5, 'behind on': 1.5, 'bills': 1.0, 'stretched thin': 2.0,
+    },
+    'neutral': {
+        'hello': 1.0, 'hi': 1.0, 'hey': 1.0, 'ok': 0.5, 'okay': 0.5, 'fine': 0.5,
+        'thanks': 0.5, 'thank you': 0.5, 'just wanted to talk': 1.0, 'not sure': 0.5,
+        'curious': 0.5, 'question': 0.5, 'how are you': 1.0, 'whats up': 1.0,
+        'nothing much': 1.0, 'normal day': 1.0, 'so so': 1.0, 'alright': 0.5,
+    },
+}
+
+NEGATIONS = {'not', 'no', 'never', 'dont', 'didnt', 'isnt', 'wasnt', 'arent', 'aint', 'hardly', 'without'}
+INTENSIFIERS = {'very': 1.5, 'so': 1.3, 'really': 1.3, 'extremely': 1.8, 'super': 1.5, 'too': 1.3, 'completely': 1.5}
+
+MAX_NGRAM = 3
+NEGATION_WINDOW = 3
+
+# How quickly confidence saturates with the total amount of evidence
+EVIDENCE_SCALE = 1.5
+
+_TOKEN_PATTERN = re.compile(r"[a-z]+")
+
+
+def tokenize(text):
+    """Lowercase, drop apostrophes (can't -> cant) and split into word tokens"""
+    return _TOKEN_PATTERN.findall(text.lower().replace("'", "").replace("’", ""))
+
+
+class LexiconEmotionClassifier:
+    """
+    Weighted lexicon/n-gram emotion scorer
+    Runs fully in-process in microseconds - no network, no model files
+    """
+
+    name = 'lexicon'
+
+    def __init__(self, lexicon=None):
+        lexicon = lexicon or EMOTION_LEXICON
+        # Flatten to phrase -> [(emotion, weight)] keyed by token tuples
+        self._phrases = {}
+        for emotion, cues in lexicon.items():
+            for phrase, weight in cues.items():
+                key = tuple(tokenize(phrase))
+                self._phrases.setdefault(key, []).append((emotion, weight))
+
+    def scores(self, text):
+        """Return the raw evidence score for each emotion"""
+        tokens = tokenize(text)
+        scores = dict.fromkeys(EMOTIONS, 0.0)
+
+        i = 0
+        while i < len(tokens):
+            matched = 1
+            for n in range(MAX_NGRAM, 0, -1):
+                key = tuple(tokens[i:i + n])
+                if len(key) < n or key not in self._phrases:
+                    continue
+
+                window = tokens[max(0, i - NEGATION_WINDOW):i]
+                negated = any(token in NEGATIONS for token in window)
+                boost = INTENSIFIERS.get(tokens[i - 1], 1.0) if i > 0 else 1.0
+
+                for emotion, weight in self._phrases[key]:
+                    if negated:
+                        # "not happy" leans sad; "not worried" carries no signal
+                        if emotion == 'happy':
+                            scores['sad'] += weight * 0.5
+                    else:
+                        scores[emotion] += weight * boost
+                matched = n  # longest match wins, skip the words it covered
+                break
+            i += matched
+
+        return scores
+
+    def classify(self, text):
+        """
+        Classify text into one emotion
+        Returns: (label, confidence) with confidence in [0, 1]
+        """
+        scores = self.scores(text)
+        total = sum(scores.values())
+        if total <= 0:
+            return 'neutral', 0.0
+
+        label = max(EMOTIONS, key=lambda emotion: scores[emotion])
+        share = scores[label] / total
+        evidence = 1.0 - math.exp(-total / EVIDENCE_SCALE)
+        return label, round(share * evidence, 3)
+
+
+# Available local classifiers, selected with EMOTION_CLASSIFIER
+CLASSIFIERS = {
+    'lexicon': LexiconEmotionClassifier,
+}
+
+
+def get_classifier(name):
+    """
+    Build the configured local classifier
+    Returns None for 'none'/'llm' so detect_emotion always uses Groq
+    """
+    if not name or name.lower() in ('none', 'llm'):
+        return None
+    if name.lower() not in CLASSIFIERS:
+        raise ValueError(f"Unknown emotion classifier '{name}'. Available: {', '.join(CLASSIFIERS)}")
+    return CLASSIFIERS[name.lower()]()
@@ -0,0 +1,104 @@
+"""
+Firestore Delete
+Bulk deletion of conversations and their messages subcollection
+Shared by DELETE /conversations/<id> and the guest sweeper (guest_sweeper.py)
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# Firestore accepts at most 500 writes per batch
+MAX_BATCH_SIZE = 500
+
+
+class ConversationDeleter:
+    """
+    Deletes conversations with batched writes instead of one RPC per document
+
+    Messages are read in pages of batch_size (document IDs only) and each page
+    is deleted with one WriteBatch; the conversation document goes in the last
+    batch. Several conversations are deleted in parallel on a bounded pool
+    """
+
+    def __init__(self, db, max_workers=4, batch_size=MAX_BATCH_SIZE):
+        self.db = db
+        self.batch_size = min(batch_size, MAX_BATCH_SIZE)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='firestore-delete')
+        self._lock = threading.Lock()
+        self._conversations_deleted = 0
+        self._messages_deleted = 0
+        self._batches = 0
+        self._failures = 0
+
+    def delete_conversation(self, conversation_id):
+        """Delete one conversation and all its messages. Returns the number of messages deleted"""
+        conversation_ref = self.db.collection('conversations').document(conversation_id)
+        messages_ref = conversation_ref.collection('messages')
+
+        deleted = 0
+        batches = 0
+        while True:
+            page = list(messages_ref.select([]).limit(self.batch_size).stream())
+            batch = self.db.batch()
+            for msg_doc in page:
+                batch.delete(msg_doc.reference)
+            last_page = len(page) < self.batch_size
+            if last_page:
+                batch.delete(conversation_ref)
+            batch.commit()
+            deleted += len(page)
+            batches += 1
+            if last_page:
+                break
+
+        with self._lock:
+            self._conversations_deleted += 1
+            self._messages_deleted += deleted
+            self._batches += batches
+        return deleted
+
+    def delete_conversations(self, conversation_ids, progress=None):
+        """
+        Delete several conversations in parallel
+        progress(done, total, conversation_id, messages_deleted) is called as each
+        one finishes (messages_deleted is None if it failed)
+        Returns a report: conversations, messages, failed IDs and elapsed seconds
+        """
+        conversation_ids = list(conversation_ids)
+        started = time.perf_counter()
+        report = {'conversations': 0, 'messages': 0, 'failed': [], 'seconds': 0.0}
+        if not conversation_ids:
+            return report
+
+        futures = {self._executor.submit(self.delete_conversation, conversation_id): conversation_id
+                   for conversation_id in conversation_ids}
+        for done, future in enumerate(as_completed(futures), start=1):
+            conversation_id = futures[future]
+            try:
+                deleted = future.result()
+            except Exception as e:
+                print(f"❌ Error deleting conversation {conversation_id}: {e}")
+                report['failed'].append(conversation_id)
+                with self._lock:
+                    self._failures += 1
+                deleted = None
+            else:
+                report['conversations'] += 1
+                report['messages'] += deleted
+            if progress:
+                progress(done, len(conversation_ids), conversation_id, deleted)
+
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        return report
+
+    def stats(self):
+        """Totals since startup"""
+        with self._lock:
+            return {
+                'conversations_deleted': self._conversations_deleted,
+                'messages_deleted': self._messages_deleted,
+                'batches': self._batches,
+                'failures': self._failures,
+            }
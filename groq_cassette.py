@@ -0,0 +1,266 @@
+"""
+Groq Cassette
+Record Groq chat completions once, replay them offline
+
+In record mode every completion that goes through LLMClient (emotion,
+replies, streams, titles, summaries, crisis replies) is passed on to Groq
+and appended to a JSONL cassette: a hash of the request, the response and
+how long it took. In replay mode the same requests are answered from the
+cassette without touching the network, optionally with the recorded
+latency (scaled), so profiling runs measure our own code and not Groq's
+day-to-day variance
+
+A request is matched on a SHA-256 of its parameters (model, messages,
+max_tokens, temperature, ...) minus the per-call timeout and any fields
+listed in ignore_fields. The same request recorded several times is
+replayed round-robin. Only successful exchanges are recorded; a replayed
+request that isn't in the cassette raises CassetteMissError
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from groq.lib.chat_completion_chunk import ChatCompletionChunk
+from groq.types.chat import ChatCompletion
+
+from completion_stream import WrappedStream
+
+log = logging.getLogger('menti.cassette')
+
+CASSETTE_MODES = ('off', 'record', 'replay')
+
+# Never part of the request key
+ALWAYS_IGNORED = ('timeout',)
+
+
+class CassetteMissError(Exception):
+    """Replay mode got a request that was never recorded"""
+
+
+def request_key(params, ignore_fields=()):
+    """Stable hash of a chat.completions.create request"""
+    ignored = set(ALWAYS_IGNORED) | set(ignore_fields)
+    request = {name: value for name, value in params.items() if name not in ignored}
+    encoded = json.dumps(request, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+
+
+class Cassette:
+    """
+    On-disk cassette plus its in-memory index (key -> recorded exchanges)
+
+    Lines look like
+      {"key": ..., "model": ..., "latency_ms": 412.3, "response": {...}}
+      {"key": ..., "model": ..., "latency_ms": 180.0, "stream": {"head": {...}, "chunks": [[ms, text, finish], ...]}}
+    where a stream's latency_ms is the time to its first chunk
+    """
+
+    def __init__(self, path, mode='replay', latency_scale=0.0, ignore_fields=()):
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        # 0 replays instantly, 1.0 as recorded, 0.5 twice as fast
+        self.latency_scale = latency_scale
+        self.ignore_fields = tuple(ignore_fields)
+        self._lock = threading.Lock()
+        self._index = {}
+        self._next = {}
+        self._counts = {'recorded': 0, 'replayed': 0, 'misses': 0, 'incomplete': 0}
+        if mode == 'replay':
+            self._load()
+
+    # ---------- recording ----------
+
+    def record_response(self, params, response, seconds):
+        self._append(params, {'latency_ms': round(seconds * 1000, 1),
+                              'response': response.model_dump(exclude_none=True)})
+
+    def record_stream(self, params, head, chunks, first_chunk_seconds):
+        self._append(params, {'latency_ms': round(first_chunk_seconds * 1000, 1),
+                              'stream': {'head': head, 'chunks': chunks}})
+
+    def record_incomplete(self, params):
+        """A stream that was closed or failed before its end - left out of the cassette"""
+        with self._lock:
+            self._counts['incomplete'] += 1
+        log.warning("📼 Stream ended early, not recorded",
+                    extra={'request_key': request_key(params, self.ignore_fields)[:12], 'model': params.get('model')})
+
+    def _append(self, params, entry):
+        entry = {'key': request_key(params, self.ignore_fields), 'model': params.get('model'), **entry}
+        line = json.dumps(entry, separators=(',', ':'), ensure_ascii=False)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+            self._counts['recorded'] += 1
+
+    # ---------- replay ----------
+
+    def _load(self):
+        with open(self.path, encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._index.setdefault(entry['key'], []).append(entry)
+        print(f"📼 Loaded {sum(len(e) for e in self._index.values())} Groq exchanges "
+              f"({len(self._index)} distinct requests) from {self.path}")
+
+    def lookup(self, params):
+        """Next recorded exchange for this request (round-robin over repeats)"""
+        key = request_key(params, self.ignore_fields)
+        with self._lock:
+            entries = self._index.get(key)
+            if not entries:
+                self._counts['misses'] += 1
+                raise CassetteMissError(f"No recorded Groq response for request {key[:12]} "
+                                        f"(model {params.get('model')}) in {self.path}")
+            position = self._next.get(key, 0)
+            self._next[key] = position + 1
+            self._counts['replayed'] += 1
+            return entries[position % len(entries)]
+
+    def replay(self, params):
+        """ChatCompletion, or an iterator of ChatCompletionChunk for a stream"""
+        entry = self.lookup(params)
+        if 'stream' in entry:
+            return self._replay_stream(entry)
+        self._wait(entry['latency_ms'] / 1000)
+        # construct() builds the nested models without validation, as the SDK does for live responses
+        return ChatCompletion.construct(**entry['response'])
+
+    def _replay_stream(self, entry):
+        started = time.perf_counter()
+        head = entry['stream']['head']
+        for offset_ms, text, finish_reason in entry['stream']['chunks']:
+            # Offsets are from the start of the call, so a slow consumer doesn't add up delays
+            self._wait(started + offset_ms / 1000 * self.latency_scale - time.perf_counter(), scaled=False)
+            delta = {'content': text} if text is not None else {}
+            yield ChatCompletionChunk.construct(
+                **head, choices=[{'index': 0, 'delta': delta, 'finish_reason': finish_reason}])
+
+    def _wait(self, seconds, scaled=True):
+        delay = seconds * self.latency_scale if scaled else seconds
+        if self.latency_scale and delay > 0:
+            time.sleep(delay)
+
+    def stats(self):
+        with self._lock:
+            return {'mode': self.mode, 'path': self.path, 'latency_scale': self.latency_scale,
+                    'requests_indexed': len(self._index), **self._counts}
+
+
+class _RecordingCompletions:
+    """chat.completions of the real client, recording each successful exchange"""
+
+    def __init__(self, completions, cassette):
+        self._completions = completions
+        self._cassette = cassette
+        self.with_raw_response = _RecordingRawCompletions(completions.with_raw_response, cassette)
+
+    def create(self, **params):
+        started = time.perf_counter()
+        result = self._completions.create(**params)
+        return _record(self._cassette, params, result, started)
+
+
+class _RecordingRawCompletions:
+    """with_raw_response variant, so the rate-limit scheduler still sees Groq's headers"""
+
+    def __init__(self, raw_completions, cassette):
+        self._raw_completions = raw_completions
+        self._cassette = cassette
+
+    def create(self, **params):
+        started = time.perf_counter()
+        raw = self._raw_completions.create(**params)
+        return _RecordedRawResponse(raw.headers, _record(self._cassette, params, raw.parse(), started))
+
+
+class _RecordedRawResponse:
+    def __init__(self, headers, parsed):
+        self.headers = headers
+        self._parsed = parsed
+
+    def parse(self):
+        return self._parsed
+
+
+def _record(cassette, params, result, started):
+    if not params.get('stream'):
+        cassette.record_response(params, result, time.perf_counter() - started)
+        return result
+    return _RecordingStream(cassette, params, result, started)
+
+
+class _RecordingStream(WrappedStream):
+    """
+    Passes chunks through; the stream is recorded once it has been read to the end
+    A stream closed early (e.g. the client disconnected) is counted as incomplete,
+    not recorded - replaying a cut-off reply would skew later runs
+    """
+
+    def __init__(self, cassette, params, stream, started):
+        self._cassette = cassette
+        self._params = params
+        self._started = started
+        self._head = None
+        self._chunks = []
+        super().__init__(stream)
+
+    def on_chunk(self, chunk):
+        offset_ms = round((time.perf_counter() - self._started) * 1000, 1)
+        if self._head is None:
+            self._head = {'id': chunk.id, 'created': chunk.created, 'model': chunk.model, 'object': chunk.object}
+        if chunk.choices:
+            choice = chunk.choices[0]
+            self._chunks.append([offset_ms, choice.delta.content, choice.finish_reason])
+
+    def on_end(self, completed):
+        if not completed:
+            self._cassette.record_incomplete(self._params)
+            return
+        chunks = self._chunks
+        first_chunk_seconds = chunks[0][0] / 1000 if chunks else time.perf_counter() - self._started
+        self._cassette.record_stream(self._params, self._head or {'model': self._params.get('model')},
+                                     chunks, first_chunk_seconds)
+
+
+class _Namespace:
+    def __init__(self, **attributes):
+        self.__dict__.update(attributes)
+
+
+def recording_client(client, cassette):
+    """Groq client wrapper that records every completion into the cassette"""
+    return _Namespace(chat=_Namespace(completions=_RecordingCompletions(client.chat.completions, cassette)))
+
+
+def replay_client(cassette):
+    """Groq client stand-in answering chat.completions.create from the cassette"""
+    def create(timeout=None, **params):
+        return cassette.replay(params)
+    return _Namespace(chat=_Namespace(completions=_Namespace(create=create)))
+
+
+def create_cassette():
+    """Cassette from GROQ_CASSETTE_* settings, or None when the mode is off"""
+    mode = os.getenv('GROQ_CASSETTE_MODE', 'off').lower()
+    if mode not in CASSETTE_MODES:
+        print(f"⚠️  Unknown GROQ_CASSETTE_MODE '{mode}', cassette disabled")
+        return None
+    if mode == 'off':
+        return None
+    ignore_fields = [field.strip() for field in os.getenv('GROQ_CASSETTE_IGNORE', '').split(',') if field.strip()]
+    cassette = Cassette(
+        os.getenv('GROQ_CASSETTE_PATH', 'groq_cassette.jsonl'),
+        mode=mode,
+        latency_scale=float(os.getenv('GROQ_CASSETTE_LATENCY_SCALE', '0')),
+        ignore_fields=ignore_fields,
+    )
+    print(f"📼 Groq cassette: {mode} ({cassette.path})")
+    return cassette
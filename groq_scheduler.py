@@ -0,0 +1,280 @@
+"""
+Groq Scheduler
+Process-wide, rate-limit-aware admission for outbound Groq calls
+
+Every call from llm_client.py asks the scheduler for a slot first. The
+scheduler tracks Groq's x-ratelimit-remaining-* / reset headers (and
+Retry-After on 429s), keeps a small reserve of requests and tokens for
+high-priority work, and hands out slots in priority order. Low-priority
+calls (titles, summaries) are dropped to their fallback instead of queueing
+when the budget is tight
+"""
+
+import heapq
+import itertools
+import re
+import threading
+import time
+from collections import deque
+
+from token_budget import estimate_message_tokens
+
+# Lower number = more important
+PRIORITY_CRISIS = -1
+PRIORITY_REPLY = 0
+PRIORITY_EMOTION = 1
+PRIORITY_SUMMARY = 2
+PRIORITY_TITLE = 3
+
+PRIORITY_NAMES = {
+    PRIORITY_CRISIS: 'crisis',
+    PRIORITY_REPLY: 'reply',
+    PRIORITY_EMOTION: 'emotion',
+    PRIORITY_SUMMARY: 'summary',
+    PRIORITY_TITLE: 'title',
+}
+
+# Priority of each llm_client call type
+CALL_PRIORITIES = {
+    'crisis': PRIORITY_CRISIS,
+    'reply': PRIORITY_REPLY,
+    'stream': PRIORITY_REPLY,
+    'structured': PRIORITY_REPLY,
+    'emotion': PRIORITY_EMOTION,
+    'summary': PRIORITY_SUMMARY,
+    'title': PRIORITY_TITLE,
+}
+
+# Share of the rate-limit window a priority must leave for more important work.
+# A title call only goes out while more than 20% of the requests/tokens remain
+DEFAULT_RESERVES = {
+    PRIORITY_CRISIS: 0.0,
+    PRIORITY_REPLY: 0.0,
+    PRIORITY_EMOTION: 0.02,
+    PRIORITY_SUMMARY: 0.1,
+    PRIORITY_TITLE: 0.2,
+}
+
+# Longest a call waits in the queue (seconds) before it is dropped (droppable
+# priorities) or sent anyway and left to Groq to accept or reject
+DEFAULT_MAX_WAIT = {
+    PRIORITY_CRISIS: 10.0,
+    PRIORITY_REPLY: 10.0,
+    PRIORITY_EMOTION: 3.0,
+    PRIORITY_SUMMARY: 0.0,
+    PRIORITY_TITLE: 0.0,
+}
+
+DROPPABLE_PRIORITIES = {PRIORITY_SUMMARY, PRIORITY_TITLE}
+
+_DURATION_PART = re.compile(r'(\d+(?:\.\d+)?)(ms|h|m|s)')
+_DURATION_UNITS = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+
+
+class CallDropped(Exception):
+    """A low-priority call was not sent because the rate-limit budget is tight"""
+
+
+def parse_reset(value):
+    """Parse Groq's reset durations ('7.66s', '2m59.56s', '150ms') into seconds"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(amount) * _DURATION_UNITS[unit] for amount, unit in parts)
+
+
+def estimate_call_tokens(params):
+    """Rough token cost of a completion request: prompt + max reply tokens"""
+    prompt = sum(estimate_message_tokens(m) for m in params.get('messages', ()))
+    return prompt + int(params.get('max_tokens') or 0)
+
+
+class _Limit:
+    """Remaining budget for one rate-limit dimension (requests or tokens)"""
+
+    __slots__ = ('limit', 'remaining', 'resets_at')
+
+    def __init__(self):
+        self.limit = None
+        self.remaining = None
+        self.resets_at = None
+
+    def update(self, limit, remaining, reset_seconds, now):
+        if limit is not None:
+            self.limit = limit
+        if remaining is not None:
+            self.remaining = remaining
+            self.resets_at = now + reset_seconds if reset_seconds is not None else None
+
+    def refresh(self, now):
+        # Past the reset time the window has been replenished
+        if self.resets_at is not None and now >= self.resets_at:
+            self.remaining = None
+            self.resets_at = None
+
+    def allows(self, cost, reserve_share):
+        if self.remaining is None:
+            return True
+        reserve = (self.limit or 0) * reserve_share
+        return self.remaining - cost >= reserve if reserve else self.remaining >= min(cost, 1)
+
+    def spend(self, cost):
+        if self.remaining is not None:
+            self.remaining = max(self.remaining - cost, 0)
+
+
+class GroqScheduler:
+    """
+    Priority queue in front of Groq with a concurrency cap and rate-limit tracking
+
+    acquire() blocks until the call may go out (or raises CallDropped);
+    release() returns the slot and feeds back the response headers
+    """
+
+    def __init__(self, max_concurrency=16, reserves=None, max_wait=None, droppable=None):
+        self.max_concurrency = max_concurrency
+        self.reserves = {**DEFAULT_RESERVES, **(reserves or {})}
+        self.max_wait = {**DEFAULT_MAX_WAIT, **(max_wait or {})}
+        self.droppable = DROPPABLE_PRIORITIES if droppable is None else set(droppable)
+
+        self._cond = threading.Condition()
+        self._queue = []  # heap of (priority, ticket number)
+        self._order = itertools.count()
+        self._in_flight = 0
+        self._requests = _Limit()
+        self._tokens = _Limit()
+        self._paused_until = 0.0
+
+        self._metrics = {priority: {'dispatched': 0, 'dropped': 0, 'forced': 0,
+                                    'wait_total': 0.0, 'wait_max': 0.0,
+                                    'waits': deque(maxlen=500), 'recent': deque()}
+                         for priority in PRIORITY_NAMES}
+        self._rate_limited = 0
+
+    # ---------- public API ----------
+
+    def acquire(self, call_type, params):
+        """Wait for a slot for this call. Returns a ticket to pass to release()"""
+        priority = CALL_PRIORITIES.get(call_type, PRIORITY_REPLY)
+        cost = estimate_call_tokens(params)
+        entry = (priority, next(self._order))
+        queued_at = time.monotonic()
+        deadline = queued_at + self.max_wait.get(priority, 0.0)
+        forced = False
+
+        with self._cond:
+            heapq.heappush(self._queue, entry)
+            try:
+                while not (self._queue[0] == entry and self._admissible(priority, cost)):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        if priority in self.droppable:
+                            self._metrics[priority]['dropped'] += 1
+                            raise CallDropped(f"Groq budget too tight for a {PRIORITY_NAMES[priority]} call")
+                        if self._in_flight < self.max_concurrency:
+                            forced = True  # waited long enough - let Groq decide
+                            break
+                    # Poll a few times a second: a 429 pause or reset window can end with nothing in flight
+                    self._cond.wait(min(max(remaining, 0.01), 0.25))
+            finally:
+                self._queue.remove(entry)
+                heapq.heapify(self._queue)
+                self._cond.notify_all()
+
+            self._in_flight += 1
+            self._requests.spend(1)
+            self._tokens.spend(cost)
+            self._record_dispatch(priority, time.monotonic() - queued_at, forced)
+        return priority
+
+    def release(self, ticket, headers=None, retry_after=None):
+        """Return a slot, updating the budget from the response headers"""
+        with self._cond:
+            self._in_flight -= 1
+            if headers is not None:
+                self._update_limits(headers)
+            if retry_after:
+                self._rate_limited += 1
+                self._paused_until = max(self._paused_until, time.monotonic() + retry_after)
+            self._cond.notify_all()
+
+    def stats(self):
+        """Rate-limit budget, queue and per-priority throughput/wait metrics"""
+        now = time.monotonic()
+        with self._cond:
+            self._requests.refresh(now)
+            self._tokens.refresh(now)
+            priorities = {}
+            for priority, m in self._metrics.items():
+                _trim_recent(m['recent'], now)
+                waits = sorted(m['waits'])
+                priorities[PRIORITY_NAMES[priority]] = {
+                    'dispatched': m['dispatched'],
+                    'dropped': m['dropped'],
+                    'forced': m['forced'],
+                    'throughput_per_minute': len(m['recent']),
+                    'wait_avg_ms': round(m['wait_total'] / m['dispatched'] * 1000, 2) if m['dispatched'] else 0.0,
+                    'wait_p95_ms': round(waits[int(len(waits) * 0.95) - 1] * 1000, 2) if waits else 0.0,
+                    'wait_max_ms': round(m['wait_max'] * 1000, 2),
+                }
+            return {
+                'in_flight': self._in_flight,
+                'queued': len(self._queue),
+                'max_concurrency': self.max_concurrency,
+                'remaining_requests': self._requests.remaining,
+                'remaining_tokens': self._tokens.remaining,
+                'paused_for_seconds': round(max(self._paused_until - now, 0), 3),
+                'rate_limited': self._rate_limited,
+                'priorities': priorities,
+            }
+
+    # ---------- internals (call with self._cond held) ----------
+
+    def _admissible(self, priority, cost):
+        now = time.monotonic()
+        if now < self._paused_until or self._in_flight >= self.max_concurrency:
+            return False
+        self._requests.refresh(now)
+        self._tokens.refresh(now)
+        reserve = self.reserves.get(priority, 0.0)
+        return self._requests.allows(1, reserve) and self._tokens.allows(cost, reserve)
+
+    def _update_limits(self, headers):
+        now = time.monotonic()
+        self._requests.update(_int_header(headers, 'x-ratelimit-limit-requests'),
+                              _int_header(headers, 'x-ratelimit-remaining-requests'),
+                              parse_reset(headers.get('x-ratelimit-reset-requests')), now)
+        self._tokens.update(_int_header(headers, 'x-ratelimit-limit-tokens'),
+                            _int_header(headers, 'x-ratelimit-remaining-tokens'),
+                            parse_reset(headers.get('x-ratelimit-reset-tokens')), now)
+
+    def _record_dispatch(self, priority, waited, forced):
+        m = self._metrics[priority]
+        m['dispatched'] += 1
+        m['forced'] += forced
+        m['wait_total'] += waited
+        m['wait_max'] = max(m['wait_max'], waited)
+        m['waits'].append(waited)
+        now = time.monotonic()
+        m['recent'].append(now)
+        # Trimmed here too, so the window stays bounded when nobody reads stats()
+        _trim_recent(m['recent'], now)
+
+
+def _trim_recent(recent, now):
+    """Drop dispatch times older than the 60 s throughput window"""
+    while recent and now - recent[0] > 60:
+        recent.popleft()
+
+
+def _int_header(headers, name):
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
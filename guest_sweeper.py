@@ -0,0 +1,254 @@
+"""
+Guest Sweeper
+Purges expired guest conversations in the background
+
+Guest conversations carry an 'expiresAt' timestamp that moves forward with
+every message. Logout and clear-history just set it to now (plus
+'pendingDeletion'), so the request returns at once. The sweeper finds
+expired guest conversations and deletes them with their messages in batches.
+This also covers guests who close the tab and never log out. Conversations
+marked pendingDeletion are purged even if a late write (a stream finishing
+after logout, an in-flight write-behind batch) pushed expiresAt forward again
+
+Runs inside app.py (GUEST_SWEEPER_ENABLED) or standalone, e.g. from cron:
+    python guest_sweeper.py --once
+"""
+
+import argparse
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from firestore_delete import ConversationDeleter
+
+# Guest conversations expire this long after their last message
+DEFAULT_GUEST_TTL_SECONDS = 24 * 3600
+
+
+def guest_expiry(ttl_seconds=DEFAULT_GUEST_TTL_SECONDS):
+    """expiresAt value for a guest conversation that was just used"""
+    return datetime.now(timezone.utc) + timedelta(seconds=ttl_seconds)
+
+
+def mark_for_deletion(db, conversation_ids):
+    """Expire conversations now so the next sweep purges them. Returns the number marked"""
+    conversation_ids = list(conversation_ids)
+    now = datetime.now(timezone.utc)
+    for start in range(0, len(conversation_ids), 500):
+        batch = db.batch()
+        for conversation_id in conversation_ids[start:start + 500]:
+            batch.update(db.collection('conversations').document(conversation_id),
+                         {'pendingDeletion': True, 'expiresAt': now})
+        batch.commit()
+    return len(conversation_ids)
+
+
+class GuestSweeper:
+    """
+    Deletes guest conversations whose expiresAt has passed
+
+    Each sweep reads expired conversation IDs in pages of page_size and hands
+    them to a ConversationDeleter, up to max_per_sweep conversations per run
+    """
+
+    def __init__(self, db, deleter=None, interval_seconds=300, page_size=100,
+                 max_per_sweep=2000):
+        self.db = db
+        self.deleter = deleter or ConversationDeleter(db)
+        self.interval_seconds = interval_seconds
+        self.page_size = page_size
+        self.max_per_sweep = max_per_sweep
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self._sweeps = 0
+        self._errors = 0
+        self._conversations_purged = 0
+        self._messages_purged = 0
+        self._backlog = None
+        self._last_sweep = None
+
+    def expired_query(self, now=None):
+        """Conversations whose expiresAt has passed (single-field range, no composite index)"""
+        return self.db.collection('conversations')\
+            .where('expiresAt', '<=', now or datetime.now(timezone.utc))
+
+    def pending_query(self):
+        """Conversations marked for deletion, whatever their expiresAt says now"""
+        return self.db.collection('conversations').where('pendingDeletion', '==', True)
+
+    def backlog(self):
+        """
+        Number of conversations waiting to be purged (a lower bound: marked
+        conversations are usually expired too, so the two counts overlap)
+        """
+        return max(query.count().get()[0][0].value for query in (self.expired_query(), self.pending_query()))
+
+    def sweep(self, dry_run=False):
+        """Run one sweep. Returns a report of what was (or would be) purged"""
+        started = time.perf_counter()
+        report = {'conversations': 0, 'messages': 0, 'failed': [], 'skipped': 0}
+        try:
+            backlog = self.backlog()
+            now = datetime.now(timezone.utc)
+            if dry_run:
+                self._count_expired(now, report)
+            else:
+                self._purge_expired(now, report)
+        except Exception as e:
+            print(f"❌ Guest sweep failed: {e}")
+            with self._lock:
+                self._errors += 1
+            raise
+
+        report['backlog_before'] = backlog
+        report['seconds'] = round(time.perf_counter() - started, 3)
+        if not dry_run:
+            with self._lock:
+                self._sweeps += 1
+                self._conversations_purged += report['conversations']
+                self._messages_purged += report['messages']
+                self._errors += len(report['failed'])
+                self._backlog = max(backlog - report['conversations'], 0)
+                self._last_sweep = dict(report, finished_at=datetime.now(timezone.utc).isoformat())
+        if report['conversations']:
+            print(f"🧹 Guest sweep purged {report['conversations']} conversation(s), "
+                  f"{report['messages']} message(s) in {report['seconds']}s")
+        return report
+
+    def _count_expired(self, now, report):
+        seen = set()
+        for query in (self.expired_query(now), self.pending_query()):
+            for doc in query.select(['isAnonymous']).limit(self.max_per_sweep).stream():
+                if doc.id in seen:
+                    continue
+                seen.add(doc.id)
+                if doc.to_dict().get('isAnonymous') is True:
+                    report['conversations'] += 1
+                else:
+                    report['skipped'] += 1
+
+    def _purge_expired(self, now, report):
+        seen = set()  # failed deletes stay in the query results; don't retry them this sweep
+        for query in (self.expired_query(now), self.pending_query()):
+            self._purge_query(query, report, seen)
+
+    def _purge_query(self, query, report, seen):
+        while report['conversations'] + len(report['failed']) < self.max_per_sweep:
+            page = query.select(['isAnonymous']).limit(self.page_size).stream()
+            conversation_ids = []
+            for doc in page:
+                if doc.id in seen:
+                    continue
+                seen.add(doc.id)
+                # Only guest data expires; never touch a signed-in user's conversation
+                if doc.to_dict().get('isAnonymous') is True:
+                    conversation_ids.append(doc.id)
+                else:
+                    report['skipped'] += 1
+            if not conversation_ids:
+                break
+            result = self.deleter.delete_conversations(conversation_ids)
+            report['conversations'] += result['conversations']
+            report['messages'] += result['messages']
+            report['failed'] += result['failed']
+
+    # ---------- background thread ----------
+
+    def start(self):
+        """Sweep every interval_seconds on a daemon thread"""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='guest-sweeper', daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Sweep soon, e.g. right after a guest logs out"""
+        self._wake.set()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception:
+                pass  # already logged and counted; try again next interval
+            self._wake.wait(self.interval_seconds)
+            self._wake.clear()
+
+    def stats(self):
+        """Backlog and purge-rate metrics"""
+        with self._lock:
+            last = self._last_sweep or {}
+            seconds = last.get('seconds') or 0
+            return {
+                'sweeps': self._sweeps,
+                'errors': self._errors,
+                'backlog': self._backlog,
+                'conversations_purged': self._conversations_purged,
+                'messages_purged': self._messages_purged,
+                'last_sweep': last,
+                'last_purge_rate_per_second': round(last.get('conversations', 0) / seconds, 2) if seconds else 0.0,
+                'interval_seconds': self.interval_seconds,
+            }
+
+
+def backfill_expiry(db, ttl_seconds=DEFAULT_GUEST_TTL_SECONDS):
+    """Stamp expiresAt on guest conversations created before expiry existed"""
+    expires_at = guest_expiry(ttl_seconds)
+    missing = [doc.id for doc in db.collection('conversations')
+               .where('isAnonymous', '==', True).select(['expiresAt']).stream()
+               if 'expiresAt' not in doc.to_dict()]
+    for start in range(0, len(missing), 500):
+        batch = db.batch()
+        for conversation_id in missing[start:start + 500]:
+            batch.update(db.collection('conversations').document(conversation_id),
+                         {'expiresAt': expires_at})
+        batch.commit()
+    return len(missing)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Purge expired guest conversations from Firestore")
+    parser.add_argument('--once', action='store_true', help="run one sweep and exit")
+    parser.add_argument('--interval', type=int, default=300, help="seconds between sweeps when looping")
+    parser.add_argument('--dry-run', action='store_true', help="count what would be purged, delete nothing")
+    parser.add_argument('--backfill', action='store_true',
+                        help="stamp expiresAt on older guest conversations that have none")
+    args = parser.parse_args()
+
+    import firebase_admin
+    from dotenv import load_dotenv
+    from firebase_admin import credentials, firestore
+
+    load_dotenv()
+    cred_path = os.getenv('FIREBASE_CREDENTIALS_PATH', 'firebase-credentials.json')
+    if not os.path.exists(cred_path):
+        print(f"❌ {cred_path} not found!")
+        raise SystemExit(1)
+    firebase_admin.initialize_app(credentials.Certificate(cred_path))
+    db = firestore.client()
+
+    if args.backfill:
+        ttl_seconds = int(os.getenv('GUEST_DATA_TTL_SECONDS', DEFAULT_GUEST_TTL_SECONDS))
+        print(f"🕒 Stamped expiresAt on {backfill_expiry(db, ttl_seconds)} guest conversation(s)")
+
+    sweeper = GuestSweeper(db, interval_seconds=args.interval)
+    print(f"📊 Expired guest conversations waiting: {sweeper.backlog()}")
+    while True:
+        report = sweeper.sweep(dry_run=args.dry_run)
+        print(f"✨ {'Would purge' if args.dry_run else 'Purged'} {report['conversations']} conversation(s), "
+              f"{report['messages']} message(s), {len(report['failed'])} failed")
+        if args.once or args.dry_run:
+            break
+        time.sleep(args.interval)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+History Backend
+Interface shared by the conversation history stores used by app.py
+
+- memory: ConversationStore (conversation_store.py) - per process, fastest
+- redis:  RedisHistoryStore (redis_history_store.py) - shared by all
+          gunicorn workers/nodes so consecutive /chat calls keep context
+"""
+
+from collections import namedtuple
+
+# History selected for one model call: running summary of older turns + recent messages,
+# with the token estimates cached for them (tokens[i] is the cost of messages[i])
+HistoryWindow = namedtuple('HistoryWindow', ['summary', 'messages', 'tokens', 'summary_tokens'],
+                           defaults=((), 0))
+
+# Turns claimed for folding into the running summary
+FoldBatch = namedtuple('FoldBatch', ['summary', 'messages', 'upto_seq'])
+
+
+class HistoryBackend:
+    """
+    Conversation history keyed by user/conversation ID
+
+    Messages are {"role", "content"} dicts. Implementations cache a token
+    estimate per message when it is appended and keep a running summary of
+    turns that fell out of the window (see rolling_summary.py)
+    """
+
+    name = 'base'
+
+    def window(self, key, token_budget):
+        """Return a HistoryWindow with the summary and the newest messages that fit token_budget"""
+        raise NotImplementedError
+
+    def append(self, key, *messages):
+        """Atomically append one or more messages"""
+        raise NotImplementedError
+
+    def clear(self, key):
+        """Drop a conversation's history. Returns True if it existed"""
+        raise NotImplementedError
+
+    def claim_fold(self, key):
+        """Claim turns outside the last window for summarization (FoldBatch or None)"""
+        raise NotImplementedError
+
+    def complete_fold(self, key, summary, upto_seq):
+        """Install a new running summary covering all messages before upto_seq"""
+        raise NotImplementedError
+
+    def abort_fold(self, key):
+        """Release a claimed fold that failed"""
+        raise NotImplementedError
+
+    def restore_summary(self, key, summary):
+        """Seed the running summary of a conversation that lost it (restart, eviction); keeps an existing one"""
+        raise NotImplementedError
+
+    def stats(self):
+        """Backend statistics for /stats"""
+        raise NotImplementedError
+
+
+def select_window(records, token_budget, summary_tokens, summary_seq):
+    """
+    Pick the newest records that fit token_budget after the summary,
+    skipping anything already folded into it
+    Returns (messages, tokens), oldest first
+    """
+    selected = []
+    remaining = token_budget - summary_tokens
+    for record in reversed(records):
+        if record['seq'] < summary_seq or record['tokens'] > remaining:
+            break
+        remaining -= record['tokens']
+        selected.append(record)
+    selected.reverse()
+    return ([{'role': record['role'], 'content': record['content']} for record in selected],
+            [record['tokens'] for record in selected])
+
+
+def window_start_seq(records, token_budget, summary_tokens, summary_seq, next_seq):
+    """Sequence number of the oldest record the window for token_budget still keeps"""
+    kept_tokens = summary_tokens
+    start = next_seq
+    for record in reversed(records):
+        if record['seq'] < summary_seq:
+            break
+        if token_budget is not None and kept_tokens + record['tokens'] > token_budget:
+            break
+        kept_tokens += record['tokens']
+        start = record['seq']
+    return start
+
+
+def create_history_backend(name, max_messages, max_conversations, max_total_chars,
+                           ttl_seconds, redis_url=None):
+    """Build the configured history backend ('memory' or 'redis')"""
+    if name == 'memory':
+        from conversation_store import ConversationStore
+        return ConversationStore(max_messages=max_messages,
+                                 max_conversations=max_conversations,
+                                 max_total_chars=max_total_chars,
+                                 ttl_seconds=ttl_seconds)
+    if name == 'redis':
+        from redis_history_store import RedisHistoryStore
+        return RedisHistoryStore(redis_url or 'redis://localhost:6379/0',
+                                 max_messages=max_messages,
+                                 ttl_seconds=ttl_seconds)
+    raise ValueError(f"Unknown history backend '{name}'. Use 'memory' or 'redis'")
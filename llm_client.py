@@ -0,0 +1,380 @@
+"""
+LLM Client
+Groq client layer shared by every model call in app.py
+
+- One pooled httpx.Client with keep-alive, sized explicitly
+- A timeout per call type, so a slow reply can't hold a worker forever
+- Bounded retries with full-jitter backoff that honour Retry-After
+  (the SDK's own retries are switched off)
+- Optional hedged requests for the short emotion call
+- Optional process-wide rate-limit scheduler (groq_scheduler.py)
+- A circuit breaker per call type, so calls fail fast while Groq is down
+- An observer hook that gets each finished call's model, latency and tokens
+- Optional record/replay of every call to a cassette (groq_cassette.py)
+"""
+
+import email.utils
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import httpx
+from groq import APIConnectionError, APIStatusError, Groq
+
+from circuit_breaker import CircuitBreaker
+from completion_stream import WrappedStream
+from groq_cassette import recording_client, replay_client
+from groq_scheduler import GroqScheduler
+from token_budget import estimate_message_tokens, estimate_tokens
+
+log = logging.getLogger('menti.llm')
+
+# Seconds per attempt for each call type
+DEFAULT_TIMEOUTS = {
+    'crisis': 30.0,
+    'emotion': 5.0,
+    'reply': 20.0,
+    'structured': 20.0,
+    'stream': 30.0,
+    'summary': 30.0,
+    'title': 8.0,
+}
+DEFAULT_TIMEOUT = 20.0
+
+# Status codes worth retrying (besides connection errors and timeouts)
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def is_outage(error):
+    """Errors that mean Groq itself is failing (counted by the circuit breakers)"""
+    if isinstance(error, APIConnectionError):  # includes timeouts
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def parse_timeouts(value):
+    """Parse 'call_type=seconds,call_type=seconds' into a dict"""
+    timeouts = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        call_type, _, seconds = item.partition('=')
+        timeouts[call_type.strip()] = float(seconds)
+    return timeouts
+
+
+def retry_after_seconds(error):
+    """Delay the server asked for (Retry-After / retry-after-ms), or None"""
+    response = getattr(error, 'response', None)
+    if response is None:
+        return None
+    headers = response.headers
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        parsed = email.utils.parsedate_to_datetime(value)
+        return max(parsed.timestamp() - time.time(), 0) if parsed else None
+
+
+def create_groq_client(api_key=None, base_url=None, pool_size=20, keepalive_seconds=30.0, connect_timeout=3.0):
+    """Groq SDK client on an explicitly sized keep-alive pool, SDK retries off"""
+    http_client = httpx.Client(
+        limits=httpx.Limits(max_connections=pool_size,
+                            max_keepalive_connections=pool_size,
+                            keepalive_expiry=keepalive_seconds),
+        timeout=httpx.Timeout(DEFAULT_TIMEOUT, connect=connect_timeout),
+    )
+    return Groq(api_key=api_key, base_url=base_url, http_client=http_client, max_retries=0)
+
+
+class ScheduledStream(WrappedStream):
+    """
+    A completion stream that holds its scheduler slot until it is exhausted,
+    fails, or is closed (or garbage-collected, if the caller just drops it)
+    """
+
+    def __init__(self, stream, scheduler, ticket, headers=None):
+        self._scheduler = scheduler
+        self._ticket = ticket
+        self._headers = headers
+        super().__init__(stream)
+
+    def on_end(self, completed):
+        self._scheduler.release(self._ticket, self._headers)
+
+    def __del__(self):
+        # Last resort only - callers close() the stream (see stream_supportive_response)
+        if hasattr(self, '_end_lock'):
+            self._end(completed=False)
+
+
+class ObservedStream(WrappedStream):
+    """Passes chunks through; reports the call once the stream ends or is closed (tokens are estimated)"""
+
+    def __init__(self, stream, report):
+        self._report = report  # report(completion_text)
+        self._parts = []
+        super().__init__(stream)
+
+    def on_chunk(self, chunk):
+        if chunk.choices and chunk.choices[0].delta.content:
+            self._parts.append(chunk.choices[0].delta.content)
+
+    def on_end(self, completed):
+        self._report(''.join(self._parts))
+
+
+class LLMClient:
+    """
+    Chat completions with per-call-type timeouts, retries and hedging
+
+    complete(call_type, **params) / stream(call_type, **params) take the same
+    keyword arguments as groq_client.chat.completions.create
+    """
+
+    def __init__(self, api_key=None, base_url=None, pool_size=20, keepalive_seconds=30.0,
+                 connect_timeout=3.0, timeouts=None, max_retries=2, backoff_base=0.25,
+                 backoff_max=4.0, max_retry_after=10.0, hedge_after=None, scheduler=None,
+                 breaker_threshold=5, breaker_reset_seconds=30.0, observer=None, client=None):
+        self.timeouts = {**DEFAULT_TIMEOUTS, **(timeouts or {})}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        # call_type -> seconds to wait before sending a second, identical request
+        self.hedge_after = hedge_after or {}
+        self.scheduler = scheduler
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset_seconds = breaker_reset_seconds
+        self._breakers = {}
+        # observer(call_type, model, seconds, prompt_tokens, completion_tokens)
+        self.observer = observer
+
+        if client is None:
+            client = create_groq_client(api_key, base_url, pool_size, keepalive_seconds, connect_timeout)
+        self._client = client
+
+        self._hedge_pool = ThreadPoolExecutor(max_workers=max(2, pool_size // 4),
+                                              thread_name_prefix='llm-hedge') if self.hedge_after else None
+
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    # ---------- public API ----------
+
+    def complete(self, call_type, **params):
+        """
+        Non-streaming completion (hedged if configured for this call type)
+        Raises CircuitOpenError at once while this call type's breaker is open
+        """
+        started = time.perf_counter()
+        call = self._hedged if self.hedge_after.get(call_type) else self._with_retries
+        response = self._guarded(call_type, call, params)
+        if self.observer:
+            usage = getattr(response, 'usage', None)
+            if usage:
+                self.observer(call_type, params.get('model'), time.perf_counter() - started,
+                              usage.prompt_tokens or 0, usage.completion_tokens or 0)
+            else:
+                self._observe_estimate(call_type, params, time.perf_counter() - started, '')
+        return response
+
+    def stream(self, call_type, **params):
+        """
+        Streaming completion. Retries cover opening the stream only -
+        once chunks have been handed out a failure is raised to the caller
+        Close the stream (or read it in a with block) if you stop early:
+        that returns its connection and scheduler slot
+        """
+        started = time.perf_counter()
+        stream = self._guarded(call_type, self._with_retries, dict(params, stream=True))
+        if self.observer is None:
+            return stream
+        return ObservedStream(stream, lambda completion: self._observe_estimate(
+            call_type, params, time.perf_counter() - started, completion))
+
+    def available(self, call_type):
+        """False while the breaker for this call type is open"""
+        return self._breaker(call_type).available()
+
+    def breakers(self):
+        """Breaker state per call type"""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {call_type: breaker.stats() for call_type, breaker in breakers.items()}
+
+    def timeout_for(self, call_type):
+        return self.timeouts.get(call_type, DEFAULT_TIMEOUT)
+
+    def stats(self):
+        """Per call type: calls, retries, errors, timeouts, hedges (plus the scheduler's metrics)"""
+        with self._lock:
+            stats = {call_type: dict(counters) for call_type, counters in self._stats.items()}
+        if self.scheduler:
+            stats['scheduler'] = self.scheduler.stats()
+        stats['breakers'] = self.breakers()
+        return stats
+
+    # ---------- internals ----------
+
+    def _breaker(self, call_type):
+        with self._lock:
+            breaker = self._breakers.get(call_type)
+            if breaker is None:
+                breaker = self._breakers[call_type] = CircuitBreaker(
+                    call_type, self.breaker_threshold, self.breaker_reset_seconds)
+            return breaker
+
+    def _guarded(self, call_type, call, params):
+        """Run a call (with its retries) through the call type's circuit breaker"""
+        breaker = self._breaker(call_type)
+        breaker.before_call()
+        try:
+            result = call(call_type, params)
+        except Exception as e:
+            if is_outage(e):
+                breaker.record_failure()
+            else:
+                breaker.record_ignored()
+            raise
+        breaker.record_success()
+        return result
+
+    def _observe_estimate(self, call_type, params, seconds, completion):
+        prompt_tokens = sum(estimate_message_tokens(m) for m in params.get('messages', ()))
+        self.observer(call_type, params.get('model'), seconds, prompt_tokens, estimate_tokens(completion))
+
+    def _with_retries(self, call_type, params):
+        self._count(call_type, 'calls')
+        attempt = 0
+        while True:
+            try:
+                return self._send(call_type, params)
+            except (APIConnectionError, APIStatusError) as e:
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    self._count(call_type, 'timeouts' if 'Timeout' in type(e).__name__ else 'errors')
+                    raise
+                self._count(call_type, 'retries')
+                log.warning("🔁 Groq call failed, retrying", extra={
+                    'call_type': call_type, 'error': e.__class__.__name__, 'delay_seconds': round(delay, 2)})
+                time.sleep(delay)
+                attempt += 1
+
+    def _send(self, call_type, params):
+        """One attempt, through the scheduler when there is one"""
+        if self.scheduler is None:
+            return self._client.chat.completions.create(timeout=self.timeout_for(call_type), **params)
+
+        ticket = self.scheduler.acquire(call_type, params)
+        headers = None
+        retry_after = None
+        release = True
+        try:
+            completions = self._client.chat.completions
+            if hasattr(completions, 'with_raw_response'):
+                # The raw response carries the x-ratelimit-* headers
+                raw = completions.with_raw_response.create(timeout=self.timeout_for(call_type), **params)
+                headers = raw.headers
+                result = raw.parse()
+            else:
+                result = completions.create(timeout=self.timeout_for(call_type), **params)
+            if params.get('stream'):
+                # Tokens are still flowing - the slot is returned when the stream ends or is closed
+                release = False
+                return ScheduledStream(result, self.scheduler, ticket, headers)
+            return result
+        except APIStatusError as e:
+            headers = e.response.headers
+            if e.status_code == 429:
+                retry_after = retry_after_seconds(e) or 1.0
+            raise
+        finally:
+            if release:
+                self.scheduler.release(ticket, headers, retry_after)
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before the next attempt, or None to give up"""
+        if attempt >= self.max_retries:
+            return None
+        if isinstance(error, APIStatusError) and error.status_code not in RETRYABLE_STATUS:
+            return None
+        # Full jitter spreads out retries from many workers hitting the same limit
+        backoff = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        retry_after = retry_after_seconds(error)
+        if retry_after is None:
+            return backoff
+        if retry_after > self.max_retry_after:
+            return None  # waiting that long would blow the caller's latency budget
+        return retry_after + backoff / 4
+
+    def _hedged(self, call_type, params):
+        """
+        Send the request; if it hasn't answered within the hedge delay, send a
+        second one and return whichever succeeds first
+        """
+        primary = self._hedge_pool.submit(self._with_retries, call_type, params)
+        done, _ = wait([primary], timeout=self.hedge_after[call_type])
+        if done:
+            return primary.result()
+
+        self._count(call_type, 'hedges')
+        hedge = self._hedge_pool.submit(self._with_retries, call_type, params)
+        pending = {primary, hedge}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is hedge:
+                        self._count(call_type, 'hedge_wins')
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def _count(self, call_type, counter):
+        with self._lock:
+            counters = self._stats.setdefault(call_type, {})
+            counters[counter] = counters.get(counter, 0) + 1
+
+
+def create_llm_client(api_key, observer=None, cassette=None):
+    """
+    Build the LLM client from environment settings
+    With a cassette (groq_cassette.py) Groq calls are recorded to it, or
+    answered from it in replay mode
+    """
+    hedge_ms = float(os.getenv('GROQ_HEDGE_EMOTION_AFTER_MS', '0'))
+    pool_size = int(os.getenv('GROQ_POOL_SIZE', '20'))
+    keepalive_seconds = float(os.getenv('GROQ_KEEPALIVE_SECONDS', '30'))
+    connect_timeout = float(os.getenv('GROQ_CONNECT_TIMEOUT', '3'))
+    client = None
+    if cassette and cassette.mode == 'replay':
+        client = replay_client(cassette)
+    elif cassette:
+        client = recording_client(
+            create_groq_client(api_key, None, pool_size, keepalive_seconds, connect_timeout), cassette)
+    return LLMClient(
+        api_key=api_key,
+        pool_size=pool_size,
+        keepalive_seconds=keepalive_seconds,
+        connect_timeout=connect_timeout,
+        timeouts=parse_timeouts(os.getenv('GROQ_TIMEOUTS')),
+        max_retries=int(os.getenv('GROQ_MAX_RETRIES', '2')),
+        hedge_after={'emotion': hedge_ms / 1000} if hedge_ms > 0 else None,
+        scheduler=GroqScheduler(max_concurrency=int(os.getenv('GROQ_MAX_CONCURRENCY', '16')))
+        if os.getenv('GROQ_SCHEDULER_ENABLED', 'true').lower() == 'true' else None,
+        breaker_threshold=int(os.getenv('GROQ_BREAKER_FAILURES', '5')),
+        breaker_reset_seconds=float(os.getenv('GROQ_BREAKER_RESET_SECONDS', '30')),
+        observer=observer,
+        client=client,
+    )
@@ -0,0 +1,337 @@
+"""
+Metrics
+Counters and histograms for the app, rendered in the Prometheus text
+format on /metrics
+
+Recording is cheap enough to leave on: each metric keeps its values in
+STRIPES shards, each thread sticking to one, so concurrent requests rarely
+share a lock, and a scrape adds the shards up. Gauges aren't stored at all -
+collectors read the components' own stats() when /metrics is scraped
+
+AppMetrics names the metric families the app records (HTTP requests,
+/chat pipeline stages, Groq calls and tokens, Firestore reads/writes per
+route); instrument_firestore() wraps the Firestore client so every read
+and write is counted without touching the code that uses it
+"""
+
+import itertools
+import math
+import threading
+from bisect import bisect_left
+
+STRIPES = 16
+
+# Seconds; covers everything from a local check to a slow Groq reply
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+# Each thread is given the next stripe the first time it records anything
+_thread = threading.local()
+_next_stripe = itertools.count()
+
+
+def _stripe_index():
+    try:
+        return _thread.stripe
+    except AttributeError:
+        _thread.stripe = next(_next_stripe) % STRIPES
+        return _thread.stripe
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs.extend(f'{name}="{_escape(value)}"' for name, value in extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class _Striped:
+    """Per-label-set values spread over STRIPES lock/dict pairs"""
+
+    def __init__(self, name, help_text, labelnames):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._stripes = [(threading.Lock(), {}) for _ in range(STRIPES)]
+
+    def _stripe(self):
+        return self._stripes[_stripe_index()]
+
+    def _merged(self, merge):
+        merged = {}
+        for lock, values in self._stripes:
+            with lock:
+                for labels, value in values.items():
+                    merged[labels] = merge(merged.get(labels), value)
+        return merged
+
+
+class Counter(_Striped):
+    type = 'counter'
+
+    def inc(self, *labels, amount=1):
+        lock, values = self._stripe()
+        with lock:
+            values[labels] = values.get(labels, 0) + amount
+
+    def samples(self):
+        merged = self._merged(lambda total, value: (total or 0) + value)
+        for labels, value in sorted(merged.items()):
+            yield self.name, _format_labels(self.labelnames, labels), value
+
+
+class Histogram(_Striped):
+    type = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        lock, values = self._stripe()
+        with lock:
+            state = values.get(labels)
+            if state is None:
+                # One count per bucket plus +Inf, then sum
+                state = values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        def merge(total, state):
+            return list(state) if total is None else [a + b for a, b in zip(total, state)]
+
+        for labels, state in sorted(self._merged(merge).items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state):
+                cumulative += count
+                yield (f"{self.name}_bucket",
+                       _format_labels(self.labelnames, labels, [('le', _format_value(float(bound)))]), cumulative)
+            yield f"{self.name}_sum", _format_labels(self.labelnames, labels), round(state[-1], 6)
+            yield f"{self.name}_count", _format_labels(self.labelnames, labels), cumulative
+
+
+class MetricsRegistry:
+    """Metric families plus collectors that report gauges at scrape time"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """
+        collect() yields (name, type, help, samples) families, samples being
+        (labels dict, value) pairs; called on every scrape
+        """
+        self._collectors.append(collect)
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Everything in the Prometheus text exposition format (0.0.4)"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        for collect in self._collectors:
+            try:
+                families = list(collect())
+            except Exception as e:
+                print(f"⚠️  Metrics collector failed: {e}")
+                continue
+            for name, metric_type, help_text, samples in families:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {metric_type}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(labels.keys(), labels.values())} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+def flatten_stats(stats, prefix=''):
+    """(dotted.path, number) for every numeric leaf of a nested stats dict"""
+    for key, value in stats.items():
+        path = f"{prefix}{key}"
+        if isinstance(value, dict):
+            yield from flatten_stats(value, f"{path}.")
+        elif isinstance(value, bool):
+            yield path, int(value)
+        elif isinstance(value, (int, float)):
+            yield path, value
+
+
+class AppMetrics:
+    """The app's metric families and the helpers that feed them"""
+
+    def __init__(self, registry=None):
+        self.registry = registry or MetricsRegistry()
+        r = self.registry
+        self.http_requests = r.counter('menti_http_requests_total',
+                                       'HTTP requests by route, method and status', ('route', 'method', 'status'))
+        self.http_seconds = r.histogram('menti_http_request_seconds',
+                                        'HTTP request duration, streamed responses until the stream closes',
+                                        ('route', 'method'))
+        self.stage_seconds = r.histogram('menti_chat_stage_seconds',
+                                         'Wall time of each chat pipeline stage', ('endpoint', 'stage'))
+        self.groq_seconds = r.histogram('menti_groq_call_seconds',
+                                        'Groq call duration including retries', ('call_type', 'model'))
+        self.groq_prompt_tokens = r.counter('menti_groq_prompt_tokens_total',
+                                            'Groq input tokens (streams are estimated)', ('call_type', 'model'))
+        self.groq_completion_tokens = r.counter('menti_groq_completion_tokens_total',
+                                                'Groq output tokens (streams are estimated)', ('call_type', 'model'))
+        self.firestore_reads = r.counter('menti_firestore_reads_total',
+                                         'Firestore documents read (1 for an empty query or a count)', ('route',))
+        self.firestore_writes = r.counter('menti_firestore_writes_total',
+                                          'Firestore document writes', ('route',))
+        self.firestore_errors = r.counter('menti_firestore_errors_total',
+                                          'Firestore calls that raised', ('route',))
+
+    def observe_request(self, route, method, status, seconds):
+        self.http_requests.inc(route, method, str(status))
+        self.http_seconds.observe(seconds, route, method)
+
+    def observe_stages(self, endpoint, timings):
+        """timings: {stage: seconds} of one chat turn"""
+        for stage, seconds in timings.items():
+            self.stage_seconds.observe(seconds, endpoint, stage)
+
+    def observe_llm_call(self, call_type, model, seconds, prompt_tokens, completion_tokens):
+        """Same signature as the LLMClient observer hook"""
+        self.groq_seconds.observe(seconds, call_type, model)
+        self.groq_prompt_tokens.inc(call_type, model, amount=prompt_tokens)
+        self.groq_completion_tokens.inc(call_type, model, amount=completion_tokens)
+
+    def add_stats_collector(self, collect_stats):
+        """
+        Export component stats at scrape time: collect_stats() returns
+        {component: stats dict}, as on /stats
+        """
+        def collect():
+            stats = collect_stats()
+            history = stats.get('conversation_store', {})
+            yield ('menti_history_conversations', 'gauge', 'Conversations held by the history store',
+                   [({'backend': history.get('backend', '')}, history.get('conversations', 0))])
+            yield ('menti_history_chars', 'gauge', 'Characters of history held in memory',
+                   [({'backend': history.get('backend', '')}, history.get('total_chars', 0))])
+
+            groq = stats.get('groq', {})
+            call_types = {name: counters for name, counters in groq.items()
+                          if name not in ('scheduler', 'breakers')}
+            for counter in ('calls', 'retries', 'errors', 'timeouts', 'hedges'):
+                yield (f"menti_groq_{counter}_total", 'counter', f"Groq {counter} by call type",
+                       [({'call_type': name}, counters.get(counter, 0)) for name, counters in call_types.items()])
+            yield ('menti_groq_breaker_open', 'gauge', '1 while the call type\'s circuit breaker is not closed',
+                   [({'call_type': name}, int(breaker['state'] != 'closed'))
+                    for name, breaker in groq.get('breakers', {}).items()])
+
+            yield ('menti_component_stat', 'gauge', 'Every numeric value reported on /stats',
+                   [({'component': component, 'stat': path}, value)
+                    for component, component_stats in stats.items() if isinstance(component_stats, dict)
+                    for path, value in flatten_stats(component_stats)])
+
+        self.registry.add_collector(collect)
+
+    def render(self):
+        return self.registry.render()
+
+
+# ---------- Firestore instrumentation ----------
+
+# Methods whose result is another Firestore object to keep wrapping
+_CHAINED = {'collection', 'document', 'where', 'order_by', 'limit', 'limit_to_last', 'offset', 'select',
+            'start_at', 'start_after', 'end_at', 'end_before', 'count', 'batch', 'collection_group'}
+_WRITES = {'set', 'update', 'delete', 'create'}
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, _TracedFirestore) else value
+
+
+class _TracedFirestore:
+    """Proxy for a Firestore client/reference/query/batch that counts reads and writes"""
+
+    _is_batch = False
+
+    def __init__(self, target, metrics, route):
+        self._target = target
+        self._metrics = metrics
+        self._route = route
+
+    def __getattr__(self, name):
+        attribute = getattr(self._target, name)
+        if not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            route = self._route()
+            try:
+                if name == 'commit' and self._is_batch:
+                    writes = len(self._target)
+                    result = attribute(*args, **kwargs)
+                    self._metrics.firestore_writes.inc(route, amount=writes)
+                    return result
+                result = attribute(*[_unwrap(a) for a in args], **{k: _unwrap(v) for k, v in kwargs.items()})
+            except Exception:
+                self._metrics.firestore_errors.inc(route)
+                raise
+
+            if name in _CHAINED:
+                traced = _TracedBatch if name == 'batch' else _TracedFirestore
+                return traced(result, self._metrics, self._route)
+            if name == 'stream':
+                return self._counted_stream(result, route)
+            if name == 'get':
+                self._metrics.firestore_reads.inc(route, amount=max(1, len(result)) if isinstance(result, list) else 1)
+            elif name in _WRITES and not self._is_batch:
+                self._metrics.firestore_writes.inc(route)
+            return result
+
+        return call
+
+    def _counted_stream(self, documents, route):
+        read = 0
+        try:
+            for document in documents:
+                read += 1
+                yield document
+        finally:
+            # An empty query is still billed one read
+            self._metrics.firestore_reads.inc(route, amount=max(1, read))
+
+
+class _TracedBatch(_TracedFirestore):
+    """Writes are counted when the batch is committed"""
+
+    _is_batch = True
+
+    def __len__(self):
+        return len(self._target)
+
+
+def instrument_firestore(db, metrics, route):
+    """
+    Firestore client whose reads/writes are counted in metrics, labelled
+    with route() (the current HTTP route, or 'background')
+    """
+    return _TracedFirestore(db, metrics, route)
@@ -0,0 +1,167 @@
+"""
+Model Router
+Picks the Groq model for each call and keeps per-model latency and token cost
+
+Short, light messages early in a conversation go to the small fast model;
+the 70B model is kept for messages that need it: crisis flags, heavy
+emotions, long messages and deep conversations. Emotion detection, titles
+and summaries always use the small model unless pinned with MODEL_ROUTES.
+With routing disabled every call uses the large model (pins still apply)
+
+Every completed call is recorded (via LLMClient's observer hook), so /stats
+shows latency percentiles and spend per model for tuning the thresholds
+"""
+
+import os
+import threading
+from collections import deque
+
+SMALL_MODEL = 'llama-3.1-8b-instant'
+LARGE_MODEL = 'llama-3.3-70b-versatile'
+
+# Call types whose model is picked per message; the rest use a fixed model
+ROUTED_CALL_TYPES = {'reply', 'stream', 'structured', 'crisis'}
+
+DEFAULT_LARGE_EMOTIONS = {'sad', 'anxious', 'stressed'}
+
+# USD per million (input, output) tokens
+DEFAULT_PRICES = {
+    'llama-3.3-70b-versatile': (0.59, 0.79),
+    'llama-3.1-8b-instant': (0.05, 0.08),
+}
+
+
+def parse_routes(value):
+    """Parse 'call_type=model,call_type=model' into a dict"""
+    routes = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        call_type, _, model = item.partition('=')
+        routes[call_type.strip()] = model.strip()
+    return routes
+
+
+def parse_prices(value):
+    """Parse 'model=input/output,...' (USD per million tokens) into a dict"""
+    prices = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        model, _, price = item.partition('=')
+        prompt_price, _, completion_price = price.partition('/')
+        prices[model.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+    return prices
+
+
+class ModelRouter:
+    """
+    route() returns the model for a call; record() feeds back how it went
+
+    For routed call types the large model is used when any rule fires
+    (checked in order): crisis, a heavy emotion, a message longer than
+    short_message_chars, or at least deep_conversation_turns earlier turns
+    """
+
+    def __init__(self, small_model=SMALL_MODEL, large_model=LARGE_MODEL, enabled=True,
+                 short_message_chars=80, large_emotions=None, deep_conversation_turns=6,
+                 routes=None, prices=None):
+        self.small_model = small_model
+        self.large_model = large_model
+        self.enabled = enabled
+        self.short_message_chars = short_message_chars
+        self.large_emotions = DEFAULT_LARGE_EMOTIONS if large_emotions is None else set(large_emotions)
+        self.deep_conversation_turns = deep_conversation_turns
+        # Pinned models per call type (override every rule)
+        self.routes = routes or {}
+        self.prices = {**DEFAULT_PRICES, **(prices or {})}
+
+        self._lock = threading.Lock()
+        self._decisions = {}  # call_type -> {reason: count}
+        self._models = {}     # model -> counters
+
+    def route(self, call_type, message=None, emotion=None, crisis=False, depth=0):
+        """Model for this call"""
+        model, reason = self._decide(call_type, message, emotion, crisis, depth)
+        with self._lock:
+            reasons = self._decisions.setdefault(call_type, {})
+            key = f"{reason}:{model}"
+            reasons[key] = reasons.get(key, 0) + 1
+        return model
+
+    def record(self, call_type, model, seconds, prompt_tokens, completion_tokens):
+        """Latency and token usage of one finished call"""
+        prompt_price, completion_price = self.prices.get(model, (0.0, 0.0))
+        cost = (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1_000_000
+        with self._lock:
+            m = self._models.get(model)
+            if m is None:
+                m = self._models[model] = {'calls': 0, 'prompt_tokens': 0, 'completion_tokens': 0,
+                                           'cost_usd': 0.0, 'latency_total': 0.0,
+                                           'latencies': deque(maxlen=500), 'call_types': {}}
+            m['calls'] += 1
+            m['prompt_tokens'] += prompt_tokens
+            m['completion_tokens'] += completion_tokens
+            m['cost_usd'] += cost
+            m['latency_total'] += seconds
+            m['latencies'].append(seconds)
+            m['call_types'][call_type] = m['call_types'].get(call_type, 0) + 1
+
+    def stats(self):
+        """Routing decisions plus latency/token/cost metrics per model"""
+        with self._lock:
+            models = {}
+            for model, m in self._models.items():
+                latencies = sorted(m['latencies'])
+                models[model] = {
+                    'calls': m['calls'],
+                    'call_types': dict(m['call_types']),
+                    'latency_avg_ms': round(m['latency_total'] / m['calls'] * 1000, 1),
+                    'latency_p50_ms': round(_percentile(latencies, 0.5) * 1000, 1),
+                    'latency_p95_ms': round(_percentile(latencies, 0.95) * 1000, 1),
+                    'prompt_tokens': m['prompt_tokens'],
+                    'completion_tokens': m['completion_tokens'],
+                    'cost_usd': round(m['cost_usd'], 6),
+                }
+            return {
+                'enabled': self.enabled,
+                'small_model': self.small_model,
+                'large_model': self.large_model,
+                'decisions': {call_type: dict(reasons) for call_type, reasons in self._decisions.items()},
+                'models': models,
+            }
+
+    def _decide(self, call_type, message, emotion, crisis, depth):
+        if call_type in self.routes:
+            return self.routes[call_type], 'pinned'
+        if not self.enabled:
+            return self.large_model, 'disabled'
+        if call_type not in ROUTED_CALL_TYPES:
+            return self.small_model, 'call_type'
+        if crisis:
+            return self.large_model, 'crisis'
+        if emotion in self.large_emotions:
+            return self.large_model, 'emotion'
+        if message and len(message) > self.short_message_chars:
+            return self.large_model, 'long_message'
+        if depth >= self.deep_conversation_turns:
+            return self.large_model, 'deep_conversation'
+        return self.small_model, 'light_message'
+
+
+def _percentile(values, fraction):
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def create_model_router():
+    """Build the model router from environment settings"""
+    large_emotions = os.getenv('ROUTER_LARGE_EMOTIONS')
+    return ModelRouter(
+        small_model=os.getenv('ROUTER_SMALL_MODEL', SMALL_MODEL),
+        large_model=os.getenv('ROUTER_LARGE_MODEL', LARGE_MODEL),
+        enabled=os.getenv('MODEL_ROUTING_ENABLED', 'true').lower() == 'true',
+        short_message_chars=int(os.getenv('ROUTER_SHORT_MESSAGE_CHARS', '80')),
+        large_emotions=[e.strip() for e in large_emotions.split(',') if e.strip()]
+        if large_emotions is not None else None,
+        deep_conversation_turns=int(os.getenv('ROUTER_DEEP_CONVERSATION_TURNS', '6')),
+        routes=parse_routes(os.getenv('MODEL_ROUTES')),
+        prices=parse_prices(os.getenv('MODEL_PRICES')),
+    )
@@ -0,0 +1,207 @@
+"""
+Redis History Store
+Conversation history shared by every gunicorn worker/node through any
+Redis-protocol server. A /chat turn costs one pipelined round trip on the
+request path: the read before generation. The write after it goes through
+a background writer thread (in order), and until it lands this worker's
+reads include the pending messages
+"""
+
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from history_backend import FoldBatch, HistoryBackend, HistoryWindow, select_window, window_start_seq
+from sequence import message_sequence
+from token_budget import estimate_message_tokens, estimate_tokens, MESSAGE_OVERHEAD_TOKENS
+
+try:
+    import redis
+except ImportError:  # only needed when HISTORY_BACKEND=redis
+    redis = None
+
+# How long a fold claim is held before another worker may retry it (seconds)
+FOLD_LOCK_SECONDS = 120
+
+log = logging.getLogger('menti.history')
+
+
+class RedisHistoryStore(HistoryBackend):
+    """
+    Capped Redis lists of JSON message records, one per conversation
+
+    Keys per conversation (all expire after ttl_seconds of inactivity):
+      {prefix}:{key}:msgs  - list of {"role", "content", "tokens", "seq"}, capped
+                             at 2 x max_messages; the newest max_messages form the
+                             window, older entries wait to be folded into the summary
+      {prefix}:{key}:meta  - hash: summary, summary_tokens, summary_seq, window_budget
+      {prefix}:{key}:fold  - short-lived claim so only one worker summarizes at a time
+    """
+
+    name = 'redis'
+
+    def __init__(self, url, max_messages=40, ttl_seconds=3600,
+                 key_prefix='menti:history', client=None):
+        if client is None:
+            if redis is None:
+                raise RuntimeError("HISTORY_BACKEND=redis requires the 'redis' package (pip install redis)")
+            client = redis.Redis.from_url(url, decode_responses=True,
+                                          socket_timeout=2, socket_connect_timeout=2,
+                                          health_check_interval=30)
+        self._redis = client
+        self.max_messages = max_messages
+        self.ttl_seconds = ttl_seconds
+        self.key_prefix = key_prefix
+
+        self._lock = threading.Lock()
+        # One writer thread keeps appends (and clears) in order
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='redis-history')
+        self._pending = {}  # key -> records appended here, not yet written
+        self._hits = 0
+        self._misses = 0
+        self._errors = 0
+
+    # ---------- public API ----------
+
+    def window(self, key, token_budget):
+        """One round trip: read the newest messages + summary and refresh expiry"""
+        msgs_key, meta_key, _ = self._keys(key)
+        # Taken before the read: a record written meanwhile shows up twice, never not at all
+        with self._lock:
+            pending = list(self._pending.get(key, ()))
+        try:
+            pipe = self._redis.pipeline(transaction=False)
+            pipe.lrange(msgs_key, -self.max_messages, -1)
+            pipe.hgetall(meta_key)
+            pipe.hset(meta_key, 'window_budget', token_budget)
+            pipe.expire(msgs_key, self.ttl_seconds)
+            pipe.expire(meta_key, self.ttl_seconds)
+            raw_records, meta = pipe.execute()[:2]
+        except Exception as e:
+            self._count('_errors')
+            log.warning("⚠️ Redis history read failed", extra={'history_key': key, 'error': str(e)})
+            return HistoryWindow('', [])
+
+        self._count('_hits' if raw_records or pending else '_misses')
+        records = [json.loads(raw) for raw in raw_records]
+        if pending:
+            written = {record['seq'] for record in records}
+            records += [record for record in pending if record['seq'] not in written]
+            records = sorted(records, key=lambda record: record['seq'])[-self.max_messages:]
+        summary_tokens = int(meta.get('summary_tokens', 0))
+        messages, tokens = select_window(records, token_budget, summary_tokens, int(meta.get('summary_seq', 0)))
+        return HistoryWindow(meta.get('summary', ''), messages, tokens, summary_tokens)
+
+    def append(self, key, *messages):
+        """Queue the messages for the writer thread and return at once"""
+        first_seq = message_sequence.reserve(len(messages))
+        records = [{'role': message['role'],
+                    'content': message['content'],
+                    'tokens': estimate_message_tokens(message),
+                    'seq': first_seq + i}
+                   for i, message in enumerate(messages)]
+        with self._lock:
+            self._pending.setdefault(key, []).extend(records)
+        self._writer.submit(self._write, key, records)
+
+    def _write(self, key, records):
+        """One round trip: push the messages, cap the list and refresh expiry"""
+        msgs_key, meta_key, _ = self._keys(key)
+        try:
+            pipe = self._redis.pipeline(transaction=True)
+            pipe.rpush(msgs_key, *(json.dumps(record) for record in records))
+            pipe.ltrim(msgs_key, -2 * self.max_messages, -1)
+            pipe.expire(msgs_key, self.ttl_seconds)
+            pipe.expire(meta_key, self.ttl_seconds)
+            pipe.execute()
+        except Exception as e:
+            self._count('_errors')
+            log.warning("⚠️ Redis history write failed", extra={'history_key': key, 'error': str(e)})
+        finally:
+            with self._lock:
+                pending = [record for record in self._pending.get(key, ()) if record not in records]
+                if pending:
+                    self._pending[key] = pending
+                else:
+                    self._pending.pop(key, None)
+
+    def flush(self):
+        """Wait until every queued append has been written"""
+        self._writer.submit(lambda: None).result()
+
+    def claim_fold(self, key):
+        msgs_key, meta_key, fold_key = self._keys(key)
+        if not self._redis.set(fold_key, '1', nx=True, ex=FOLD_LOCK_SECONDS):
+            return None
+
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.lrange(msgs_key, 0, -1)
+        pipe.hgetall(meta_key)
+        raw_records, meta = pipe.execute()
+
+        records = [json.loads(raw) for raw in raw_records]
+        summary_seq = int(meta.get('summary_seq', 0))
+        budget = int(meta['window_budget']) if 'window_budget' in meta else None
+        next_seq = records[-1]['seq'] + 1 if records else 0
+        window_start = window_start_seq(records[-self.max_messages:], budget,
+                                        int(meta.get('summary_tokens', 0)), summary_seq, next_seq)
+
+        to_fold = [{'role': r['role'], 'content': r['content']}
+                   for r in records if summary_seq <= r['seq'] < window_start]
+        if not to_fold:
+            self._redis.delete(fold_key)
+            return None
+        return FoldBatch(meta.get('summary', ''), to_fold, window_start)
+
+    def complete_fold(self, key, summary, upto_seq):
+        _, meta_key, fold_key = self._keys(key)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hset(meta_key, mapping={
+            'summary': summary,
+            'summary_tokens': estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS if summary else 0,
+            'summary_seq': upto_seq,
+        })
+        pipe.expire(meta_key, self.ttl_seconds)
+        pipe.delete(fold_key)
+        pipe.execute()
+
+    def abort_fold(self, key):
+        self._redis.delete(self._keys(key)[2])
+
+    def restore_summary(self, key, summary):
+        _, meta_key, _ = self._keys(key)
+        pipe = self._redis.pipeline(transaction=True)
+        pipe.hsetnx(meta_key, 'summary', summary)
+        pipe.hsetnx(meta_key, 'summary_tokens', estimate_tokens(summary) + MESSAGE_OVERHEAD_TOKENS)
+        pipe.expire(meta_key, self.ttl_seconds)
+        pipe.execute()
+
+    def clear(self, key):
+        """Runs after this worker's queued appends, so none of them brings the history back"""
+        with self._lock:
+            self._pending.pop(key, None)
+        return self._writer.submit(lambda: self._redis.delete(*self._keys(key)) > 0).result()
+
+    def stats(self):
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                'backend': self.name,
+                'max_messages': self.max_messages,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self._hits,
+                'misses': self._misses,
+                'hit_rate': round(self._hits / lookups, 4) if lookups else 0.0,
+                'errors': self._errors,
+            }
+
+    # ---------- internals ----------
+
+    def _keys(self, key):
+        base = f"{self.key_prefix}:{key}"
+        return f"{base}:msgs", f"{base}:meta", f"{base}:fold"
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
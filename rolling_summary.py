@@ -0,0 +1,81 @@
+"""
+Rolling Summary
+Folds conversation turns that fall out of the history window into a running
+summary, in the background so it never blocks a reply
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+
+class RollingSummarizer:
+    """
+    Background summarization stage for a history backend (see history_backend.py)
+
+    summarize_fn(previous_summary, messages) -> new summary text
+    persist_fn(key, summary) and load_fn(key) -> summary or None are optional;
+    they keep the summary in durable storage under the same key as the
+    history, so it can be restored after a restart or eviction
+    """
+
+    def __init__(self, store, summarize_fn, persist_fn=None, load_fn=None, max_workers=2):
+        self.store = store
+        self.summarize_fn = summarize_fn
+        self.persist_fn = persist_fn
+        self.load_fn = load_fn
+        self._executor = ThreadPoolExecutor(max_workers=max_workers,
+                                            thread_name_prefix='rolling-summary')
+
+    def schedule(self, key, persist=True):
+        """
+        Queue a fold check for a conversation and return immediately
+        The claim happens on the worker thread, so backends that need a
+        network round trip (Redis) stay off the request path. At most one
+        fold per conversation runs at a time. persist=False keeps the new
+        summary in the history store only (guests)
+        """
+        self._executor.submit(self._fold, key, persist)
+
+    def restore(self, key):
+        """Load a saved summary back into the store in the background (the store had nothing for key)"""
+        if self.load_fn:
+            self._executor.submit(self._restore, key)
+
+    def _restore(self, key):
+        try:
+            summary = self.load_fn(key)
+            if summary:
+                self.store.restore_summary(key, summary)
+        except Exception as e:
+            print(f"⚠️ Could not restore summary for {key}: {e}")
+
+    def _fold(self, key, persist):
+        try:
+            batch = self.store.claim_fold(key)
+        except Exception as e:
+            print(f"⚠️ Could not claim summary fold for {key}: {e}")
+            return
+        if batch is None:
+            return
+
+        try:
+            summary = self.summarize_fn(batch.summary, batch.messages)
+        except Exception as e:
+            print(f"⚠️ Rolling summary failed for {key}: {e}")
+            self.store.abort_fold(key)
+            return
+
+        if not summary:
+            self.store.abort_fold(key)
+            return
+
+        self.store.complete_fold(key, summary, batch.upto_seq)
+        print(f"🧾 Folded {len(batch.messages)} older messages into summary for {key}")
+
+        if self.persist_fn and persist:
+            try:
+                self.persist_fn(key, summary)
+            except Exception as e:
+                print(f"⚠️ Could not persist summary for {key}: {e}")
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
@@ -0,0 +1,44 @@
+"""
+Sequence Numbers
+Strictly increasing, wall-clock based sequence numbers for ordering messages
+without a round trip to a shared counter
+"""
+
+import threading
+import time
+from datetime import datetime
+
+
+class SequenceGenerator:
+    """
+    Microseconds since the epoch, guarded so they never repeat or go backwards
+    within a process. Wall-clock time keeps ordering consistent across workers,
+    and microseconds stay below 2^53 so JavaScript clients can compare them exactly
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last = 0
+
+    def reserve(self, count=1):
+        """Reserve count consecutive sequence numbers and return the first"""
+        with self._lock:
+            first = max(time.time_ns() // 1000, self._last + 1)
+            self._last = first + count - 1
+            return first
+
+
+# Process-wide generator shared by Firestore message writes and history records
+message_sequence = SequenceGenerator()
+
+
+def legacy_sequence(timestamp, order=0):
+    """
+    Sequence number for a message stored before 'seq' existed, on the same
+    microsecond scale: its ISO timestamp, with 'order' breaking the tie
+    between a user message and the reply stored with the same timestamp
+    """
+    try:
+        return int(datetime.fromisoformat(timestamp).timestamp() * 1_000_000) + order
+    except (TypeError, ValueError):
+        return order
@@ -0,0 +1,246 @@
+"""
+Structured Logging
+Leveled JSON (or plain text) log records for the request path, written by
+a background thread
+
+- The request thread only puts the record on a bounded queue (QueueHandler);
+  a QueueListener thread formats and writes it, so a slow stdout never
+  blocks a request. If the queue is full the record is dropped and counted
+- Every record carries the route and request id of the request it came from
+- DEBUG records can be sampled per route (LOG_SAMPLE_RATES), so the per-turn
+  detail lines can stay on for busy routes
+- Message bodies are redacted by default: fields named in REDACTED_FIELDS
+  (user messages, replies, titles, summaries) are logged as their length,
+  and e-mail addresses anywhere else in a record are masked
+
+Pass structured data as fields, never inside the message text:
+    log.info("✅ Chat stored", extra={'user_id': user_id, 'conversation_id': conversation_id})
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import re
+import sys
+import threading
+from datetime import datetime, timezone
+
+# Fields whose value is user or model text
+REDACTED_FIELDS = {'user_message', 'reply', 'title', 'summary', 'content', 'first_message'}
+
+# user_id is often an e-mail for logged-in users
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# LogRecord attributes that aren't extra fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {
+    'message', 'asctime', 'route', 'request_id', 'taskName'}
+
+
+def parse_sample_rates(value):
+    """Parse 'route=rate,route=rate' ('*' for every other route) into a dict"""
+    rates = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        route, _, rate = item.rpartition('=')
+        rates[route.strip()] = float(rate)
+    return rates
+
+
+def mask_emails(text):
+    """text with every e-mail address replaced by [email]"""
+    return _EMAIL.sub('[email]', text)
+
+
+def record_fields(record, redact=True):
+    """Extra fields of a record, with message bodies replaced by their length and e-mails masked"""
+    fields = {}
+    for name, value in record.__dict__.items():
+        if name in _RECORD_ATTRIBUTES or name.startswith('_'):
+            continue
+        if redact and value is not None:
+            if name in REDACTED_FIELDS:
+                value = f"[redacted: {len(str(value))} chars]"
+            elif isinstance(value, str):
+                value = mask_emails(value)
+        fields[name] = value
+    return fields
+
+
+def record_message(record, redact=True):
+    message = record.getMessage()
+    return mask_emails(message) if redact else message
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line"""
+
+    def __init__(self, redact=True):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'msg': record_message(record, self.redact),
+        }
+        for name in ('route', 'request_id'):
+            if getattr(record, name, None):
+                entry[name] = getattr(record, name)
+        entry.update(record_fields(record, self.redact))
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for local development: time, level, message, key=value fields"""
+
+    def __init__(self, redact=True):
+        super().__init__()
+        self.redact = redact
+
+    def format(self, record):
+        stamp = datetime.fromtimestamp(record.created).strftime('%H:%M:%S.%f')[:-3]
+        fields = record_fields(record, self.redact)
+        if getattr(record, 'route', None) not in (None, 'background'):
+            fields = {'route': record.route, **fields}
+        line = f"{stamp} {record.levelname:<7} {record_message(record, self.redact)}"
+        if fields:
+            line += '  ' + ' '.join(f"{name}={value}" for name, value in fields.items())
+        if record.exc_text:
+            line += '\n' + record.exc_text
+        return line
+
+
+class RequestContextFilter(logging.Filter):
+    """Adds route/request_id from context() (runs in the logging thread, inside the request)"""
+
+    def __init__(self, context):
+        super().__init__()
+        self.context = context
+
+    def filter(self, record):
+        for name, value in self.context().items():
+            setattr(record, name, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps DEBUG records of a route with that route's rate (others always pass)"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+        self.default_rate = rates.get('*', 1.0)
+
+    def filter(self, record):
+        if record.levelno > logging.DEBUG:
+            return True
+        rate = self.rates.get(getattr(record, 'route', None), self.default_rate)
+        return rate >= 1.0 or random.random() < rate
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops (and counts) records instead of blocking when the queue is full"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self._lock_counts = threading.Lock()
+        self.enqueued = 0
+        self.dropped = 0
+
+    def emit(self, record):
+        # Don't even prepare a record that has nowhere to go
+        if self.queue.full():
+            self._drop()
+            return
+        super().emit(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self._drop()
+            return
+        with self._lock_counts:
+            self.enqueued += 1
+
+    def _drop(self):
+        with self._lock_counts:
+            self.dropped += 1
+
+    def prepare(self, record):
+        # Merge the args now (they may change later); the formatting happens in the writer thread.
+        # No copy as in the stdlib: this is the only handler the record reaches (propagate is off)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class LogPipeline:
+    """The configured logger with its queue, background writer and counters"""
+
+    def __init__(self, logger, handler, listener, log_queue):
+        self.logger = logger
+        self._handler = handler
+        self._listener = listener
+        self._queue = log_queue
+
+    def stop(self):
+        """Flush what's queued and stop the writer thread"""
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+
+    def stats(self):
+        return {
+            'level': logging.getLevelName(self.logger.level),
+            'enqueued': self._handler.enqueued,
+            'dropped': self._handler.dropped,
+            'queued': self._queue.qsize(),
+        }
+
+
+def setup_logging(name='menti', level='INFO', fmt='json', context=None, sample_rates=None,
+                  redact=True, queue_size=10000, stream=None):
+    """Configure the named logger; returns its LogPipeline"""
+    log_queue = queue.Queue(maxsize=queue_size)
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(TextFormatter(redact) if fmt == 'text' else JsonFormatter(redact))
+
+    handler = NonBlockingQueueHandler(log_queue)
+    if context:
+        handler.addFilter(RequestContextFilter(context))
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.setLevel(level.upper() if isinstance(level, str) else level)
+    logger.propagate = False
+
+    listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=False)
+    listener.start()
+    pipeline = LogPipeline(logger, handler, listener, log_queue)
+    atexit.register(pipeline.stop)
+    return pipeline
+
+
+def create_log_pipeline(context=None):
+    """LogPipeline for the 'menti' logger from LOG_* settings"""
+    return setup_logging(
+        level=os.getenv('LOG_LEVEL', 'INFO'),
+        fmt=os.getenv('LOG_FORMAT', 'json').lower(),
+        context=context,
+        sample_rates=parse_sample_rates(os.getenv('LOG_SAMPLE_RATES')),
+        redact=os.getenv('LOG_REDACT_CONTENT', 'true').lower() == 'true',
+        queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+    )
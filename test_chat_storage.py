@@ -0,0 +1,105 @@
+"""
+Tests for chat persistence in app.py (store_chat_message and the messages
+endpoint) against the in-memory Firestore fake
+Run with: python -m pytest test_chat_storage.py
+"""
+
+import threading
+
+THREADS = 8
+TURNS_PER_THREAD = 10
+
+
+def create_conversation(client, user_id):
+    response = client.post('/conversations', json={'user_id': user_id, 'title': 'Test'})
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def all_messages(client, conversation_id, limit=7):
+    """Every message, walking the pages from newest to oldest"""
+    messages = []
+    before = None
+    while True:
+        query = f"?limit={limit}" + (f"&before={before}" if before is not None else '')
+        page = client.get(f"/conversations/{conversation_id}/messages{query}").get_json()
+        messages = page['messages'] + messages
+        if not page['has_more']:
+            return messages
+        before = page['before']
+
+
+def test_concurrent_turns_are_stored_in_order(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    conversation_id = create_conversation(client, 'ordering-user')
+
+    start = threading.Barrier(THREADS)
+
+    def chat(thread):
+        start.wait()
+        for turn in range(TURNS_PER_THREAD):
+            app.store_chat_message('ordering-user', f"user {thread}-{turn}", f"bot {thread}-{turn}",
+                                   'neutral', conversation_id)
+
+    threads = [threading.Thread(target=chat, args=(n,)) for n in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = all_messages(client, conversation_id)
+    assert len(messages) == 2 * THREADS * TURNS_PER_THREAD
+
+    seqs = [message['seq'] for message in messages]
+    assert seqs == sorted(seqs) and len(set(seqs)) == len(seqs)
+
+    # Every user message is directly followed by its own reply
+    for user_message, bot_message in zip(messages[::2], messages[1::2]):
+        assert user_message['sender'] == 'user' and bot_message['sender'] == 'bot'
+        assert bot_message['message'] == user_message['message'].replace('user', 'bot')
+        assert bot_message['seq'] == user_message['seq'] + 1
+
+    # Each thread's turns keep the order they were sent in
+    for thread in range(THREADS):
+        sent = [m['message'] for m in messages if m['message'].startswith(f"user {thread}-")]
+        assert sent == [f"user {thread}-{turn}" for turn in range(TURNS_PER_THREAD)]
+
+    conversation = app.db.collection('conversations').document(conversation_id).get().to_dict()
+    assert conversation['lastSeq'] == seqs[-1]
+    assert conversation['messageCount'] == len(messages)
+
+
+def test_unchanged_page_revalidates_with_304(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    conversation_id = create_conversation(client, 'etag-user')
+    app.store_chat_message('etag-user', 'hello', 'hi there', 'happy', conversation_id)
+
+    first = client.get(f"/conversations/{conversation_id}/messages")
+    assert first.status_code == 200
+    again = client.get(f"/conversations/{conversation_id}/messages", headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+
+    app.store_chat_message('etag-user', 'one more', 'sure', 'neutral', conversation_id)
+    changed = client.get(f"/conversations/{conversation_id}/messages", headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert len(changed.get_json()['messages']) == 4
+
+
+def test_turn_committed_out_of_order_keeps_lastseq_and_changes_the_etag(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    conversation_id = create_conversation(client, 'late-batch-user')
+    older = app.build_chat_turn('first', 'reply one', 'neutral', False, None)
+    newer = app.build_chat_turn('second', 'reply two', 'neutral', False, None)
+
+    app.write_chat_turns(conversation_id, [newer])
+    first = client.get(f"/conversations/{conversation_id}/messages")
+    app.write_chat_turns(conversation_id, [older])  # its batch commits last
+
+    conversation = app.db.collection('conversations').document(conversation_id).get().to_dict()
+    assert conversation['lastSeq'] == newer['seq'] + 1
+    changed = client.get(f"/conversations/{conversation_id}/messages", headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert [m['message'] for m in changed.get_json()['messages']] == ['first', 'reply one', 'second', 'reply two']
@@ -0,0 +1,100 @@
+"""
+Tests for circuit_breaker.py
+Run with: python -m pytest test_circuit_breaker.py
+"""
+
+import logging
+import time
+
+import pytest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+
+
+def open_breaker(reset_seconds=0.1):
+    breaker = CircuitBreaker('reply', failure_threshold=2, reset_seconds=reset_seconds)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    return breaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = open_breaker(reset_seconds=30)
+    assert breaker.state == OPEN
+    assert not breaker.available()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    assert breaker.stats()['rejected'] == 1
+    assert breaker.stats()['open_for_seconds'] > 0
+
+
+def test_success_resets_the_failure_count():
+    breaker = CircuitBreaker('reply', failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+
+def test_reports_half_open_once_cooled_down():
+    breaker = open_breaker()
+    time.sleep(0.15)
+    # No call has arrived yet, but the next one would be let through as a probe
+    assert breaker.available()
+    assert breaker.state == HALF_OPEN
+    assert breaker.stats()['state'] == HALF_OPEN
+    assert breaker.stats()['open_for_seconds'] == 0.0
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker()
+    time.sleep(0.15)
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_opens_again():
+    breaker = open_breaker()
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.stats()['times_opened'] == 2
+
+
+def test_ignored_probe_frees_the_probe_slot():
+    breaker = open_breaker()
+    time.sleep(0.15)
+    breaker.before_call()
+    breaker.record_ignored()
+    breaker.before_call()
+
+
+def test_state_changes_are_logged():
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger = logging.getLogger('menti.breaker')
+    logger.addHandler(handler)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    try:
+        breaker = open_breaker()
+        time.sleep(0.15)
+        breaker.before_call()
+        breaker.record_success()
+    finally:
+        logger.setLevel(level)
+        logger.removeHandler(handler)
+
+    assert [(r.levelname, r.getMessage(), r.call_type) for r in records] == [
+        ('WARNING', "🔴 Circuit opened", 'reply'),
+        ('INFO', "🟡 Circuit half-open, probing Groq", 'reply'),
+        ('INFO', "🟢 Circuit closed, Groq is back", 'reply'),
+    ]
@@ -0,0 +1,130 @@
+"""
+Tests for conversation_cache.py
+Run with: python -m pytest test_conversation_cache.py
+"""
+
+import random
+import threading
+
+from conversation_cache import ConversationListCache, encode_cursor
+
+
+def conversations(count, prefix='c'):
+    """Newest first, as the Firestore query returns them"""
+    return [{'id': f"{prefix}{n}", 'title': f"Title {n}", 'lastUpdated': f"2026-01-01T00:00:{59 - n:02d}"}
+            for n in range(count)]
+
+
+def ids(page):
+    return [c['id'] for c in page['conversations']]
+
+
+def test_miss_then_hit():
+    cache = ConversationListCache()
+    assert cache.get('u1', False, False, 10) is None
+    cache.put('u1', False, False, conversations(3), complete=True)
+
+    page = cache.get('u1', False, False, 10)
+    assert ids(page) == ['c0', 'c1', 'c2']
+    assert page['has_more'] is False and page['next_cursor'] is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+
+
+def test_incomplete_list_only_answers_pages_it_covers():
+    cache = ConversationListCache()
+    cache.put('u1', False, False, conversations(5), complete=False)
+
+    page = cache.get('u1', False, False, 3)
+    assert ids(page) == ['c0', 'c1', 'c2']
+    assert page['has_more'] is True and page['next_cursor'] == encode_cursor(page['conversations'][-1])
+    assert cache.get('u1', False, False, 10) is None
+
+
+def test_writes_patch_the_cached_list():
+    cache = ConversationListCache()
+    cache.put('u1', False, False, conversations(3), complete=True)
+
+    cache.add('u1', False, False, {'id': 'new', 'title': 'New', 'lastUpdated': '2026-01-02T00:00:00'})
+    assert cache.touch('c2', '2026-01-03T00:00:00') is True
+    assert cache.rename('c1', 'Renamed') is True
+    cache.remove('c0')
+
+    page = cache.get('u1', False, False, 10)
+    assert ids(page) == ['c2', 'new', 'c1']
+    assert page['conversations'][0]['lastUpdated'] == '2026-01-03T00:00:00'
+    assert page['conversations'][2]['title'] == 'Renamed'
+    assert cache.touch('unknown', '2026-01-03T00:00:00') is False
+
+
+def test_archive_moves_between_lists():
+    cache = ConversationListCache()
+    cache.put('u1', False, False, conversations(3), complete=True)
+    cache.put('u1', False, True, conversations(1, prefix='a'), complete=True)
+
+    assert cache.move('c1', True, '2026-01-05T00:00:00') is True
+    assert ids(cache.get('u1', False, False, 10)) == ['c0', 'c2']
+    assert ids(cache.get('u1', False, True, 10)) == ['c1', 'a0']
+
+    # Back again, and touched from its new list
+    assert cache.move('c1', False, '2026-01-06T00:00:00') is True
+    assert cache.touch('c1', '2026-01-07T00:00:00') is True
+    assert ids(cache.get('u1', False, False, 10)) == ['c1', 'c0', 'c2']
+    assert ids(cache.get('u1', False, True, 10)) == ['a0']
+
+
+def test_invalidate_and_expiry(monkeypatch):
+    import conversation_cache
+    now = [1000.0]
+    monkeypatch.setattr(conversation_cache.time, 'monotonic', lambda: now[0])
+
+    cache = ConversationListCache(ttl_seconds=60)
+    cache.put('u1', False, False, conversations(2), complete=True)
+    cache.put('u1', True, False, conversations(2, prefix='g'), complete=True)
+
+    cache.invalidate('u1', is_guest=True)
+    assert cache.get('u1', True, False, 10) is None
+    assert cache.get('u1', False, False, 10) is not None
+
+    now[0] += 61
+    assert cache.get('u1', False, False, 10) is None
+    assert cache.touch('c0', '2026-01-03T00:00:00') is False
+
+
+def test_least_recently_used_list_is_evicted():
+    cache = ConversationListCache(max_entries=2)
+    cache.put('u1', False, False, conversations(1, prefix='x'), complete=True)
+    cache.put('u2', False, False, conversations(1, prefix='y'), complete=True)
+    cache.get('u1', False, False, 10)
+    cache.put('u3', False, False, conversations(1, prefix='z'), complete=True)
+
+    assert cache.get('u2', False, False, 10) is None
+    assert cache.get('u1', False, False, 10) is not None
+    assert cache.stats()['conversations'] == 2  # the evicted list's index entries went with it
+
+
+def test_concurrent_writes_keep_every_conversation_exactly_once():
+    cache = ConversationListCache()
+    cache.put('u1', False, False, conversations(20), complete=True)
+    cache.put('u1', False, True, [], complete=True)
+    start = threading.Barrier(8)
+
+    def writer(seed):
+        rng = random.Random(seed)
+        start.wait()
+        for n in range(500):
+            conversation_id = f"c{rng.randrange(20)}"
+            if rng.random() < 0.2:
+                cache.move(conversation_id, rng.random() < 0.5, f"t{seed}-{n}")
+            else:
+                cache.touch(conversation_id, f"t{seed}-{n}")
+
+    threads = [threading.Thread(target=writer, args=(seed,)) for seed in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    active = ids(cache.get('u1', False, False, 100))
+    archived = ids(cache.get('u1', False, True, 100))
+    assert sorted(active + archived) == sorted(f"c{n}" for n in range(20))
+    assert cache.stats()['conversations'] == 20
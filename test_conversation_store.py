@@ -0,0 +1,133 @@
+"""
+Tests for conversation_store.py
+Run with: python -m pytest test_conversation_store.py
+"""
+
+import threading
+import time
+
+import conversation_store
+from conversation_store import ConversationStore
+
+
+def turn(n, size=10):
+    return {'role': 'user', 'content': f"{n:0{size}d}"}, {'role': 'assistant', 'content': f"{n:0{size}d}"}
+
+
+def contents(store, key):
+    return [m['content'] for m in store.get(key)]
+
+
+def test_ring_buffer_keeps_the_newest_messages():
+    store = ConversationStore(max_messages=4)
+    for n in range(5):
+        store.append('u1', *turn(n, size=1))
+
+    messages = store.get('u1')
+    assert [m['content'] for m in messages] == ['3', '3', '4', '4']
+    assert [m['seq'] for m in messages] == [6, 7, 8, 9]
+    assert all(m['tokens'] > 0 for m in messages)
+
+
+def test_pending_messages_are_bounded_when_folds_never_run():
+    store = ConversationStore(max_messages=4)
+    for n in range(20):
+        store.append('u1', *turn(n))
+
+    conversation = store._conversations['u1']
+    assert len(conversation.pending) == 4
+    # Ring buffer plus pending, nothing else is counted
+    assert store.stats()['total_chars'] == 8 * 10
+
+
+def test_lru_eviction_past_max_conversations():
+    store = ConversationStore(max_conversations=2)
+    store.append('u1', *turn(1))
+    store.append('u2', *turn(2))
+    store.get('u1')  # u2 is now the least recently used
+    store.append('u3', *turn(3))
+
+    assert 'u1' in store and 'u3' in store and 'u2' not in store
+    assert store.stats()['evictions']['lru'] == 1
+
+
+def test_memory_eviction_keeps_the_conversation_being_written():
+    store = ConversationStore(max_total_chars=50)
+    store.append('u1', *turn(1))
+    store.append('u2', *turn(2))
+    store.append('u3', *turn(3, size=30))
+
+    # u3 alone is over the limit: everything else goes, u3 stays
+    assert 'u3' in store and len(store) == 1
+    assert store.stats()['total_chars'] == 60
+    assert store.stats()['evictions']['memory'] == 2
+
+
+def test_idle_conversation_expires(monkeypatch):
+    monkeypatch.setattr(conversation_store, 'SWEEP_INTERVAL', 0)
+    store = ConversationStore(ttl_seconds=0.05)
+    store.append('u1', *turn(1))
+    store.append('u2', *turn(2))
+    time.sleep(0.1)
+
+    assert store.get('u1') == []
+    assert len(store) == 0  # the sweep took u2 as well
+    stats = store.stats()
+    assert stats['evictions']['ttl'] == 2 and stats['total_chars'] == 0
+
+
+def test_append_after_expiry_starts_afresh():
+    store = ConversationStore(ttl_seconds=0.05)
+    store.append('u1', *turn(1))
+    time.sleep(0.1)
+    store.append('u1', *turn(2))
+
+    assert contents(store, 'u1') == ['0000000002', '0000000002']
+    assert store.get('u1')[0]['seq'] == 0
+
+
+def test_concurrent_appends_keep_turns_together():
+    store = ConversationStore(max_messages=1000)
+    start = threading.Barrier(8)
+
+    def chat(thread):
+        start.wait()
+        for n in range(50):
+            store.append('u1', {'role': 'user', 'content': f"{thread}-{n}"},
+                         {'role': 'assistant', 'content': f"{thread}-{n}"})
+
+    threads = [threading.Thread(target=chat, args=(t,)) for t in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    messages = store.get('u1')
+    assert len(messages) == 800
+    assert [m['seq'] for m in messages] == list(range(800))
+    for user, bot in zip(messages[::2], messages[1::2]):
+        assert user['role'] == 'user' and bot['role'] == 'assistant'
+        assert user['content'] == bot['content']
+    assert store.stats()['total_chars'] == sum(len(m['content']) for m in messages)
+
+
+def test_stats_count_hits_and_misses():
+    store = ConversationStore()
+    store.get('missing')
+    store.append('u1', *turn(1))
+    store.get('u1')
+    store.window('u1', 1000)
+
+    stats = store.stats()
+    assert stats['hits'] == 2 and stats['misses'] == 1
+    assert stats['hit_rate'] == round(2 / 3, 4)
+    assert stats['conversations'] == 1 and stats['backend'] == 'memory'
+
+
+def test_clear_releases_the_conversation():
+    store = ConversationStore()
+    store.append('u1', *turn(1))
+
+    assert store.clear('u1') is True
+    assert store.clear('u1') is False
+    assert store.stats()['total_chars'] == 0
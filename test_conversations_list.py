@@ -0,0 +1,116 @@
+"""
+Tests for GET /conversations (sidebar pages) against the in-memory Firestore fake
+Run with: python -m pytest test_conversations_list.py
+"""
+
+
+def seed(app, user_id, timestamps, **fields):
+    """One conversation per lastUpdated value; returns their IDs"""
+    ids = []
+    for n, last_updated in enumerate(timestamps):
+        ref = app.db.collection('conversations').document()
+        ref.set({'userId': user_id, 'isAnonymous': False, 'isArchived': False,
+                 'title': f"Conversation {n}", 'lastUpdated': last_updated, **fields})
+        ids.append(ref.id)
+    return ids
+
+
+def list_page(client, user_id, limit, cursor=None):
+    query = {'user_id': user_id, 'limit': limit}
+    if cursor:
+        query['cursor'] = cursor
+    response = client.get('/conversations', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def walk(client, user_id, limit):
+    """Every page, following next_cursor"""
+    pages = [list_page(client, user_id, limit)]
+    while pages[-1]['has_more']:
+        pages.append(list_page(client, user_id, limit, pages[-1]['next_cursor']))
+    return pages
+
+
+def ids(pages):
+    return [c['id'] for page in pages for c in page['conversations']]
+
+
+def test_pages_are_newest_first_and_cover_every_conversation(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    seeded = seed(app, 'pager', [f"2026-01-0{day}T10:00:00" for day in range(1, 6)])
+
+    pages = walk(client, 'pager', limit=2)
+
+    assert [len(page['conversations']) for page in pages] == [2, 2, 1]
+    assert ids(pages) == seeded[::-1]
+    assert pages[-1]['next_cursor'] is None
+    assert set(pages[0]['conversations'][0]) == {'id', 'title', 'lastUpdated'}
+
+
+def test_conversations_with_the_same_lastupdated_are_not_skipped(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    seeded = seed(app, 'tied', ['2026-02-02T09:00:00'] + ['2026-02-01T09:00:00'] * 5 + ['2026-01-31T09:00:00'])
+
+    pages = walk(client, 'tied', limit=2)
+
+    assert sorted(ids(pages)) == sorted(seeded)
+    assert ids(pages)[0] == seeded[0] and ids(pages)[-1] == seeded[-1]
+
+
+def test_lastupdated_only_cursor_is_still_accepted(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    seeded = seed(app, 'old-cursor', ['2026-03-03T00:00:00', '2026-03-02T00:00:00', '2026-03-01T00:00:00'])
+
+    page = list_page(client, 'old-cursor', limit=5, cursor='2026-03-02T00:00:00')
+
+    assert [c['id'] for c in page['conversations']] == [seeded[2]]
+
+
+def test_conversations_awaiting_the_guest_sweeper_are_hidden(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    seed(app, 'leaving', ['2026-04-02T00:00:00'], pendingDeletion=True)
+    kept = seed(app, 'leaving', ['2026-04-01T00:00:00'])
+
+    assert ids(walk(client, 'leaving', limit=5)) == kept
+
+
+def test_first_page_is_served_from_the_cache(menti):
+    app, fake = menti
+    client = app.app.test_client()
+    seeded = seed(app, 'cached', [f"2026-05-0{day}T00:00:00" for day in range(1, 4)])
+
+    first = list_page(client, 'cached', limit=2)
+    reads = fake.stats()['reads']
+    assert list_page(client, 'cached', limit=2) == first
+    assert fake.stats()['reads'] == reads
+
+    # The cached page's cursor continues where Firestore's ordering left off
+    rest = list_page(client, 'cached', limit=2, cursor=first['next_cursor'])
+    assert fake.stats()['reads'] > reads  # later pages always query Firestore
+    assert [c['id'] for c in first['conversations'] + rest['conversations']] == seeded[::-1]
+
+
+def test_created_conversation_appears_without_a_query(menti):
+    app, fake = menti
+    client = app.app.test_client()
+    seed(app, 'creator', ['2026-06-01T00:00:00'])
+    list_page(client, 'creator', limit=5)
+
+    created = client.post('/conversations', json={'user_id': 'creator', 'title': 'Fresh'}).get_json()
+    reads = fake.stats()['reads']
+    page = list_page(client, 'creator', limit=5)
+
+    assert fake.stats()['reads'] == reads
+    assert page['conversations'][0]['id'] == created['id'] and len(page['conversations']) == 2
+
+
+def test_missing_user_gets_an_empty_page(menti):
+    app, _ = menti
+    response = app.app.test_client().get('/conversations')
+
+    assert response.get_json() == {'conversations': [], 'has_more': False, 'next_cursor': None}
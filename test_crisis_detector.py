@@ -0,0 +1,84 @@
+"""
+Tests for crisis_detector.py and the /chat crisis fast path
+Run with: python -m pytest test_crisis_detector.py
+"""
+
+import threading
+import time
+
+import pytest
+
+from crisis_detector import AhoCorasick, CrisisDetector, normalize
+
+
+@pytest.fixture(scope='module')
+def detector():
+    return CrisisDetector()
+
+
+def test_aho_corasick_finds_overlapping_patterns():
+    matcher = AhoCorasick([('a', 'b'), ('b', 'c'), ('a', 'b', 'c', 'd'), ('c',)])
+    assert matcher.search(('x', 'a', 'b', 'c', 'd')) == [('a', 'b'), ('b', 'c'), ('c',), ('a', 'b', 'c', 'd')]
+    assert matcher.search(('a', 'x', 'b')) == []
+
+
+def test_aho_corasick_follows_failure_links():
+    matcher = AhoCorasick([('a', 'a', 'b'), ('a', 'b')])
+    assert matcher.search(('a', 'a', 'a', 'b')) == [('a', 'a', 'b'), ('a', 'b')]
+
+
+def test_normalize():
+    assert normalize("I can't  go ON!!") == 'i cant go on'
+    assert normalize('k1ll myseeelf') == 'kil myself'
+    assert normalize('wanna diiie') == 'want to die'
+
+
+@pytest.mark.parametrize('message, category', [
+    ("I want to kill myself", 'suicide'),
+    ("i wanna d1e", 'suicide'),
+    ("I really can't go on like this", 'suicide'),
+    ("I'm going to OD on pills tonight", 'suicide'),
+    ("i keep cutting myself", 'self_harm'),
+])
+def test_detects_crisis_language(detector, message, category):
+    match = detector.detect(message)
+    assert match and category in match.categories
+
+
+@pytest.mark.parametrize('message', [
+    "I cant go on the school trip this weekend",
+    "I od on coffee every morning lol",
+    "I can't keep going to the gym this late",
+    "that new skill myselfie thing",
+    "what a killer day at work",
+])
+def test_everyday_sentences_do_not_match(detector, message):
+    assert detector.detect(message) is None
+
+
+def test_chat_answers_crisis_at_once_and_stores_the_personal_reply(menti, monkeypatch):
+    app, _ = menti
+    client = app.app.test_client()
+    release = threading.Event()
+
+    def slow_reply(message, emotion, user_id, crisis=False):
+        assert crisis
+        release.wait(5)
+        return 'I hear you, and I am here with you'
+
+    monkeypatch.setattr(app, 'generate_supportive_response', slow_reply)
+    response = client.post('/chat', json={'message': "I don't want to live anymore", 'user_id': 'crisis-user',
+                                          'is_guest': True})
+    body = response.get_json()
+    assert body['crisis'] is True and body['reply_pending'] is True
+    assert body['resources']
+    assert body['reply'] == app.CRISIS_FALLBACK_REPLY
+
+    release.set()
+    deadline = time.monotonic() + 5
+    while not app.conversation_store.get('crisis-user'):
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    user_turn, bot_turn = app.conversation_store.get('crisis-user')
+    assert user_turn['content'] == "I don't want to live anymore"
+    assert bot_turn['content'] == 'I hear you, and I am here with you'
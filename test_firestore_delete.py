@@ -0,0 +1,109 @@
+"""
+Tests for firestore_delete.py against the in-memory Firestore fake
+Run with: python -m pytest test_firestore_delete.py
+"""
+
+import pytest
+
+from fake_firestore import FakeFirestore, WriteBatch
+from firestore_delete import MAX_BATCH_SIZE, ConversationDeleter
+
+
+class FailingFirestore(FakeFirestore):
+    """Batch commits that touch one of failing_ids raise, like a Firestore outage would"""
+
+    def __init__(self, failing_ids):
+        super().__init__()
+        self.failing_ids = set(failing_ids)
+        self.batch_sizes = []
+
+    def batch(self):
+        client = self
+
+        class Batch(WriteBatch):
+            def commit(self):
+                client.batch_sizes.append(len(self))
+                if any(set(path) & client.failing_ids for _, path, _, _ in self._writes):
+                    raise RuntimeError("deadline exceeded")
+                return super().commit()
+        return Batch(self)
+
+
+def seed(db, conversation_id, messages):
+    conversation_ref = db.collection('conversations').document(conversation_id)
+    conversation_ref.set({'userId': 'u1', 'title': conversation_id})
+    for n in range(messages):
+        conversation_ref.collection('messages').document(f"m{n:05d}").set({'seq': n})
+    return conversation_ref
+
+
+def remaining(db, conversation_id):
+    conversation_ref = db.collection('conversations').document(conversation_id)
+    return conversation_ref.get().exists, len(conversation_ref.collection('messages').get())
+
+
+@pytest.mark.parametrize('messages, batches', [
+    (0, [1]),
+    (MAX_BATCH_SIZE - 1, [MAX_BATCH_SIZE]),  # the conversation fits in the same batch
+    (MAX_BATCH_SIZE, [MAX_BATCH_SIZE, 1]),
+    (1201, [MAX_BATCH_SIZE, MAX_BATCH_SIZE, 202]),
+])
+def test_messages_are_deleted_in_batches_of_at_most_500(messages, batches):
+    db = FailingFirestore(())
+    seed(db, 'c1', messages)
+    deleter = ConversationDeleter(db)
+
+    assert deleter.delete_conversation('c1') == messages
+    assert db.batch_sizes == batches
+    assert remaining(db, 'c1') == (False, 0)
+    assert deleter.stats() == {'conversations_deleted': 1, 'messages_deleted': messages,
+                               'batches': len(batches), 'failures': 0}
+
+
+def test_batch_size_is_capped_at_the_firestore_limit():
+    assert ConversationDeleter(FakeFirestore(), batch_size=5000).batch_size == MAX_BATCH_SIZE
+
+
+def test_report_counts_messages_across_conversations():
+    db = FakeFirestore()
+    for conversation_id, messages in (('c1', 3), ('c2', 0), ('c3', 620)):
+        seed(db, conversation_id, messages)
+    seed(db, 'kept', 2)
+    progress = []
+
+    report = ConversationDeleter(db, max_workers=2).delete_conversations(
+        ['c1', 'c2', 'c3'], progress=lambda *args: progress.append(args))
+
+    assert report['conversations'] == 3 and report['messages'] == 623
+    assert report['failed'] == []
+    assert sorted((done, total) for done, total, _, _ in progress) == [(1, 3), (2, 3), (3, 3)]
+    assert {p[2]: p[3] for p in progress} == {'c1': 3, 'c2': 0, 'c3': 620}
+    assert remaining(db, 'kept') == (True, 2)
+
+
+def test_partial_failure_is_reported_and_the_rest_are_deleted():
+    db = FailingFirestore({'bad'})
+    seed(db, 'good', 4)
+    seed(db, 'bad', 4)
+    progress = {}
+
+    def record(done, total, conversation_id, deleted):
+        progress[conversation_id] = deleted
+
+    deleter = ConversationDeleter(db)
+    report = deleter.delete_conversations(['good', 'bad'], progress=record)
+
+    assert report['conversations'] == 1 and report['messages'] == 4
+    assert report['failed'] == ['bad']
+    assert progress == {'good': 4, 'bad': None}
+    assert remaining(db, 'good') == (False, 0)
+    assert remaining(db, 'bad') == (True, 4)  # the failed batch wrote nothing
+    assert deleter.stats()['failures'] == 1 and deleter.stats()['conversations_deleted'] == 1
+
+
+def test_no_conversations_is_a_no_op():
+    db = FakeFirestore()
+    report = ConversationDeleter(db).delete_conversations([])
+
+    assert report == {'conversations': 0, 'messages': 0, 'failed': [], 'seconds': 0.0}
+    assert db.stats()['batch_commits'] == 0
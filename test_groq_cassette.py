@@ -0,0 +1,108 @@
+"""
+Tests for groq_cassette.py
+Run with: python -m pytest test_groq_cassette.py
+"""
+
+import os
+import subprocess
+import sys
+import textwrap
+from types import SimpleNamespace
+
+from groq.lib.chat_completion_chunk import ChatCompletionChunk
+from groq.types.chat import ChatCompletion
+
+from groq_cassette import Cassette, recording_client, replay_client
+
+PARAMS = {'model': 'llama-3.1-8b-instant', 'messages': [{'role': 'user', 'content': 'hello'}], 'max_tokens': 10}
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def record(path):
+    response = ChatCompletion.construct(id='chatcmpl-1', created=0, model=PARAMS['model'], object='chat.completion',
+                                        choices=[{'index': 0, 'finish_reason': 'stop',
+                                                  'message': {'role': 'assistant', 'content': 'Hi there'}}])
+    Cassette(str(path), mode='record').record_response(PARAMS, response, 0.2)
+
+
+def test_replay_returns_the_recorded_response(tmp_path):
+    path = tmp_path / 'cassette.jsonl'
+    record(path)
+    client = replay_client(Cassette(str(path), mode='replay'))
+    response = client.chat.completions.create(**PARAMS)
+    assert response.choices[0].message.content == 'Hi there'
+
+
+def test_app_replays_without_an_api_key(tmp_path):
+    path = tmp_path / 'cassette.jsonl'
+    record(path)
+    env = {key: value for key, value in os.environ.items() if key != 'GROQ_API_KEY'}
+    env.update({
+        'GROQ_CASSETTE_MODE': 'replay',
+        'GROQ_CASSETTE_PATH': str(path),
+        'GUEST_SWEEPER_ENABLED': 'false',
+        'WRITE_BEHIND_JOURNAL_DIR': str(tmp_path / 'journal'),
+        'LOG_LEVEL': 'WARNING',
+    })
+    script = textwrap.dedent(f"""
+        import sys
+        sys.path.insert(0, 'benchmarks')
+        from fake_firestore import FakeFirestore
+        from serve_app import use_fake_firestore
+        use_fake_firestore(FakeFirestore())
+        import app
+        assert app.llm_available('reply')
+        response = app.groq_client.complete('reply', **{PARAMS!r})
+        print('REPLY:' + response.choices[0].message.content)
+    """)
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert 'REPLY:Hi there' in result.stdout
+
+
+class FakeStream:
+    """SDK Stream stand-in: chunks plus close()"""
+
+    def __init__(self, texts):
+        self.texts = texts
+        self.closed = False
+
+    def __iter__(self):
+        for text in self.texts:
+            if self.closed:
+                return
+            yield ChatCompletionChunk.construct(
+                id='chatcmpl-1', created=0, model=PARAMS['model'], object='chat.completion.chunk',
+                choices=[SimpleNamespace(delta=SimpleNamespace(content=text), finish_reason=None)])
+
+    def close(self):
+        self.closed = True
+
+
+def recording_stream(cassette, stream):
+    completions = SimpleNamespace(create=lambda **params: stream, with_raw_response=None)
+    client = recording_client(SimpleNamespace(chat=SimpleNamespace(completions=completions)), cassette)
+    return client.chat.completions.create(stream=True, **PARAMS)
+
+
+def test_stream_read_to_the_end_is_recorded(tmp_path):
+    cassette = Cassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    stream = FakeStream(['Hi', ' there'])
+    assert [chunk.choices[0].delta.content for chunk in recording_stream(cassette, stream)] == ['Hi', ' there']
+    assert cassette.stats()['recorded'] == 1
+
+    replayed = replay_client(Cassette(str(tmp_path / 'cassette.jsonl'), mode='replay'))
+    chunks = replayed.chat.completions.create(stream=True, **PARAMS)
+    assert [chunk.choices[0].delta.content for chunk in chunks] == ['Hi', ' there']
+
+
+def test_stream_closed_early_closes_the_sdk_stream_and_is_not_recorded(tmp_path):
+    cassette = Cassette(str(tmp_path / 'cassette.jsonl'), mode='record')
+    stream = FakeStream(['Hi', ' there'])
+    recording = recording_stream(cassette, stream)
+    next(recording)
+    recording.close()
+
+    assert stream.closed
+    assert cassette.stats()['recorded'] == 0 and cassette.stats()['incomplete'] == 1
@@ -0,0 +1,196 @@
+"""
+Tests for groq_scheduler.py and the scheduler slot handling in llm_client.py
+Run with: python -m pytest test_groq_scheduler.py
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from groq_scheduler import PRIORITY_REPLY, CallDropped, GroqScheduler, parse_reset
+from llm_client import LLMClient
+
+PARAMS = {'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 10}
+
+
+class FakeCompletions:
+    """chat.completions stand-in: a stream of chunks, or a plain response"""
+
+    def __init__(self, chunks=3):
+        self.chunks = chunks
+        self.closed = 0
+
+    def create(self, timeout=None, stream=False, **params):
+        if not stream:
+            return SimpleNamespace(usage=None, choices=[])
+        return self._stream()
+
+    def _stream(self):
+        try:
+            for i in range(self.chunks):
+                yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=f"part{i} "))])
+        finally:
+            self.closed += 1
+
+
+def make_client(scheduler, completions):
+    client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return LLMClient(client=client, scheduler=scheduler, max_retries=0)
+
+
+def test_parse_reset():
+    assert parse_reset('7.66s') == pytest.approx(7.66)
+    assert parse_reset('2m59.56s') == pytest.approx(179.56)
+    assert parse_reset('150ms') == pytest.approx(0.15)
+    assert parse_reset('12') == 12.0
+    assert parse_reset(None) is None
+
+
+def test_stream_holds_its_slot_until_exhausted():
+    scheduler = GroqScheduler(max_concurrency=1)
+    llm = make_client(scheduler, FakeCompletions())
+
+    stream = llm.stream('stream', **PARAMS)
+    assert scheduler.stats()['in_flight'] == 1
+    next(stream)
+    assert scheduler.stats()['in_flight'] == 1
+
+    list(stream)
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_closed_stream_returns_its_slot():
+    scheduler = GroqScheduler(max_concurrency=1)
+    completions = FakeCompletions(chunks=100)
+    llm = make_client(scheduler, completions)
+
+    stream = llm.stream('stream', **PARAMS)
+    next(stream)
+    stream.close()
+    stream.close()
+    assert scheduler.stats()['in_flight'] == 0
+    assert completions.closed == 1
+
+
+def test_dropped_stream_returns_its_slot():
+    scheduler = GroqScheduler(max_concurrency=1)
+    llm = make_client(scheduler, FakeCompletions())
+
+    stream = llm.stream('stream', **PARAMS)
+    next(stream)
+    del stream
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_max_concurrency_limits_open_streams():
+    scheduler = GroqScheduler(max_concurrency=1, max_wait={PRIORITY_REPLY: 5.0})
+    llm = make_client(scheduler, FakeCompletions())
+    first = llm.stream('stream', **PARAMS)
+    opened = threading.Event()
+
+    def second():
+        list(llm.stream('stream', **PARAMS))
+        opened.set()
+
+    thread = threading.Thread(target=second)
+    thread.start()
+    assert not opened.wait(0.3)  # waits while the first stream is still being read
+
+    list(first)
+    assert opened.wait(5)
+    thread.join()
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_complete_releases_at_once():
+    scheduler = GroqScheduler(max_concurrency=1)
+    llm = make_client(scheduler, FakeCompletions())
+
+    llm.complete('reply', **PARAMS)
+    assert scheduler.stats()['in_flight'] == 0
+
+
+def test_low_priority_call_dropped_when_budget_tight():
+    scheduler = GroqScheduler()
+    ticket = scheduler.acquire('reply', PARAMS)
+    scheduler.release(ticket, {'x-ratelimit-limit-requests': '100',
+                               'x-ratelimit-remaining-requests': '10',
+                               'x-ratelimit-reset-requests': '30s'})
+
+    with pytest.raises(CallDropped):
+        scheduler.acquire('title', PARAMS)
+    scheduler.release(scheduler.acquire('reply', PARAMS))
+    assert scheduler.stats()['priorities']['title']['dropped'] == 1
+
+
+def test_higher_priority_goes_first():
+    scheduler = GroqScheduler(max_concurrency=1)
+    ticket = scheduler.acquire('reply', PARAMS)
+    order = []
+
+    def call(call_type):
+        scheduler.release(scheduler.acquire(call_type, PARAMS))
+        order.append(call_type)
+
+    threads = [threading.Thread(target=call, args=('emotion',))]
+    threads[0].start()
+    time.sleep(0.05)
+    threads.append(threading.Thread(target=call, args=('crisis',)))
+    threads[1].start()
+    time.sleep(0.05)
+
+    scheduler.release(ticket)
+    for thread in threads:
+        thread.join()
+    assert order == ['crisis', 'emotion']
+
+
+def test_rate_limit_pause():
+    scheduler = GroqScheduler()
+    scheduler.release(scheduler.acquire('reply', PARAMS), retry_after=0.2)
+    assert scheduler.stats()['rate_limited'] == 1
+
+    started = time.monotonic()
+    scheduler.release(scheduler.acquire('reply', PARAMS))
+    assert time.monotonic() - started >= 0.15
+
+
+def test_throughput_window_is_trimmed_without_stats(monkeypatch):
+    import groq_scheduler
+    now = [1000.0]
+    monkeypatch.setattr(groq_scheduler, 'time', SimpleNamespace(monotonic=lambda: now[0]))
+    scheduler = GroqScheduler()
+    for _ in range(100):
+        scheduler.release(scheduler.acquire('reply', PARAMS))
+    now[0] += 61
+    scheduler.release(scheduler.acquire('reply', PARAMS))
+
+    assert len(scheduler._metrics[PRIORITY_REPLY]['recent']) == 1
+
+
+def test_observed_stream_closed_before_reading_returns_its_slot():
+    scheduler = GroqScheduler(max_concurrency=1)
+    completions = FakeCompletions()
+    llm = make_client(scheduler, completions)
+    reports = []
+    llm.observer = lambda *call: reports.append(call)
+
+    with llm.stream('stream', **PARAMS):
+        assert scheduler.stats()['in_flight'] == 1
+    assert scheduler.stats()['in_flight'] == 0
+    assert len(reports) == 1
+
+
+def test_observed_stream_reports_the_completion_once():
+    scheduler = GroqScheduler(max_concurrency=1)
+    llm = make_client(scheduler, FakeCompletions(chunks=2))
+    reports = []
+    llm.observer = lambda *call: reports.append(call)
+
+    stream = llm.stream('stream', **PARAMS)
+    assert [chunk.choices[0].delta.content for chunk in stream] == ['part0 ', 'part1 ']
+    stream.close()
+    assert len(reports) == 1 and reports[0][4] > 0
+    assert scheduler.stats()['in_flight'] == 0
@@ -0,0 +1,44 @@
+"""
+Tests for guest_sweeper.py against the in-memory Firestore fake
+Run with: python -m pytest test_guest_sweeper.py
+"""
+
+from guest_sweeper import GuestSweeper
+
+
+def guest_conversation(app, client, user_id):
+    response = client.post('/conversations', json={'user_id': user_id, 'is_guest': True, 'title': 'Guest'})
+    conversation_id = response.get_json()['id']
+    app.store_chat_message(user_id, 'hi', 'hello', 'neutral', conversation_id, is_guest=True)
+    return conversation_id
+
+
+def test_logout_marked_conversation_is_purged_despite_a_late_write(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    conversation_id = guest_conversation(app, client, 'late-guest')
+    kept_id = guest_conversation(app, client, 'other-guest')
+
+    assert client.post('/logout', json={'user_id': 'late-guest', 'is_guest': True}).get_json()['success']
+    # A stream that finishes after logout stores its turn, pushing expiresAt a day ahead
+    app.store_chat_message('late-guest', 'still there?', 'yes', 'neutral', conversation_id, is_guest=True)
+
+    report = GuestSweeper(app.db, app.conversation_deleter).sweep()
+
+    conversations = app.db.collection('conversations')
+    assert not conversations.document(conversation_id).get().exists
+    assert conversations.document(kept_id).get().exists
+    assert report['conversations'] == 1 and report['messages'] == 4
+
+
+def test_signed_in_conversations_are_never_purged(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    conversation_id = client.post('/conversations', json={'user_id': 'member', 'title': 'Mine'}).get_json()['id']
+    # Even if something marks it by mistake
+    app.db.collection('conversations').document(conversation_id).update({'pendingDeletion': True})
+
+    report = GuestSweeper(app.db, app.conversation_deleter).sweep()
+
+    assert app.db.collection('conversations').document(conversation_id).get().exists
+    assert report['skipped'] >= 1
@@ -0,0 +1,212 @@
+"""
+Tests for llm_client.py: retries, Retry-After, timeouts, hedging and circuit breakers
+Run with: python -m pytest test_llm_client.py
+"""
+
+import threading
+import time
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from groq import APITimeoutError, BadRequestError, InternalServerError, RateLimitError
+
+import llm_client
+from circuit_breaker import CircuitOpenError
+from groq_scheduler import GroqScheduler
+from llm_client import DEFAULT_TIMEOUTS, LLMClient, retry_after_seconds
+
+PARAMS = {'model': 'llama-3.1-8b-instant', 'messages': [{'role': 'user', 'content': 'hi'}], 'max_tokens': 10}
+REQUEST = httpx.Request('POST', 'https://api.groq.com/openai/v1/chat/completions')
+
+
+def status_error(error_class, status, headers=None):
+    response = httpx.Response(status, headers=headers or {}, request=REQUEST)
+    return error_class(f"status {status}", response=response, body=None)
+
+
+def rate_limited(**headers):
+    return status_error(RateLimitError, 429, headers)
+
+
+def timed_out():
+    return APITimeoutError(request=REQUEST)
+
+
+def ok(text='hello'):
+    return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+class FakeSDK:
+    """chat.completions stand-in that plays back a script of errors and responses"""
+
+    def __init__(self, *script, delay=0.0):
+        self.script = list(script)
+        self.delay = delay
+        self.calls = []
+        self.lock = threading.Lock()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, timeout=None, **params):
+        with self.lock:
+            self.calls.append(timeout)
+            outcome = self.script.pop(0) if self.script else ok()
+        delay = outcome if isinstance(outcome, float) else self.delay
+        if delay:
+            time.sleep(delay)
+            outcome = ok('slow') if isinstance(outcome, float) else outcome
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff sleeps recorded instead of slept"""
+    recorded = []
+    monkeypatch.setattr(llm_client, 'time', SimpleNamespace(
+        sleep=recorded.append, perf_counter=time.perf_counter, time=time.time))
+    return recorded
+
+
+def make_client(sdk, **kwargs):
+    kwargs.setdefault('max_retries', 2)
+    return LLMClient(client=sdk, **kwargs)
+
+
+def test_retries_until_success(sleeps):
+    sdk = FakeSDK(timed_out(), status_error(InternalServerError, 503), ok('finally'))
+    llm = make_client(sdk)
+
+    assert llm.complete('reply', **PARAMS).choices[0].message.content == 'finally'
+    assert len(sdk.calls) == 3
+    assert len(sleeps) == 2
+    assert llm.stats()['reply'] == {'calls': 1, 'retries': 2}
+
+
+def test_gives_up_after_max_retries(sleeps):
+    sdk = FakeSDK(timed_out(), timed_out(), timed_out(), ok())
+    llm = make_client(sdk)
+
+    with pytest.raises(APITimeoutError):
+        llm.complete('reply', **PARAMS)
+    assert len(sdk.calls) == 3
+    assert llm.stats()['reply']['timeouts'] == 1
+
+
+def test_client_errors_are_not_retried(sleeps):
+    sdk = FakeSDK(status_error(BadRequestError, 400))
+    llm = make_client(sdk)
+
+    with pytest.raises(BadRequestError):
+        llm.complete('reply', **PARAMS)
+    assert len(sdk.calls) == 1 and not sleeps
+    assert llm.breakers()['reply']['consecutive_failures'] == 0  # not an outage
+
+
+def test_backoff_is_full_jitter_within_the_cap(sleeps):
+    sdk = FakeSDK(*[timed_out() for _ in range(6)])
+    llm = make_client(sdk, max_retries=5, backoff_base=1.0, backoff_max=2.0)
+
+    with pytest.raises(APITimeoutError):
+        llm.complete('reply', **PARAMS)
+    assert len(sleeps) == 5
+    assert all(0 <= delay <= bound for delay, bound in zip(sleeps, [1.0, 2.0, 2.0, 2.0, 2.0]))
+
+
+def test_retry_after_is_honoured(sleeps):
+    sdk = FakeSDK(rate_limited(**{'retry-after': '2'}), ok())
+    llm = make_client(sdk, backoff_base=0.1, backoff_max=0.1)
+
+    llm.complete('reply', **PARAMS)
+    assert len(sleeps) == 1
+    assert 2.0 <= sleeps[0] <= 2.0 + 0.1 / 4
+
+
+def test_retry_after_longer_than_the_cap_gives_up(sleeps):
+    sdk = FakeSDK(rate_limited(**{'retry-after': '30'}), ok())
+    llm = make_client(sdk, max_retry_after=10.0)
+
+    with pytest.raises(RateLimitError):
+        llm.complete('reply', **PARAMS)
+    assert len(sdk.calls) == 1 and not sleeps
+
+
+def test_retry_after_header_forms():
+    assert retry_after_seconds(rate_limited(**{'retry-after-ms': '1500'})) == 1.5
+    assert retry_after_seconds(rate_limited(**{'retry-after': '3'})) == 3.0
+    assert retry_after_seconds(rate_limited()) is None
+    assert retry_after_seconds(timed_out()) is None
+
+
+def test_timeout_per_call_type():
+    sdk = FakeSDK()
+    llm = make_client(sdk, timeouts={'title': 2.5})
+
+    llm.complete('emotion', **PARAMS)
+    llm.complete('title', **PARAMS)
+    llm.complete('unknown', **PARAMS)
+    assert sdk.calls == [DEFAULT_TIMEOUTS['emotion'], 2.5, llm_client.DEFAULT_TIMEOUT]
+
+
+def test_no_hedge_when_the_first_request_is_fast():
+    sdk = FakeSDK()
+    llm = make_client(sdk, hedge_after={'emotion': 0.5})
+
+    llm.complete('emotion', **PARAMS)
+    assert len(sdk.calls) == 1
+    assert 'hedges' not in llm.stats()['emotion']
+
+
+def test_hedge_wins_over_a_slow_first_request():
+    sdk = FakeSDK(1.0, ok('hedge'))
+    llm = make_client(sdk, hedge_after={'emotion': 0.05})
+
+    started = time.perf_counter()
+    assert llm.complete('emotion', **PARAMS).choices[0].message.content == 'hedge'
+    assert time.perf_counter() - started < 0.9
+    stats = llm.stats()['emotion']
+    assert stats['hedges'] == 1 and stats['hedge_wins'] == 1
+
+
+def test_failed_hedge_does_not_hide_the_first_answer():
+    sdk = FakeSDK(0.3, timed_out())
+    llm = make_client(sdk, hedge_after={'emotion': 0.05}, max_retries=0)
+
+    assert llm.complete('emotion', **PARAMS).choices[0].message.content == 'slow'
+    assert len(sdk.calls) == 2
+    assert 'hedge_wins' not in llm.stats()['emotion']
+
+
+def test_hedge_raises_when_both_requests_fail():
+    sdk = FakeSDK(timed_out(), timed_out(), delay=0.1)
+    llm = make_client(sdk, hedge_after={'emotion': 0.05}, max_retries=0)
+
+    with pytest.raises(APITimeoutError):
+        llm.complete('emotion', **PARAMS)
+    assert len(sdk.calls) == 2
+
+
+def test_breaker_opens_after_outages_and_fails_fast(sleeps):
+    sdk = FakeSDK(*[status_error(InternalServerError, 500) for _ in range(2)])
+    llm = make_client(sdk, max_retries=0, breaker_threshold=2)
+
+    for _ in range(2):
+        with pytest.raises(InternalServerError):
+            llm.complete('reply', **PARAMS)
+    with pytest.raises(CircuitOpenError):
+        llm.complete('reply', **PARAMS)
+    assert len(sdk.calls) == 2
+    assert not llm.available('reply') and llm.available('emotion')
+
+
+def test_rate_limit_feeds_the_scheduler(sleeps):
+    scheduler = GroqScheduler()
+    sdk = FakeSDK(rate_limited(**{'retry-after': '4'}))
+    llm = make_client(sdk, max_retries=0, scheduler=scheduler)
+
+    with pytest.raises(RateLimitError):
+        llm.complete('reply', **PARAMS)
+    stats = scheduler.stats()
+    assert stats['in_flight'] == 0
+    assert stats['rate_limited'] == 1 and stats['paused_for_seconds'] > 3
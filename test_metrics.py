@@ -0,0 +1,99 @@
+"""
+Tests for metrics.py and the /metrics endpoint
+Run with: python -m pytest test_metrics.py
+"""
+
+import re
+import threading
+
+from metrics import STRIPES, MetricsRegistry
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?P<labels>\{.*\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(text):
+    """{(name, frozenset of label pairs): value} for every sample line"""
+    samples = {}
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        labels = frozenset(LABEL.findall(match['labels'] or ''))
+        samples[(match['name'], labels)] = float(match['value'])
+    return samples
+
+
+def value(samples, name, **labels):
+    return samples.get((name, frozenset(labels.items())))
+
+
+def test_striped_counter_adds_up_across_threads():
+    registry = MetricsRegistry()
+    counter = registry.counter('test_total', 'Test', ('route',))
+    start = threading.Barrier(STRIPES * 2)
+
+    def record():
+        start.wait()
+        for _ in range(1000):
+            counter.inc('/chat')
+        counter.inc('/stats', amount=2)
+
+    threads = [threading.Thread(target=record) for _ in range(STRIPES * 2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = parse(registry.render())
+    assert value(samples, 'test_total', route='/chat') == STRIPES * 2 * 1000
+    assert value(samples, 'test_total', route='/stats') == STRIPES * 2 * 2
+
+
+def test_histogram_buckets_are_cumulative_and_inclusive():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('test_seconds', 'Test', ('stage',), buckets=(0.1, 1.0))
+    for seconds in (0.05, 0.1, 0.5, 1.0, 3.0):
+        histogram.observe(seconds, 'reply')
+
+    samples = parse(registry.render())
+    assert value(samples, 'test_seconds_bucket', stage='reply', le='0.1') == 2  # le is inclusive
+    assert value(samples, 'test_seconds_bucket', stage='reply', le='1') == 4
+    assert value(samples, 'test_seconds_bucket', stage='reply', le='+Inf') == 5
+    assert value(samples, 'test_seconds_count', stage='reply') == 5
+    assert value(samples, 'test_seconds_sum', stage='reply') == 4.65
+
+
+def test_render_escapes_labels_and_reports_collectors():
+    registry = MetricsRegistry()
+    registry.counter('test_total', 'Test', ('path',)).inc('a "quoted"\\path')
+    registry.add_collector(lambda: [('test_gauge', 'gauge', 'Gauge', [({'component': 'x'}, 1.5)])])
+    registry.add_collector(lambda: 1 / 0)  # a failing collector doesn't break the scrape
+
+    text = registry.render()
+    assert '# TYPE test_total counter' in text and '# TYPE test_gauge gauge' in text
+    samples = parse(text)
+    assert value(samples, 'test_total', path='a \\"quoted\\"\\\\path') == 1
+    assert value(samples, 'test_gauge', component='x') == 1.5
+
+
+def test_metrics_endpoint(menti):
+    app, _ = menti
+    client = app.app.test_client()
+    # Requests are counted when their response is closed
+    with client.post('/conversations', json={'user_id': 'metrics-user', 'title': 'Metrics'}) as created:
+        assert created.status_code == 201
+    with client.get('/conversations?user_id=metrics-user') as listed:
+        assert listed.status_code == 200
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    samples = parse(response.get_data(as_text=True))
+
+    assert value(samples, 'menti_http_requests_total', route='/conversations', method='POST', status='201') >= 1
+    assert value(samples, 'menti_http_request_seconds_count', route='/conversations', method='GET') >= 1
+    assert value(samples, 'menti_firestore_writes_total', route='/conversations') >= 1
+    assert value(samples, 'menti_firestore_reads_total', route='/conversations') >= 1
+    assert value(samples, 'menti_history_conversations', backend='memory') is not None
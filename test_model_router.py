@@ -0,0 +1,32 @@
+"""
+Tests for model_router.py
+Run with: python -m pytest test_model_router.py
+"""
+
+from model_router import LARGE_MODEL, SMALL_MODEL, ModelRouter
+
+
+def test_light_message_goes_to_the_small_model():
+    router = ModelRouter()
+    assert router.route('reply', message='hi there', emotion='happy') == SMALL_MODEL
+    assert router.route('emotion') == SMALL_MODEL
+
+
+def test_rules_pick_the_large_model():
+    router = ModelRouter()
+    assert router.route('reply', message='hi', crisis=True) == LARGE_MODEL
+    assert router.route('reply', message='hi', emotion='sad') == LARGE_MODEL
+    assert router.route('reply', message='x' * 200) == LARGE_MODEL
+    assert router.route('reply', message='hi', depth=6) == LARGE_MODEL
+
+
+def test_disabled_routes_every_call_type_to_the_large_model():
+    router = ModelRouter(enabled=False)
+    for call_type in ('reply', 'stream', 'emotion', 'title', 'summary'):
+        assert router.route(call_type, message='hi') == LARGE_MODEL
+    assert set(router.stats()['decisions']['emotion']) == {f"disabled:{LARGE_MODEL}"}
+
+
+def test_pinned_route_wins():
+    router = ModelRouter(enabled=False, routes={'title': 'custom-model'})
+    assert router.route('title') == 'custom-model'
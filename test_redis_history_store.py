@@ -0,0 +1,130 @@
+"""
+Tests for redis_history_store.py against fakeredis
+Run with: python -m pytest test_redis_history_store.py
+"""
+
+import threading
+
+import pytest
+
+fakeredis = pytest.importorskip('fakeredis')
+
+from history_backend import HistoryWindow
+from redis_history_store import RedisHistoryStore
+
+
+class CountingRedis:
+    """fakeredis client that counts round trips (commands and pipeline executions)"""
+
+    def __init__(self):
+        self.client = fakeredis.FakeRedis(decode_responses=True)
+        self.round_trips = 0
+
+    def pipeline(self, transaction=True):
+        pipe = self.client.pipeline(transaction=transaction)
+        execute = pipe.execute
+
+        def counted_execute(*args, **kwargs):
+            self.round_trips += 1
+            return execute(*args, **kwargs)
+
+        pipe.execute = counted_execute
+        return pipe
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def counted(*args, **kwargs):
+            self.round_trips += 1
+            return command(*args, **kwargs)
+
+        return counted
+
+
+def turn(n):
+    return {'role': 'user', 'content': f"message {n}"}, {'role': 'assistant', 'content': f"reply {n}"}
+
+
+@pytest.fixture
+def redis_client():
+    return CountingRedis()
+
+
+@pytest.fixture
+def store(redis_client):
+    return RedisHistoryStore('redis://unused', max_messages=6, client=redis_client)
+
+
+def test_turn_is_one_round_trip_on_the_request_path(store, redis_client):
+    store.append('u1', *turn(0))
+    store.flush()
+
+    redis_client.round_trips = 0
+    store.window('u1', 1000)
+    store.append('u1', *turn(1))
+    assert redis_client.round_trips == 1
+
+    store.flush()
+    assert redis_client.round_trips == 2
+
+
+def test_window_includes_appends_not_yet_written(store):
+    store.append('u1', *turn(0))
+    store.flush()
+
+    release = threading.Event()
+    store._writer.submit(release.wait)  # hold the writer thread
+    store.append('u1', *turn(1))
+    window = store.window('u1', 1000)
+    release.set()
+
+    assert [m['content'] for m in window.messages] == ['message 0', 'reply 0', 'message 1', 'reply 1']
+    store.flush()
+    assert store.window('u1', 1000) == window
+
+
+def test_window_keeps_newest_messages_in_order(store):
+    for n in range(5):
+        store.append('u1', *turn(n))
+    store.flush()
+
+    contents = [m['content'] for m in store.window('u1', 1000).messages]
+    assert contents == ['message 2', 'reply 2', 'message 3', 'reply 3', 'message 4', 'reply 4']
+
+
+def test_clear_runs_after_queued_appends(store):
+    release = threading.Event()
+    store._writer.submit(release.wait)
+    store.append('u1', *turn(0))
+    threading.Timer(0.05, release.set).start()
+
+    assert store.clear('u1') is True
+    assert store.window('u1', 1000).messages == []
+
+
+def test_fold_and_restore_summary(store):
+    for n in range(5):
+        store.append('u1', *turn(n))
+    store.flush()
+    store.window('u1', 1000)
+
+    batch = store.claim_fold('u1')
+    assert [m['content'] for m in batch.messages] == ['message 0', 'reply 0', 'message 1', 'reply 1']
+    assert store.claim_fold('u1') is None  # one fold at a time
+    store.complete_fold('u1', 'Earlier turns', batch.upto_seq)
+
+    store.restore_summary('u1', 'Older saved summary')
+    assert store.window('u1', 1000).summary == 'Earlier turns'
+
+    store.restore_summary('u2', 'Saved summary')
+    assert store.window('u2', 1000).summary == 'Saved summary'
+
+
+def test_read_failure_returns_empty_window():
+    class BrokenRedis(CountingRedis):
+        def pipeline(self, transaction=True):
+            raise ConnectionError('redis down')
+
+    store = RedisHistoryStore('redis://unused', client=BrokenRedis())
+    assert store.window('u1', 1000) == HistoryWindow('', [])
+    assert store.stats()['errors'] == 1
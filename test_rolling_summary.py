@@ -0,0 +1,138 @@
+"""
+Tests for rolling_summary.py folding turns out of the conversation store
+Run with: python -m pytest test_rolling_summary.py
+"""
+
+import pytest
+
+from conversation_store import ConversationStore
+from rolling_summary import RollingSummarizer
+
+
+def turns(store, key, count, start=0):
+    for n in range(start, start + count):
+        store.append(key, {'role': 'user', 'content': f"{n:010d}"}, {'role': 'assistant', 'content': f"{n:010d}"})
+
+
+def contents(messages):
+    return [m['content'] for m in messages]
+
+
+@pytest.fixture
+def store():
+    """Three turns in a 4-message buffer, with the last window two messages wide"""
+    store = ConversationStore(max_messages=4)
+    turns(store, 'u1', 3)
+    cost = store.get('u1')[0]['tokens']
+    store.window('u1', cost * 2)
+    return store
+
+
+def run(summarizer, key, persist=True):
+    summarizer.schedule(key, persist=persist)
+    summarizer.shutdown(wait=True)
+
+
+def test_turns_outside_the_window_are_folded(store):
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append((previous, contents(messages)))
+        return 'Summary of turns 0-1'
+
+    run(RollingSummarizer(store, summarize), 'u1')
+
+    # Both messages pushed out of the ring buffer and those outside the window
+    assert calls == [('', ['0000000000', '0000000000', '0000000001', '0000000001'])]
+    window = store.window('u1', 1000)
+    assert window.summary == 'Summary of turns 0-1'
+    assert contents(window.messages) == ['0000000002', '0000000002']
+    assert store._conversations['u1'].pending == []
+    stats = store.stats()
+    assert stats['summary_folds'] == 1
+    assert stats['total_chars'] == len('Summary of turns 0-1') + 4 * 10
+
+
+def test_next_fold_builds_on_the_previous_summary(store):
+    store.complete_fold('u1', 'First summary', upto_seq=4)
+    turns(store, 'u1', 2, start=3)
+    # The summary is counted against the window first
+    store.window('u1', store.window('u1', 0).summary_tokens + store.get('u1')[0]['tokens'] * 2)
+    calls = []
+
+    def summarize(previous, messages):
+        calls.append((previous, contents(messages)))
+        return 'Second summary'
+
+    run(RollingSummarizer(store, summarize), 'u1')
+
+    assert calls == [('First summary', ['0000000002', '0000000002', '0000000003', '0000000003'])]
+    assert store.window('u1', 1000).summary == 'Second summary'
+
+
+def test_failed_fold_is_released_and_retried(store):
+    def broken(previous, messages):
+        raise RuntimeError('groq down')
+
+    run(RollingSummarizer(store, broken), 'u1')
+    assert store.window('u1', 1000).summary == ''
+
+    run(RollingSummarizer(store, lambda previous, messages: ''), 'u1')  # an empty summary is not installed
+    assert store.window('u1', 1000).summary == ''
+
+    run(RollingSummarizer(store, lambda previous, messages: 'Recovered'), 'u1')
+    assert store.window('u1', 1000).summary == 'Recovered'
+
+
+def test_one_fold_at_a_time(store):
+    batch = store.claim_fold('u1')
+    assert batch is not None and batch.upto_seq == 4
+    assert store.claim_fold('u1') is None
+
+    store.abort_fold('u1')
+    assert store.claim_fold('u1') is not None
+
+
+def test_nothing_to_fold_while_the_window_holds_everything():
+    store = ConversationStore(max_messages=10)
+    turns(store, 'u1', 2)
+    store.window('u1', 1000)
+
+    assert store.claim_fold('u1') is None
+
+
+def test_summary_is_persisted_for_signed_in_users_only(store):
+    saved = []
+    summarizer = RollingSummarizer(store, lambda previous, messages: 'Saved',
+                                   persist_fn=lambda *args: saved.append(args))
+    run(summarizer, 'u1', persist=False)
+    assert saved == [] and store.window('u1', 1000).summary == 'Saved'
+
+    turns(store, 'u1', 2, start=3)
+    store.window('u1', store.get('u1')[0]['tokens'] * 2)
+    summarizer = RollingSummarizer(store, lambda previous, messages: 'Saved again',
+                                   persist_fn=lambda *args: saved.append(args))
+    run(summarizer, 'u1')
+    assert saved == [('u1', 'Saved again')]
+
+
+def test_persist_failure_keeps_the_summary(store):
+    def persist(key, summary):
+        raise RuntimeError('firestore down')
+
+    run(RollingSummarizer(store, lambda previous, messages: 'Kept', persist_fn=persist), 'u1')
+
+    assert store.window('u1', 1000).summary == 'Kept'
+
+
+def test_restore_seeds_a_missing_summary_only():
+    store = ConversationStore()
+    summarizer = RollingSummarizer(store, None, load_fn=lambda key: f"Saved for {key}")
+    summarizer.restore('u1')
+    summarizer.shutdown(wait=True)
+    assert store.window('u1', 1000).summary == 'Saved for u1'
+
+    turns(store, 'u2', 1)
+    store.complete_fold('u2', 'Current', upto_seq=0)
+    store.restore_summary('u2', 'Stale')
+    assert store.window('u2', 1000).summary == 'Current'
@@ -0,0 +1,116 @@
+"""
+Tests for structured_logging.py
+Run with: python -m pytest test_structured_logging.py
+"""
+
+import io
+import itertools
+import json
+import random
+
+import pytest
+
+from structured_logging import mask_emails, parse_sample_rates, setup_logging
+
+_names = itertools.count()
+
+
+@pytest.fixture
+def capture():
+    """(pipeline, read) where read() stops the pipeline and returns the JSON lines written"""
+    pipelines = []
+
+    def make(**kwargs):
+        stream = io.StringIO()
+        pipeline = setup_logging(name=f"test{next(_names)}", stream=stream, **kwargs)
+        pipelines.append(pipeline)
+
+        def read():
+            pipeline.stop()
+            return [json.loads(line) for line in stream.getvalue().splitlines()]
+        return pipeline, read
+
+    yield make
+    for pipeline in pipelines:
+        pipeline.stop()
+
+
+def test_message_bodies_are_logged_as_their_length(capture):
+    pipeline, read = capture()
+    pipeline.logger.info("✅ Chat stored", extra={'user_message': 'I feel awful today', 'reply': 'I hear you',
+                                                'conversation_id': 'c1'})
+
+    [entry] = read()
+    assert entry['msg'] == "✅ Chat stored"
+    assert entry['user_message'] == '[redacted: 18 chars]'
+    assert entry['reply'] == '[redacted: 10 chars]'
+    assert entry['conversation_id'] == 'c1'
+    assert 'I feel awful' not in json.dumps(entry)
+
+
+def test_emails_are_masked_in_fields_and_messages(capture):
+    pipeline, read = capture()
+    pipeline.logger.warning("Login failed for jane.doe+menti@example.co.uk", extra={'user_id': 'sam@mail.com'})
+
+    [entry] = read()
+    assert entry['msg'] == "Login failed for [email]"
+    assert entry['user_id'] == '[email]'
+
+
+def test_redaction_can_be_switched_off(capture):
+    pipeline, read = capture(redact=False)
+    pipeline.logger.info("sam@mail.com", extra={'reply': 'I hear you'})
+
+    [entry] = read()
+    assert entry['msg'] == 'sam@mail.com' and entry['reply'] == 'I hear you'
+
+
+def test_mask_emails_leaves_other_text_alone():
+    assert mask_emails('user @ home, v1.2@beta') == 'user @ home, v1.2@beta'
+    assert mask_emails('a@b.io and c@d.org') == '[email] and [email]'
+
+
+def test_request_context_is_attached(capture):
+    pipeline, read = capture(context=lambda: {'route': '/chat', 'request_id': 'abc'})
+    pipeline.logger.info("hello")
+
+    [entry] = read()
+    assert entry['route'] == '/chat' and entry['request_id'] == 'abc'
+
+
+def test_debug_lines_are_sampled_per_route(capture):
+    random.seed(7)
+    route = ['/chat']
+    pipeline, read = capture(level='DEBUG', context=lambda: {'route': route[0]},
+                             sample_rates=parse_sample_rates('/chat=0.25,/stats=0,*=1'))
+    for _ in range(4000):
+        pipeline.logger.debug("turn detail")
+    pipeline.logger.info("always kept")
+    route[0] = '/stats'
+    for _ in range(100):
+        pipeline.logger.debug("never kept")
+    route[0] = '/health'
+    pipeline.logger.debug("default rate")
+
+    entries = read()
+    chat_debug = [e for e in entries if e['msg'] == 'turn detail']
+    assert 850 <= len(chat_debug) <= 1150
+    assert [e['msg'] for e in entries if e['level'] != 'DEBUG'] == ['always kept']
+    assert not [e for e in entries if e['msg'] == 'never kept']
+    assert [e['route'] for e in entries if e['msg'] == 'default rate'] == ['/health']
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates('/chat=0.1, *=0.5') == {'/chat': 0.1, '*': 0.5}
+    assert parse_sample_rates('') == {}
+
+
+def test_full_queue_drops_instead_of_blocking(capture):
+    pipeline, read = capture(queue_size=1)
+    pipeline._listener.stop()  # nothing drains the queue
+    pipeline._listener = None
+    for _ in range(5):
+        pipeline.logger.info("burst")
+
+    stats = pipeline.stats()
+    assert stats['enqueued'] == 1 and stats['dropped'] == 4
@@ -0,0 +1,105 @@
+"""
+Tests for token_budget.py and history windowing (history_backend.py)
+Run with: python -m pytest test_token_budget.py
+"""
+
+import token_budget
+from conversation_store import ConversationStore
+from token_budget import (MESSAGE_OVERHEAD_TOKENS, estimate_message_tokens, estimate_tokens, fit_history,
+                          history_budget, parse_budgets, prompt_budget, prompt_tokens)
+
+
+def message(content, role='user'):
+    return {'role': role, 'content': content}
+
+
+def test_estimate_tokens():
+    assert estimate_tokens('') == 0
+    assert estimate_tokens('hi there') == 2
+    assert estimate_tokens('unbelievably') == 2  # long words cost ~1 token per 7 characters
+    assert estimate_tokens('ok!') == 2
+    assert estimate_tokens('🙂🙂') == 2
+    assert estimate_message_tokens(message('hi')) == 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+def test_parse_budgets():
+    assert parse_budgets('a=100, b=200') == {'a': 100, 'b': 200}
+    assert parse_budgets(None) == {}
+    assert prompt_budget('no-such-model') == token_budget.DEFAULT_BUDGET
+
+
+def test_history_budget_counts_prompt_message_and_reply(monkeypatch):
+    monkeypatch.setitem(token_budget.MODEL_BUDGETS, 'test-model', 100)
+    prompt = 'You are kind.'
+
+    budget = history_budget('test-model', prompt, 'hello', max_tokens=50)
+
+    assert budget == 100 - (estimate_tokens(prompt) + estimate_tokens('hello') + 2 * MESSAGE_OVERHEAD_TOKENS + 50)
+    assert history_budget('test-model', prompt, 'hello', max_tokens=500) == 0
+
+
+def test_system_prompt_is_tokenized_once(monkeypatch):
+    prompt = 'A system prompt used only by this test.'
+    history_budget('llama-3.1-8b-instant', prompt, 'first', 100)
+    calls = []
+    monkeypatch.setattr(token_budget, 'estimate_tokens', lambda text: calls.append(text) or 1)
+
+    history_budget('llama-3.1-8b-instant', prompt, 'second', 100)
+
+    assert calls == ['second']  # only the user message
+    assert prompt_tokens.cache_info().hits >= 1
+
+
+def test_fit_history_keeps_the_newest_messages_that_fit():
+    messages = [message(f"m{n}") for n in range(5)]
+    cost = estimate_message_tokens(messages[0])
+
+    assert fit_history(messages, cost * 2) == messages[3:]
+    assert fit_history(messages, cost * 2 + cost - 1) == messages[3:]
+    assert fit_history(messages, cost * 10) == messages
+    assert fit_history(messages, cost - 1) == []
+    assert fit_history([], 100) == []
+
+
+def test_fit_history_uses_cached_token_counts(monkeypatch):
+    messages = [message('a'), message('b'), message('c')]
+    monkeypatch.setattr(token_budget, 'estimate_message_tokens', lambda m: 1 / 0)
+
+    # Without tokens the messages would be estimated (and fail here)
+    assert fit_history(messages, 10, tokens=[3, 8, 2]) == messages[1:]
+    assert fit_history(messages, 9, tokens=[3, 8, 2]) == messages[2:]
+
+
+def test_store_window_counts_the_summary_first():
+    store = ConversationStore(max_messages=10)
+    for n in range(3):
+        store.append('u1', message(f"q{n}"), message(f"a{n}", 'assistant'))
+    cost = store.get('u1')[0]['tokens']
+
+    window = store.window('u1', cost * 3)
+    assert [m['content'] for m in window.messages] == ['a1', 'q2', 'a2']
+    assert window.tokens == [cost] * 3 and window.summary_tokens == 0
+    assert all(set(m) == {'role', 'content'} for m in window.messages)  # nothing extra is sent to Groq
+
+    store.complete_fold('u1', 'Earlier: small talk', upto_seq=2)
+    window = store.window('u1', cost * 3)
+    assert window.summary == 'Earlier: small talk'
+    assert window.summary_tokens == estimate_tokens('Earlier: small talk') + MESSAGE_OVERHEAD_TOKENS
+    assert len(window.messages) == (cost * 3 - window.summary_tokens) // cost
+
+
+def test_window_stops_at_the_first_message_that_does_not_fit():
+    store = ConversationStore()
+    store.append('u1', message('hi'), message('word ' * 100, 'assistant'), message('ok'))
+    small = estimate_message_tokens(message('ok'))
+
+    # The long reply doesn't fit, so the short message before it isn't used either
+    assert [m['content'] for m in store.window('u1', small * 3).messages] == ['ok']
+
+
+def test_window_never_includes_summarized_messages():
+    store = ConversationStore()
+    store.append('u1', message('one'), message('two'), message('three'))
+    store.complete_fold('u1', 'S', upto_seq=2)
+
+    assert [m['content'] for m in store.window('u1', 10_000).messages] == ['three']
@@ -0,0 +1,250 @@
+"""
+Tests for write_behind.py
+Run with: python -m pytest test_write_behind.py
+"""
+
+import json
+import os
+import threading
+import time
+
+from write_behind import WriteBehindQueue
+
+
+class Recorder:
+    """write_fn that records batches and can be made to fail or block"""
+
+    def __init__(self):
+        self.batches = []
+        self.fail = 0
+        self.release = threading.Event()
+        self.release.set()
+        self.lock = threading.Lock()
+
+    def __call__(self, conversation_id, turns):
+        self.release.wait()
+        with self.lock:
+            if self.fail:
+                self.fail -= 1
+                raise ConnectionError('firestore unavailable')
+            self.batches.append((conversation_id, [turn['seq'] for turn in turns]))
+
+    def seqs(self, conversation_id):
+        return [seq for cid, seqs in self.batches if cid == conversation_id for seq in seqs]
+
+
+def wait_in_flight(queue, count=1):
+    """Until a worker has taken count conversations' turns"""
+    deadline = time.monotonic() + 5
+    while queue.stats()['in_flight'] < count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def make_queue(writer, tmp_path=None, **kwargs):
+    kwargs.setdefault('base_delay', 0.001)
+    return WriteBehindQueue(writer, journal_dir=str(tmp_path) if tmp_path else None, **kwargs)
+
+
+def journal_ops(path):
+    return [json.loads(line)['op'] for line in open(path).read().splitlines()]
+
+
+def test_turns_are_written_in_order_per_conversation():
+    writer = Recorder()
+    queue = make_queue(writer, workers=4)
+    for seq in range(50):
+        queue.enqueue(f"c{seq % 3}", {'seq': seq})
+    assert queue.flush(timeout=5)
+
+    for n in range(3):
+        assert writer.seqs(f"c{n}") == list(range(n, 50, 3))
+    assert queue.stats()['written_turns'] == 50
+    queue.close()
+
+
+def test_turns_queued_while_writing_are_coalesced():
+    writer = Recorder()
+    writer.release.clear()
+    queue = make_queue(writer, workers=1)
+    queue.enqueue('c1', {'seq': 0})
+    wait_in_flight(queue)
+    for seq in range(1, 6):
+        queue.enqueue('c1', {'seq': seq})
+    writer.release.set()
+    assert queue.flush(timeout=5)
+
+    assert writer.batches[-1] == ('c1', [1, 2, 3, 4, 5])
+    queue.close()
+
+
+def test_full_queue_still_accepts_conversations_with_queued_turns():
+    writer = Recorder()
+    writer.release.clear()
+    queue = make_queue(writer, workers=1, max_pending=2)
+    assert queue.enqueue('c1', {'seq': 0})
+    assert queue.enqueue('c1', {'seq': 1})
+
+    # c2 has nothing queued: a synchronous write can't overtake anything
+    assert queue.enqueue('c2', {'seq': 2}) is False
+    # c1 does: queue it behind its older turns instead
+    assert queue.enqueue('c1', {'seq': 3}) is True
+
+    writer.release.set()
+    assert queue.flush(timeout=5)
+    assert writer.seqs('c1') == [0, 1, 3]
+    stats = queue.stats()
+    assert stats['rejected'] == 1 and stats['overflow'] == 1
+    queue.close()
+
+
+def test_permanent_errors_drop_the_turns(tmp_path):
+    class Gone(Exception):
+        pass
+
+    def write_fn(conversation_id, turns):
+        raise Gone()
+
+    queue = make_queue(write_fn, tmp_path, is_permanent=lambda e: isinstance(e, Gone))
+    queue.enqueue('c1', {'seq': 0})
+    assert queue.flush(timeout=5)
+    assert queue.stats()['dropped_turns'] == 1
+    queue.close()
+
+    # Nothing left to replay
+    assert make_queue(Recorder(), tmp_path).stats()['replayed'] == 0
+
+
+def test_exhausted_retries_are_requeued_ahead_of_newer_turns():
+    writer = Recorder()
+    writer.fail = 3  # every attempt of the first round
+    queue = make_queue(writer, workers=1, max_attempts=3, requeue_delay=0.2)
+    queue.enqueue('c1', {'seq': 0})
+
+    # Queued while the first turn waits out its requeue delay
+    time.sleep(0.1)
+    queue.enqueue('c1', {'seq': 1})
+
+    assert queue.flush(timeout=5)
+    assert writer.seqs('c1') == [0, 1]
+    stats = queue.stats()
+    assert stats['requeued_turns'] == 1 and stats['failed_batches'] == 1
+    queue.close()
+
+
+def test_journal_is_compacted_after_a_requeued_turn_succeeds(tmp_path, monkeypatch):
+    import write_behind
+    monkeypatch.setattr(write_behind, 'JOURNAL_COMPACT_BYTES', 100)
+
+    writer = Recorder()
+    writer.fail = 2
+    queue = make_queue(writer, tmp_path, workers=1, max_attempts=2, requeue_delay=0.05)
+    for seq in range(5):
+        queue.enqueue('c1', {'seq': seq, 'text': 'x' * 50})
+    assert queue.flush(timeout=5)
+
+    assert writer.seqs('c1') == [0, 1, 2, 3, 4]
+    assert os.path.getsize(queue.journal_path) == 0
+    queue.close()
+
+
+def test_turns_journaled_after_compaction_are_replayed(tmp_path, monkeypatch):
+    import write_behind
+    monkeypatch.setattr(write_behind, 'JOURNAL_COMPACT_BYTES', 10)
+
+    writer = Recorder()
+    queue = make_queue(writer, tmp_path, workers=1)
+    queue.enqueue('c1', {'seq': 0})
+    assert queue.flush(timeout=5)
+    assert os.path.getsize(queue.journal_path) == 0
+
+    writer.release.clear()
+    queue.enqueue('c1', {'seq': 1})
+    queue.close(timeout=0.1)  # "crash" with the second turn unwritten
+    assert journal_ops(queue.journal_path) == ['add']
+
+    replayed = Recorder()
+    second = make_queue(replayed, tmp_path)
+    assert second.flush(timeout=5)
+    assert replayed.seqs('c1') == [1]
+    writer.release.set()
+    second.close()
+
+
+def test_unfinished_turns_are_replayed_from_the_journal(tmp_path):
+    writer = Recorder()
+    writer.release.clear()
+    queue = make_queue(writer, tmp_path, workers=1)
+    queue.enqueue('c1', {'seq': 0})
+    queue.enqueue('c1', {'seq': 1})
+    queue.close(timeout=0.1)  # "crash" with both turns unwritten
+    crashed_journal = queue.journal_path
+    assert journal_ops(crashed_journal) == ['add', 'add']
+
+    replayed = Recorder()
+    queue = make_queue(replayed, tmp_path)
+    assert queue.stats()['replayed'] == 2
+    assert not os.path.exists(crashed_journal)  # adopted into the new process's journal
+    assert queue.flush(timeout=5)
+    assert replayed.seqs('c1') == [0, 1]
+    writer.release.set()
+    queue.close()
+    assert os.listdir(tmp_path) == ['.replay.lock']  # drained: its own journal is removed
+
+
+def test_running_process_journal_is_not_replayed(tmp_path):
+    writer = Recorder()
+    writer.release.clear()
+    running = make_queue(writer, tmp_path, workers=1)
+    running.enqueue('c1', {'seq': 0})
+    running.enqueue('c1', {'seq': 1})
+
+    other = Recorder()
+    starting = make_queue(other, tmp_path)
+    assert starting.stats()['replayed'] == 0
+    assert os.path.exists(running.journal_path)
+    starting.close()
+
+    writer.release.set()
+    running.close()
+    assert writer.seqs('c1') == [0, 1] and other.seqs('c1') == []
+
+
+def test_several_crashed_journals_are_adopted_once(tmp_path):
+    for process in range(3):
+        with open(tmp_path / f'journal-{process}-dead.jsonl', 'w') as journal:
+            journal.write(json.dumps({'op': 'add', 'id': f'a{process}', 'conversation_id': f'c{process}',
+                                      'turn': {'seq': 0}}) + '\n')
+            journal.write(json.dumps({'op': 'add', 'id': f'b{process}', 'conversation_id': f'c{process}',
+                                      'turn': {'seq': 1}}) + '\n')
+            journal.write(json.dumps({'op': 'done', 'ids': [f'a{process}']}) + '\n')
+            journal.write('{"op": "ad')  # torn last line
+
+    first, second = Recorder(), Recorder()
+    first_queue = make_queue(first, tmp_path)
+    second_queue = make_queue(second, tmp_path)
+    assert first_queue.stats()['replayed'] == 3
+    assert second_queue.stats()['replayed'] == 0
+    assert first_queue.flush(timeout=5)
+    assert sorted(cid for cid, _ in first.batches) == ['c0', 'c1', 'c2']
+    assert all(seqs == [1] for _, seqs in first.batches)
+    first_queue.close()
+    second_queue.close()
+
+
+def test_discard_drops_queued_turns():
+    writer = Recorder()
+    writer.release.clear()
+    queue = make_queue(writer, workers=1)
+    queue.enqueue('c1', {'seq': 0})
+    wait_in_flight(queue)
+    queue.enqueue('c1', {'seq': 1})
+    queue.enqueue('c1', {'seq': 2})
+
+    assert queue.discard('c1') == 2
+    writer.release.set()
+    assert queue.flush(timeout=5)
+    assert writer.seqs('c1') == [0]
+
+    queue.close()
+    assert queue.enqueue('c1', {'seq': 3}) is False
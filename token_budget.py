@@ -0,0 +1,93 @@
+"""
+Token Budget
+Fast local token estimation and per-model prompt budgets used to pick
+how much conversation history is sent with each Groq request
+"""
+
+import os
+import re
+from functools import lru_cache
+
+# Approximate per-message framing cost (role markers, separators)
+MESSAGE_OVERHEAD_TOKENS = 4
+
+# Total prompt budget (system prompt + history + current message + reply) per model
+DEFAULT_MODEL_BUDGETS = {
+    'llama-3.3-70b-versatile': 4000,
+    'llama-3.1-8b-instant': 3000,
+}
+DEFAULT_BUDGET = 3000
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def estimate_tokens(text):
+    """
+    Estimate the token count of text without a tokenizer
+    ASCII words cost ~1 token per 7 characters, punctuation 1 token each,
+    and non-ASCII text (emoji, accents) roughly 1 token per character
+    """
+    if not text:
+        return 0
+    tokens = 0
+    for piece in _PIECE_PATTERN.findall(text):
+        if piece.isascii():
+            tokens += 1 + len(piece) // 7
+        else:
+            tokens += len(piece)
+    return tokens
+
+
+def estimate_message_tokens(message):
+    """Estimate the tokens a chat message costs, including framing"""
+    return estimate_tokens(message['content']) + MESSAGE_OVERHEAD_TOKENS
+
+
+def parse_budgets(value):
+    """Parse 'model=budget,model=budget' into a dict"""
+    budgets = {}
+    for item in filter(None, (part.strip() for part in (value or '').split(','))):
+        model, _, budget = item.partition('=')
+        budgets[model.strip()] = int(budget)
+    return budgets
+
+
+# Override with e.g. MODEL_TOKEN_BUDGETS="llama-3.3-70b-versatile=6000,llama-3.1-8b-instant=2000"
+MODEL_BUDGETS = {**DEFAULT_MODEL_BUDGETS, **parse_budgets(os.getenv('MODEL_TOKEN_BUDGETS'))}
+
+
+def prompt_budget(model):
+    """Total prompt token budget for a model"""
+    return MODEL_BUDGETS.get(model, DEFAULT_BUDGET)
+
+
+@lru_cache(maxsize=256)
+def prompt_tokens(system_prompt):
+    """Estimated tokens of a system prompt; prompts are prebuilt, so each is tokenized once"""
+    return estimate_tokens(system_prompt) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_budget(model, system_prompt, message, max_tokens):
+    """
+    Tokens left for conversation history after the system prompt,
+    the current message and the reply are counted against the model budget
+    """
+    used = (prompt_tokens(system_prompt)
+            + estimate_tokens(message) + MESSAGE_OVERHEAD_TOKENS
+            + max_tokens)
+    return max(0, prompt_budget(model) - used)
+
+
+def fit_history(messages, token_budget, tokens=None):
+    """
+    Newest messages (oldest first) whose estimated tokens fit token_budget
+    tokens holds each message's cached estimate (HistoryWindow.tokens);
+    without it the messages are estimated here
+    """
+    kept = 0
+    for index in reversed(range(len(messages))):
+        token_budget -= tokens[index] if tokens is not None else estimate_message_tokens(messages[index])
+        if token_budget < 0:
+            break
+        kept += 1
+    return messages[len(messages) - kept:]
@@ -0,0 +1,345 @@
+"""
+Write-Behind Queue
+Takes Firestore chat writes off the /chat response path. Turns are queued
+in process, journaled to a local append-only file and written by background
+workers, several turns of the same conversation in one batch
+
+Every process (e.g. each gunicorn worker) journals to its own file in the
+journal directory and holds an exclusive lock on it while running. At start
+a process adopts the files nobody holds - those of processes that crashed or
+stopped with turns unwritten - and replays their turns
+"""
+
+import atexit
+import glob
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+try:
+    import fcntl
+except ImportError:  # Windows: no file locks - run a single process per journal directory
+    fcntl = None
+
+# Truncate the journal once the queue drains and it has grown past this size
+JOURNAL_COMPACT_BYTES = 1_000_000
+
+# Each turn is two message writes; keep a coalesced batch well under Firestore's 500 writes
+MAX_TURNS_PER_BATCH = 200
+
+
+class WriteBehindQueue:
+    """
+    Bounded per-conversation queue of chat turns drained by a worker pool
+
+    write_fn(conversation_id, turns) must write all turns in one batch and be
+    safe to repeat (turns carry their own document IDs and sequence numbers)
+    is_permanent(exc) -> True for errors that retrying can't fix (e.g. the
+    conversation was deleted); those turns are dropped instead of retried.
+    Turns that use up max_attempts go back to the front of their
+    conversation's queue and are tried again after requeue_delay seconds
+
+    Journal lines (JSONL), in journal_dir/journal-<pid>-<id>.jsonl:
+      {"op": "add", "id": ..., "conversation_id": ..., "turn": {...}}
+      {"op": "done", "ids": [...]}
+    Turns added but never marked done are replayed by the next process to start
+    """
+
+    def __init__(self, write_fn, journal_dir=None, max_pending=1000, workers=2,
+                 max_attempts=5, base_delay=0.5, max_delay=30.0, requeue_delay=60.0, is_permanent=None):
+        self.write_fn = write_fn
+        self.journal_dir = journal_dir
+        self.journal_path = None
+        self.max_pending = max_pending
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.requeue_delay = requeue_delay
+        self.is_permanent = is_permanent or (lambda e: False)
+
+        self._cond = threading.Condition()
+        self._pending = OrderedDict()  # conversation_id -> [entry, ...] in arrival order
+        self._in_flight = set()        # conversations a worker is writing right now
+        self._depth = 0
+        self._closed = False
+
+        self._journal_lock = threading.Lock()
+        self._journal = None
+        self._adopted = []  # other processes' journals taken over at start
+
+        self._written = 0
+        self._batches = 0
+        self._retries = 0
+        self._failed = 0
+        self._dropped = 0
+        self._rejected = 0
+        self._overflow = 0
+        self._requeued = 0
+        self._replayed = 0
+        self._last_lag = 0.0
+        self._max_lag = 0.0
+
+        if journal_dir:
+            self._open_journal()
+            self._replay_journals()
+
+        self._workers = [threading.Thread(target=self._run, name=f'write-behind-{i}', daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    # ---------- public API ----------
+
+    def enqueue(self, conversation_id, turn):
+        """
+        Queue a turn for conversation_id and return immediately
+        Returns False when the queue is full or closed - the caller should
+        write synchronously instead. A conversation with turns still queued
+        or being written is always accepted, past max_pending if need be:
+        a synchronous write would land before those older turns
+        """
+        entry = {'id': uuid.uuid4().hex, 'turn': turn, 'queued_at': time.time()}
+        with self._cond:
+            if self._closed or self._depth >= self.max_pending:
+                if conversation_id not in self._pending and conversation_id not in self._in_flight:
+                    self._rejected += 1
+                    return False
+                self._overflow += 1
+            self._journal_write({'op': 'add', 'id': entry['id'],
+                                 'conversation_id': conversation_id, 'turn': turn})
+            self._pending.setdefault(conversation_id, []).append(entry)
+            self._depth += 1
+            self._cond.notify()
+        return True
+
+    def discard(self, conversation_id):
+        """Drop queued (not in-flight) turns of a conversation that is being deleted"""
+        with self._cond:
+            entries = self._pending.pop(conversation_id, [])
+            self._depth -= len(entries)
+            if entries:
+                self._journal_write({'op': 'done', 'ids': [e['id'] for e in entries]})
+                self._cond.notify_all()
+        return len(entries)
+
+    def flush(self, timeout=None):
+        """Wait until every queued turn has been written (or given up on)"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._depth or self._in_flight:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def close(self, timeout=10):
+        """Stop accepting turns, drain the queue and stop the workers"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        drained = self.flush(timeout)
+        for worker in self._workers:
+            worker.join(timeout=1)
+        with self._journal_lock:
+            if self._journal:
+                if drained:
+                    # Nothing left to replay - don't leave an empty file behind for every process
+                    os.remove(self.journal_path)
+                self._journal.close()  # releases the lock: a later process adopts what is left
+                self._journal = None
+        if not drained:
+            print(f"⚠️ Write-behind queue closed with {self._depth} turn(s) unwritten - they stay in the journal")
+
+    def stats(self):
+        """Queue depth, lag and throughput counters"""
+        with self._cond:
+            oldest = min((entries[0]['queued_at'] for entries in self._pending.values()), default=None)
+            return {
+                'depth': self._depth,
+                'max_pending': self.max_pending,
+                'conversations_pending': len(self._pending),
+                'in_flight': len(self._in_flight),
+                'oldest_pending_seconds': round(time.time() - oldest, 3) if oldest else 0.0,
+                'last_lag_seconds': round(self._last_lag, 3),
+                'max_lag_seconds': round(self._max_lag, 3),
+                'written_turns': self._written,
+                'batches': self._batches,
+                'retries': self._retries,
+                'failed_batches': self._failed,
+                'dropped_turns': self._dropped,
+                'rejected': self._rejected,
+                'overflow': self._overflow,
+                'requeued_turns': self._requeued,
+                'replayed': self._replayed,
+            }
+
+    # ---------- worker ----------
+
+    def _run(self):
+        while True:
+            with self._cond:
+                conversation_id, wait = self._next_ready()
+                while conversation_id is None:
+                    if self._closed and not self._depth:
+                        return
+                    self._cond.wait(wait)
+                    conversation_id, wait = self._next_ready()
+                # Coalesce everything queued for this conversation into one write
+                entries = self._pending[conversation_id][:MAX_TURNS_PER_BATCH]
+                del self._pending[conversation_id][:MAX_TURNS_PER_BATCH]
+                if not self._pending[conversation_id]:
+                    del self._pending[conversation_id]
+                self._in_flight.add(conversation_id)
+
+            try:
+                self._write(conversation_id, entries)
+            finally:
+                with self._cond:
+                    self._in_flight.discard(conversation_id)
+                    self._depth -= len(entries)
+                    if not self._depth and not self._in_flight:
+                        self._maybe_compact_journal()
+                    self._cond.notify_all()
+
+    def _next_ready(self):
+        """
+        First conversation with queued turns that no worker is writing and
+        that isn't waiting out a requeue delay (call with _cond held)
+        Returns (conversation_id, None), or (None, seconds until a delayed one is due)
+        """
+        now = time.time()
+        wait = None
+        for conversation_id, entries in self._pending.items():
+            if conversation_id in self._in_flight:
+                continue
+            not_before = entries[0].get('not_before', 0)
+            if not_before <= now or self._closed:
+                return conversation_id, None
+            wait = not_before - now if wait is None else min(wait, not_before - now)
+        return None, wait
+
+    def _write(self, conversation_id, entries):
+        turns = [entry['turn'] for entry in entries]
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                self.write_fn(conversation_id, turns)
+                break
+            except Exception as e:
+                if self.is_permanent(e):
+                    print(f"⚠️ Dropping {len(turns)} queued turn(s) for conversation {conversation_id}: {e}")
+                    with self._cond:
+                        self._dropped += len(turns)
+                    self._journal_write({'op': 'done', 'ids': [entry['id'] for entry in entries]})
+                    return
+                if attempt == self.max_attempts:
+                    print(f"❌ Write-behind failed {attempt} times for conversation {conversation_id}: {e} "
+                          f"- retrying in {self.requeue_delay:.0f}s")
+                    self._requeue(conversation_id, entries)
+                    return
+                with self._cond:
+                    self._retries += 1
+                # Exponential backoff with full jitter so retries from many workers spread out
+                time.sleep(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1))))
+
+        self._journal_write({'op': 'done', 'ids': [entry['id'] for entry in entries]})
+        lag = time.time() - entries[0]['queued_at']
+        with self._cond:
+            self._written += len(entries)
+            self._batches += 1
+            self._last_lag = lag
+            self._max_lag = max(self._max_lag, lag)
+
+    def _requeue(self, conversation_id, entries):
+        """Put failed turns back ahead of newer ones, to be retried after requeue_delay"""
+        not_before = time.time() + self.requeue_delay
+        for entry in entries:
+            entry['not_before'] = not_before
+        with self._cond:
+            self._failed += 1
+            self._requeued += len(entries)
+            self._pending[conversation_id] = entries + self._pending.get(conversation_id, [])
+            # Counted again when this attempt's finally block subtracts them
+            self._depth += len(entries)
+
+    # ---------- journal ----------
+
+    def _journal_write(self, record):
+        if not self.journal_dir:
+            return
+        with self._journal_lock:
+            if self._journal is None:
+                return
+            self._journal.write(json.dumps(record) + '\n')
+            self._journal.flush()
+
+    def _maybe_compact_journal(self):
+        """Every turn in the journal is done - start it afresh (call with _cond held)"""
+        with self._journal_lock:
+            # enqueue() and discard() journal under _cond, which is held here, so with
+            # nothing queued or in flight no turn of this journal is still unfinished
+            if self._depth or self._in_flight:
+                return
+            if self._journal is not None and self._journal.tell() > JOURNAL_COMPACT_BYTES:
+                self._journal.truncate(0)
+
+    def _open_journal(self):
+        """Create this process's journal and lock it for as long as the process runs"""
+        os.makedirs(self.journal_dir, exist_ok=True)
+        self.journal_path = os.path.join(self.journal_dir, f"journal-{os.getpid()}-{uuid.uuid4().hex[:8]}.jsonl")
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if fcntl:
+            fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+    def _replay_journals(self):
+        """Adopt the journals no running process holds and re-queue their unwritten turns"""
+        # One process adopts at a time, so two starting workers can't both take the same file
+        with open(os.path.join(self.journal_dir, '.replay.lock'), 'a') as replay_lock:
+            if fcntl:
+                fcntl.flock(replay_lock, fcntl.LOCK_EX)
+            unfinished = OrderedDict()
+            for path in sorted(glob.glob(os.path.join(self.journal_dir, 'journal-*.jsonl')),
+                               key=os.path.getmtime):
+                if path != self.journal_path:
+                    self._adopt_journal(path, unfinished)
+
+            # Our own journal takes over the adopted turns before their files go
+            for record in unfinished.values():
+                self._journal_write(record)
+            for path in self._adopted:
+                os.remove(path)
+
+        now = time.time()
+        for record in unfinished.values():
+            self._pending.setdefault(record['conversation_id'], []).append(
+                {'id': record['id'], 'turn': record['turn'], 'queued_at': now})
+        self._depth = self._replayed = len(unfinished)
+        if unfinished:
+            print(f"📒 Replaying {len(unfinished)} unwritten chat turn(s) from {len(self._adopted)} journal(s)")
+
+    def _adopt_journal(self, path, unfinished):
+        """Read another process's journal into unfinished, unless that process still holds it"""
+        with open(path, encoding='utf-8') as journal:
+            if fcntl:
+                try:
+                    fcntl.flock(journal, fcntl.LOCK_SH | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    return  # a running process's journal
+            for line in journal:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue  # torn last line from a crash mid-write
+                if record.get('op') == 'add':
+                    unfinished[record['id']] = record
+                elif record.get('op') == 'done':
+                    for entry_id in record.get('ids', []):
+                        unfinished.pop(entry_id, None)
+        self._adopted.append(path)